@@ -1,6 +1,14 @@
+"""
+ASGI entry point, run with `daphne -b 0.0.0.0 -p $PORT backend.asgi:application`.
+
+Loading this module turns on ASGI_MODE (unless set explicitly), which routes the
+read endpoints to users.async_views. The WSGI deployment is unaffected.
+"""
+
 import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+os.environ.setdefault('ASGI_MODE', 'True')
 
-application = get_asgi_application()
\ No newline at end of file
+application = get_asgi_application()
@@ -0,0 +1,17 @@
+"""
+Celery application for the users service.
+
+Workers run with ``celery -A backend worker``, the periodic schedule with
+``celery -A backend beat``. Configuration lives in settings under the
+``CELERY_`` prefix.
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+app = Celery('backend')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
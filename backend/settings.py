@@ -12,7 +12,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 from datetime import timedelta
-import os,logging
+from celery.schedules import crontab
+import os,sys,logging
 from dotenv import load_dotenv
 load_dotenv()
 # Build pathps inside the project like this: BASE_DIR / 'subdir'.
@@ -51,6 +52,7 @@ INSTALLED_APPS = [
     'drf_yasg',
     'channels',
     'corsheaders',
+    'django_celery_beat',
     
 ]
 
@@ -91,6 +93,10 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'backend.wsgi.application'
+ASGI_APPLICATION = 'backend.asgi:application'
+
+# Serve the read endpoints with their async views (users.async_views), set by backend.asgi
+ASGI_MODE = os.getenv('ASGI_MODE', 'False') == 'True'
 
 
 # Database
@@ -112,6 +118,122 @@ DATABASES = {
     }
 }
 
+# Run the test suite on SQLite unless a database server is configured
+if 'test' in sys.argv and not os.getenv('DB_HOST'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        }
+    }
+
+
+# Cache
+# Redis in production (REDIS_URL, hiredis is picked up automatically), local memory otherwise
+REDIS_URL = os.getenv('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'users',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Seconds a user_detail payload may live in the cache, entries are also dropped on every write
+USER_DETAIL_CACHE_TIMEOUT = int(os.getenv('USER_DETAIL_CACHE_TIMEOUT', 300))
+
+
+# Celery
+# The broker defaults to the cache Redis, workers: `celery -A backend worker`, schedule: `celery -A backend beat`
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', REDIS_URL or 'redis://localhost:6379/0')
+CELERY_TASK_IGNORE_RESULT = True
+# Fail fast when publishing from a request, the outbox keeps the work safe
+CELERY_BROKER_CONNECTION_TIMEOUT = float(os.getenv('CELERY_BROKER_CONNECTION_TIMEOUT', 1))
+CELERY_TIMEZONE = 'Asia/Jerusalem'
+# Entries below are synced into django-celery-beat, where they can also be tuned from the admin
+CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+CELERY_BEAT_SCHEDULE = {
+    # Picks up retries whose backoff expired and anything queued while the broker was down
+    'dispatch-notifications': {
+        'task': 'users.tasks.dispatch_notifications',
+        'schedule': 30.0,
+    },
+    # CVs whose extraction could not be queued, or was lost with a worker
+    'extract-pending-cvs': {
+        'task': 'users.tasks.extract_pending_cvs',
+        'schedule': crontab(minute='*/5'),
+    },
+    'purge-stale-uploads': {
+        'task': 'users.tasks.purge_stale_uploads',
+        'schedule': crontab(minute=0),
+    },
+    # Jobs whose end date passed, hourly since the sweep's `today` is the UTC date while beat runs on CELERY_TIMEZONE
+    'expire-jobs': {
+        'task': 'users.tasks.expire_jobs',
+        'schedule': crontab(minute=5),
+    },
+    # Full rescoring of the open jobs into JobMatch, read by job_matches
+    'rematch-jobs': {
+        'task': 'users.tasks.rematch_jobs',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'sweep-inactive-users': {
+        'task': 'users.tasks.sweep_inactive_users',
+        'schedule': crontab(hour=9, minute=0),
+    },
+}
+
+# Notification outbox delivery
+NOTIFICATION_BATCH_SIZE = int(os.getenv('NOTIFICATION_BATCH_SIZE', 100))
+NOTIFICATION_MAX_ATTEMPTS = int(os.getenv('NOTIFICATION_MAX_ATTEMPTS', 8))
+NOTIFICATION_BACKOFF_BASE = float(os.getenv('NOTIFICATION_BACKOFF_BASE', 30))
+NOTIFICATION_BACKOFF_MAX = float(os.getenv('NOTIFICATION_BACKOFF_MAX', 3600))
+# Seconds a claimed batch stays leased to its dispatcher, longer than sending a batch can take
+NOTIFICATION_LEASE_SECONDS = int(os.getenv('NOTIFICATION_LEASE_SECONDS', 300))
+NOTIFICATION_CONNECT_TIMEOUT = float(os.getenv('NOTIFICATION_CONNECT_TIMEOUT', 3.05))
+NOTIFICATION_READ_TIMEOUT = float(os.getenv('NOTIFICATION_READ_TIMEOUT', 10))
+NOTIFICATION_POOL_SIZE = int(os.getenv('NOTIFICATION_POOL_SIZE', 10))
+
+# Inactive users: a user is inactive once last_login is older than the threshold
+INACTIVE_USER_THRESHOLD_HOURS = int(os.getenv('INACTIVE_USER_THRESHOLD_HOURS', 72))
+INACTIVE_USER_CHUNK_SIZE = int(os.getenv('INACTIVE_USER_CHUNK_SIZE', 1000))
+
+# Job expiry: ended jobs expired per UPDATE / transaction, see users/expiry.py
+JOB_EXPIRY_BATCH_SIZE = int(os.getenv('JOB_EXPIRY_BATCH_SIZE', 1000))
+
+
+# Password hashing, see users/hashers.py
+# PASSWORD_HASHER picks the hasher for new hashes, the rest still verify existing ones
+# and users are re-hashed with the configured one on their next login
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'pbkdf2')
+PASSWORD_HASHER_CHOICES = {
+    'pbkdf2': 'users.hashers.TunedPBKDF2PasswordHasher',
+    'scrypt': 'users.hashers.TunedScryptPasswordHasher',
+    'argon2': 'users.hashers.TunedArgon2PasswordHasher',  # needs argon2-cffi
+}
+PASSWORD_HASHERS = [PASSWORD_HASHER_CHOICES[PASSWORD_HASHER]] + [
+    path for name, path in PASSWORD_HASHER_CHOICES.items() if name != PASSWORD_HASHER
+] + [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+# 0 keeps Django's default (600000 on 4.2)
+PASSWORD_PBKDF2_ITERATIONS = int(os.getenv('PASSWORD_PBKDF2_ITERATIONS', 0))
+PASSWORD_SCRYPT_WORK_FACTOR = int(os.getenv('PASSWORD_SCRYPT_WORK_FACTOR', 2 ** 14))
+PASSWORD_SCRYPT_BLOCK_SIZE = int(os.getenv('PASSWORD_SCRYPT_BLOCK_SIZE', 8))
+PASSWORD_SCRYPT_PARALLELISM = int(os.getenv('PASSWORD_SCRYPT_PARALLELISM', 1))
+PASSWORD_ARGON2_TIME_COST = int(os.getenv('PASSWORD_ARGON2_TIME_COST', 2))
+PASSWORD_ARGON2_MEMORY_COST = int(os.getenv('PASSWORD_ARGON2_MEMORY_COST', 102400))
+PASSWORD_ARGON2_PARALLELISM = int(os.getenv('PASSWORD_ARGON2_PARALLELISM', 8))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -161,10 +283,33 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.StatelessJWTAuthentication',
+    ),
+    # DRF's defaults, JSON encoded with orjson (same bytes)
+    'DEFAULT_RENDERER_CLASSES': (
+        'users.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ),
+    # Token buckets of users.throttling: capacity / refill period
+    'DEFAULT_THROTTLE_RATES': {
+        'auth_ip': os.getenv('AUTH_THROTTLE_IP_RATE', '30/min'),
+        'auth_email': os.getenv('AUTH_THROTTLE_EMAIL_RATE', '10/min'),
+    },
+    # Deployed on Railway, whose edge proxy is the one hop in front of gunicorn and appends the
+    # client address to X-Forwarded-For: only that last entry is trusted, the rest is client supplied
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
 }
 
+# Throttle buckets are shared through Redis, in-process (per worker) without it
+THROTTLE_REDIS_URL = os.getenv('THROTTLE_REDIS_URL', REDIS_URL)
+THROTTLE_REDIS_TIMEOUT = float(os.getenv('THROTTLE_REDIS_TIMEOUT', 0.05))
+THROTTLE_LOCAL_SHARDS = 16
+THROTTLE_LOCAL_MAX_KEYS = int(os.getenv('THROTTLE_LOCAL_MAX_KEYS', 100000))
+
+# Seconds a "user is still active" answer is trusted per process, 0 trusts the token until it expires
+JWT_REVOCATION_CHECK_TTL = int(os.getenv('JWT_REVOCATION_CHECK_TTL', 30))
+JWT_REVOCATION_CACHE_SIZE = int(os.getenv('JWT_REVOCATION_CACHE_SIZE', 10000))
+
 
 
 SIMPLE_JWT = {
@@ -238,6 +383,42 @@ LOGGING = {
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploads (users/storage.py): content addressed blobs under MEDIA_ROOT/blobs/,
+# partial resumable uploads on local disk outside MEDIA_ROOT so they are never served
+UPLOAD_MAX_SIZE = int(os.getenv('UPLOAD_MAX_SIZE', 50 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024))
+UPLOAD_SESSION_DIR = os.getenv('UPLOAD_SESSION_DIR', os.path.join(BASE_DIR, 'upload_sessions'))
+UPLOAD_SESSION_TTL_HOURS = int(os.getenv('UPLOAD_SESSION_TTL_HOURS', 24))
+
+# Profile pictures (users/images.py)
+PROFILE_PICTURE_MAX_SIZE = int(os.getenv('PROFILE_PICTURE_MAX_SIZE', 10 * 1024 * 1024))
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', 40_000_000))
+IMAGE_VARIANT_CACHE_TIMEOUT = int(os.getenv('IMAGE_VARIANT_CACHE_TIMEOUT', 24 * 3600))
+
+# CV text extraction (users/cv_search.py), only the start of long documents is indexed
+CV_MAX_PAGES = int(os.getenv('CV_MAX_PAGES', 20))
+CV_MAX_CHARS = int(os.getenv('CV_MAX_CHARS', 100_000))
+
+# Bulk onboarding (users/onboarding.py)
+ONBOARDING_MAX_ROWS = int(os.getenv('ONBOARDING_MAX_ROWS', 1000))
+ONBOARDING_HASH_WORKERS = int(os.getenv('ONBOARDING_HASH_WORKERS', os.cpu_count() or 4))
+
+# Spreadsheet import / export (users/spreadsheets.py): rows per keyset page and per bulk write
+SPREADSHEET_CHUNK_SIZE = int(os.getenv('SPREADSHEET_CHUNK_SIZE', 1000))
+SPREADSHEET_MAX_ERRORS = int(os.getenv('SPREADSHEET_MAX_ERRORS', 1000))
+
+# Request metrics (users/metrics.py), scraped from metrics/ with `Authorization: Bearer $METRICS_TOKEN`
+# (open without a token only when DEBUG). METRICS_SLOW_QUERIES > 0 logs that many of the slowest
+# queries over METRICS_SLOW_QUERY_MS of each request, with the code that ran them
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+METRICS_SLOW_QUERIES = int(os.getenv('METRICS_SLOW_QUERIES', 0))
+METRICS_SLOW_QUERY_MS = float(os.getenv('METRICS_SLOW_QUERY_MS', 100))
+
+if METRICS_ENABLED:
+    # First, so the latency covers every other middleware
+    MIDDLEWARE.insert(0, 'users.metrics.MetricsMiddleware')
+
 NOTIFICATION_SERVICE_URL = os.environ.setdefault('NOTIFICATION_SERVICE_URL', 'http://localhost:8070/api/v1/notifications/')
 
 CSRF_TRUSTED_ORIGINS = [
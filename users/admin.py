@@ -33,7 +33,7 @@ class RecruiterInline(admin.StackedInline):
     verbose_name_plural = 'Recruiter Profile'
 
 class JobAdmin(admin.ModelAdmin):
-    list_display = ('id', 'title', 'company', 'recruiter', 'job_type', 'job_sitting', 'is_relevant', 'end_date')
+    list_display = ('id', 'title', 'company', 'recruiter', 'job_type', 'job_sitting', 'is_relevant', 'end_date', 'expired_at')
     search_fields = ('title', 'company__email', 'recruiter__email', 'job_type')
     list_filter = ('job_sitting', 'job_type', 'is_relevant')
     ordering = ('-id',)
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        # Register the signal receivers
+        from . import signals  # noqa: F401
+
+        from django.conf import settings
+        if settings.METRICS_ENABLED:
+            from django.db.backends.signals import connection_created
+            from .metrics import install_query_recorder, instrument_serializers
+            connection_created.connect(install_query_recorder, dispatch_uid='users_query_recorder')
+            instrument_serializers()
@@ -0,0 +1,158 @@
+"""
+Async versions of the read heavy endpoints, routed instead of their
+`users.views` counterparts when the service runs under ASGI (ASGI_MODE).
+
+Lookups go through Django's async ORM so a request waiting on the database or
+on a slow client does not hold a worker thread. DRF serializers and the row
+plans of users.fast_serializers are sync only, lists are loaded and converted
+in `sync_to_async`. Talent search has no async version: its cursor paginator
+is sync too, so it would only move the whole view into a thread.
+Responses keep the exact payloads and status codes of the sync views.
+"""
+
+import functools, logging
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from .authentication import aauthenticate, authenticate_header
+from .cache import aget_cached_user_detail, aset_cached_user_detail
+from .fast_serializers import serialize_list
+from .filters import filter_jobs
+from .models import *
+from .renderers import FastJSONRenderer
+from .serializers import *
+from . import views
+
+
+users_logger = logging.getLogger('users')
+
+PROFILE_TYPES = {
+    'Talent': (Talent, TalentSerializer),
+    'Company': (Company, CompanySerializer),
+    'Recruiter': (Recruiter, RecruiterSerializer),
+}
+
+
+def render_json(data, status=200, headers=None):
+    # Same bytes DRF's Response would produce with the default renderer
+    return HttpResponse(FastJSONRenderer().render(data), status=status, content_type='application/json', headers=headers)
+
+
+def async_authenticated(view):
+    """Async equivalent of `@permission_classes([IsAuthenticated])` with JWT authentication."""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            user = await aauthenticate(request)
+        except (InvalidToken, AuthenticationFailed) as e:
+            detail = e.detail if isinstance(e.detail, dict) else {'detail': e.detail}
+            return render_json(detail, status=401, headers={'WWW-Authenticate': authenticate_header()})
+        if user is None:
+            return render_json(
+                {'detail': 'Authentication credentials were not provided.'},
+                status=401,
+                headers={'WWW-Authenticate': authenticate_header()},
+            )
+        request.user = user
+        return await view(request, *args, **kwargs)
+
+    # Tokens are not cookies, same as DRF views (csrf_exempt itself is sync only on Django 4.2)
+    wrapper.csrf_exempt = True
+    return wrapper
+
+
+def allow_methods(*methods):
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return render_json({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+            return await view(request, *args, **kwargs)
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+# --------------------------------------------API---------------------------------------------------------------------
+
+async def user_detail(request, user_id):
+    # Writes stay on the sync view
+    if request.method != 'GET':
+        return await sync_to_async(views.user_detail)(request, user_id)
+    return await user_detail_get(request, user_id)
+
+user_detail.csrf_exempt = True
+
+
+@async_authenticated
+async def user_detail_get(request, user_id):
+    cached_data = await aget_cached_user_detail(user_id)
+    if cached_data is not None:
+        users_logger.debug(f"User {user_id} served from cache.")
+        return render_json(cached_data)
+
+    user = await CustomUser.objects.filter(id=user_id).afirst()
+    if user is None:
+        return render_json({'detail': 'Not found.'}, status=404)
+
+    if user.user_type not in PROFILE_TYPES:
+        users_logger.error(f"Invalid user type: {user.user_type}")
+        return render_json({'message': 'Invalid user type'}, status=400)
+    profile_model, serializer_class = PROFILE_TYPES[user.user_type]
+
+    profile = await profile_model.objects.filter(user=user).afirst()
+    if profile is None:
+        users_logger.error(f"Profile not found for user: {user.email}")
+        return render_json({'message': 'Profile not found'}, status=404)
+    profile.user = user
+
+    def serialize():
+        return {**CustomUserSerializer(user).data, **serializer_class(profile).data}
+
+    combined_data = await sync_to_async(serialize)()
+    users_logger.debug(f"User {user.email} has been found successfully.")
+    await aset_cached_user_detail(user_id, combined_data)
+    return render_json(combined_data)
+
+
+async def list_jobs(request, jobs, owner_label, owner_id):
+    try:
+        jobs = filter_jobs(jobs, request.GET)
+    except serializers.ValidationError as e:
+        return render_json(e.detail, status=400)
+    data = await sync_to_async(serialize_list)(JobSerializer, jobs, **sparse_fields(request))
+    if not data:
+        users_logger.info(f"No jobs found for {owner_label} {owner_id}")
+        return render_json({"message": f"No jobs found for this {owner_label}"}, status=204)
+
+    users_logger.info(f"{len(data)} jobs were found for {owner_label} {owner_id}")
+    return render_json(data)
+
+
+@allow_methods('GET')
+@async_authenticated
+async def company_jobs(request, company_id):
+    try:
+        return await list_jobs(request, Job.objects.filter(company__user_id=company_id), 'company', company_id)
+    except Exception as e:
+        users_logger.error(f"Unexpected error: {str(e)}")
+        return render_json({'message': 'An error occurred while fetching jobs'}, status=500)
+
+
+@allow_methods('GET')
+@async_authenticated
+async def recruiter_jobs(request, recruiter_id):
+    try:
+        return await list_jobs(request, Job.objects.filter(recruiter__user_id=recruiter_id), 'recruiter', recruiter_id)
+    except Exception as e:
+        users_logger.error(f"Unexpected error: {str(e)}")
+        return render_json({'message': 'An error occurred while fetching jobs'}, status=500)
+
+
+#----------------------------------------------services--------------------------------------------------------
+
+@allow_methods('GET')
+@async_authenticated
+async def check_auth(request):
+    users_logger.info({"message": "User is authenticated", "user_id": request.user.id})
+    return render_json({"message": "User is authenticated", "user_id": request.user.id})
@@ -0,0 +1,155 @@
+import threading
+from cachetools import TTLCache
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+
+# -------------------------------------Token user-----------------------------------------------------------------------------------------------------------------------------------------------
+
+# Claims signin / signup embed in every token, served without touching the database
+TOKEN_CLAIMS = ('user_type', 'first_name', 'last_name', 'company_id')
+
+
+class ClaimsUser(TokenUser):
+    """Request user backed by the access token claims.
+
+    `id`, `user_type`, `first_name`, `last_name` and `company_id` come from the
+    token when it carries them. Anything else (email, profiles, related managers, is_staff /
+    is_superuser) loads the CustomUser row once, on first access, so views
+    that need the full model keep working unchanged.
+    """
+
+    def __str__(self):
+        return f"ClaimsUser {self.id}"
+
+    @cached_property
+    def instance(self):
+        try:
+            return get_user_model().objects.get(**{api_settings.USER_ID_FIELD: self.id})
+        except get_user_model().DoesNotExist:
+            # Deleted after the token was issued
+            raise AuthenticationFailed('User not found', code='user_not_found')
+
+    # TokenUser reads these from claims no token carries, they are the row's
+    @property
+    def is_staff(self):
+        return self.instance.is_staff
+
+    @property
+    def is_superuser(self):
+        return self.instance.is_superuser
+
+    @cached_property
+    def username(self):
+        return self.token.get('username') or self.instance.username
+
+    def __getattr__(self, attr):
+        if attr in TOKEN_CLAIMS and attr in self.token:
+            return self.token[attr]
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        # Tokens from api/token/ carry none of the claims, they are read from the row
+        if attr == 'company_id':
+            return recruiter_company_id(self.instance)
+        return getattr(self.instance, attr)
+
+
+def recruiter_company_id(user):
+    """The claim signin puts in recruiter tokens: their company's user id, None for everyone else."""
+    recruiter = getattr(user, 'recruiter_profile', None)
+    if recruiter is None or recruiter.company_id is None:
+        return None
+    return str(recruiter.company.user_id)
+
+
+def get_db_user(user):
+    """The CustomUser instance behind `request.user`, for writes."""
+    return user.instance if isinstance(user, ClaimsUser) else user
+
+
+# -------------------------------------Revocation check-----------------------------------------------------------------------------------------------------------------------------------------------
+# On unless JWT_REVOCATION_CHECK_TTL is 0: reject tokens of deactivated or deleted users,
+# remembering the answer per user for a few seconds so a burst of requests costs one query.
+
+_revocation_cache = TTLCache(maxsize=settings.JWT_REVOCATION_CACHE_SIZE, ttl=max(settings.JWT_REVOCATION_CHECK_TTL, 1))
+_revocation_lock = threading.Lock()
+
+
+def _active_users(user_id):
+    return get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id, 'is_active': True})
+
+
+def _cached_revocation(user_id):
+    with _revocation_lock:
+        return _revocation_cache.get(user_id)
+
+
+def _remember_revocation(user_id, revoked):
+    with _revocation_lock:
+        _revocation_cache[user_id] = revoked
+    return revoked
+
+
+def is_revoked(user_id):
+    revoked = _cached_revocation(user_id)
+    if revoked is None:
+        revoked = _remember_revocation(user_id, not _active_users(user_id).exists())
+    return revoked
+
+
+async def ais_revoked(user_id):
+    revoked = _cached_revocation(user_id)
+    if revoked is None:
+        revoked = _remember_revocation(user_id, not await _active_users(user_id).aexists())
+    return revoked
+
+
+# -------------------------------------Authentication-----------------------------------------------------------------------------------------------------------------------------------------------
+
+def token_user(validated_token):
+    if api_settings.USER_ID_CLAIM not in validated_token:
+        raise InvalidToken('Token contained no recognizable user identification')
+    return ClaimsUser(validated_token)
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication without the per request user lookup.
+
+    Validating the token is signature and expiry checks only, the user is
+    built from its claims.
+    """
+
+    def get_user(self, validated_token):
+        user = token_user(validated_token)
+        if settings.JWT_REVOCATION_CHECK_TTL and is_revoked(user.id):
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        return user
+
+
+async def aauthenticate(request):
+    """Async counterpart of StatelessJWTAuthentication.authenticate for the ASGI views.
+
+    Returns None when the request carries no bearer token and raises the
+    simplejwt exceptions otherwise.
+    """
+    authenticator = StatelessJWTAuthentication()
+    header = authenticator.get_header(request)
+    if header is None:
+        return None
+    raw_token = authenticator.get_raw_token(header)
+    if raw_token is None:
+        return None
+
+    user = token_user(authenticator.get_validated_token(raw_token))
+    if settings.JWT_REVOCATION_CHECK_TTL and await ais_revoked(user.id):
+        raise AuthenticationFailed('User is inactive', code='user_inactive')
+    return user
+
+
+def authenticate_header():
+    return StatelessJWTAuthentication().authenticate_header(None)
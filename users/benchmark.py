@@ -0,0 +1,237 @@
+import datetime, math, threading, time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from faker import Faker
+from .counters import apply_counter_deltas, shortlist_keys
+from .matching import reindex_talents
+from .models import Company, CustomUser, Job, JobShortlist, Recruiter, Talent
+from .onboarding import BULK_BATCH_SIZE, onboard_jobs
+
+
+# -------------------------------------Load runner-----------------------------------------------------------------------------------------------------------------------------------------------
+# Shared by the bench_* management commands: run a callable many times from a
+# fixed number of threads (one process = one worker) and report throughput and
+# latency percentiles.
+
+def percentile(sorted_values, pct):
+    # Nearest rank on an already sorted list
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies, elapsed, errors=0, queries=None):
+    latencies = sorted(latencies)
+    summary = {
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+    if queries is not None:
+        summary['queries_per_request'] = round(sum(queries) / len(queries), 2) if queries else 0.0
+        summary['max_queries'] = max(queries, default=0)
+    return summary
+
+
+def run_load(call, requests, concurrency=1, count_queries=False):
+    """Call `call(i)` for i in range(requests) from `concurrency` threads.
+
+    `call` returns True on success. Every call is timed, failures are counted
+    in `errors` and still included in the latencies. With `count_queries` the
+    database queries each call makes on its thread's connection are counted
+    too (in-process clients only, a remote server runs them elsewhere).
+    """
+    latencies = []
+    queries = [] if count_queries else None
+    errors = 0
+    lock = threading.Lock()
+
+    def timed(i):
+        nonlocal errors
+        executed = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal executed
+            executed += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        if count_queries:
+            with connection.execute_wrapper(count):
+                ok = call(i)
+        else:
+            ok = call(i)
+        latency = time.perf_counter() - started
+        with lock:
+            latencies.append(latency)
+            if count_queries:
+                queries.append(executed)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        # list() re-raises any exception from the calls
+        list(pool.map(timed, range(requests)))
+    return summarize(latencies, time.perf_counter() - started, errors, queries)
+
+
+# -------------------------------------Synthetic population-----------------------------------------------------------------------------------------------------------------------------------------------
+# A reproducible data set for the benchmarks: the same seed and sizes always
+# give the same companies, recruiters, jobs and talents. Every seeded user has
+# a SEED_EMAIL address and the password SEED_PASSWORD.
+
+SEED_EMAIL = 'seed-{}-{}@benchmark.invalid'
+SEED_EMAIL_PREFIX = 'seed-'
+SEED_EMAIL_DOMAIN = '@benchmark.invalid'
+SEED_PASSWORD = 'Bench-seed-0'
+
+SKILLS = (
+    'Python', 'Django', 'PostgreSQL', 'Redis', 'Celery', 'React', 'TypeScript', 'JavaScript', 'Node.js',
+    'GraphQL', 'Go', 'Java', 'Spring', 'Kotlin', 'Swift', 'C++', 'Rust', 'SQL', 'AWS', 'GCP', 'Docker',
+    'Kubernetes', 'Terraform', 'Linux', 'Machine Learning', 'Data Analysis', 'Pandas', 'Tableau', 'Excel',
+    'Figma', 'UX Research', 'Product Management', 'Scrum', 'Salesforce', 'SEO', 'Technical Writing',
+)
+LANGUAGES = ('Hebrew', 'English', 'Arabic', 'Russian', 'French', 'Spanish', 'Amharic')
+CITIES = ('Tel Aviv', 'Jerusalem', 'Haifa', 'Beer Sheva', 'Herzliya', 'Ramat Gan', 'Petah Tikva', 'Netanya')
+DIVISIONS = ('R&D', 'Product', 'Data', 'Marketing', 'Sales', 'Operations')
+JOB_TYPES = ('Full time', 'Part time', 'Freelance', 'Internship')
+GENDERS = ('male', 'female', 'other')
+
+
+def seed_email(kind, index):
+    return SEED_EMAIL.format(kind, index)
+
+
+def seeded_users():
+    return CustomUser.objects.filter(email__startswith=SEED_EMAIL_PREFIX, email__endswith=SEED_EMAIL_DOMAIN)
+
+
+def delete_population():
+    """Delete every seeded user, their profiles and jobs cascade."""
+    deleted, _ = seeded_users().delete()
+    return deleted
+
+
+def _seed_user(fake, kind, index, password, user_type):
+    return CustomUser(
+        username=seed_email(kind, index),
+        email=seed_email(kind, index),
+        password=password,
+        user_type=user_type,
+        first_name=fake.first_name() if user_type != 'Company' else '',
+        last_name=fake.last_name() if user_type != 'Company' else '',
+        phone_number=fake.numerify('05########'),
+    )
+
+
+def seed_population(companies=5, recruiters_per_company=3, jobs=200, talents=1000, shortlist=5, seed=42):
+    """Replace the seeded population with a fresh one, returns how many rows of each kind were made."""
+    fake = Faker()
+    fake.seed_instance(seed)
+    rng = fake.random
+    # One hash for everybody, hashing thousands of passwords would dominate the seeding
+    password = make_password(SEED_PASSWORD)
+    today = datetime.date.today()
+
+    delete_population()
+    with transaction.atomic():
+        company_users = [_seed_user(fake, 'company', i, password, 'Company') for i in range(companies)]
+        company_rows = [
+            Company(
+                user=user,
+                name=fake.company()[:200],
+                website=fake.url(),
+                address=rng.choice(CITIES),
+                divisions=rng.sample(DIVISIONS, 3),
+            )
+            for user in company_users
+        ]
+        recruiter_users, recruiter_rows = [], []
+        for company in company_rows:
+            for _ in range(recruiters_per_company):
+                user = _seed_user(fake, 'recruiter', len(recruiter_users), password, 'Recruiter')
+                recruiter_users.append(user)
+                recruiter_rows.append(Recruiter(
+                    user=user,
+                    company=company,
+                    division=rng.choice(company.divisions),
+                    position=fake.job()[:255],
+                    gender=rng.choice(GENDERS),
+                ))
+        talent_users = [_seed_user(fake, 'talent', i, password, 'Talent') for i in range(talents)]
+        talent_rows = [
+            Talent(
+                user=user,
+                gender=rng.choice(GENDERS),
+                birth_date=fake.date_of_birth(minimum_age=20, maximum_age=65),
+                is_open_to_work=rng.random() < 0.7,
+                residence=rng.choice(CITIES),
+                desired_salary=rng.randrange(8000, 45000, 500),
+                about_me=fake.paragraph(nb_sentences=4),
+                job_type=rng.choice(JOB_TYPES),
+                job_sitting=rng.choice(Job.JOB_SITTING)[0],
+                skills=rng.sample(SKILLS, rng.randint(3, 10)),
+                languages=rng.sample(LANGUAGES, rng.randint(1, 3)),
+                open_processes=[],
+            )
+            for user in talent_users
+        ]
+
+        CustomUser.objects.bulk_create(company_users + recruiter_users + talent_users, batch_size=BULK_BATCH_SIZE)
+        Company.objects.bulk_create(company_rows, batch_size=BULK_BATCH_SIZE)
+        Recruiter.objects.bulk_create(recruiter_rows, batch_size=BULK_BATCH_SIZE)
+        Talent.objects.bulk_create(talent_rows, batch_size=BULK_BATCH_SIZE)
+        # bulk_create skips the signals that index skills
+        reindex_talents(talent_rows)
+
+        # Jobs through the onboarding path, which keeps the skill index and job counters in step
+        job_ids = []
+        for index, company in enumerate(company_rows):
+            company_recruiters = recruiter_rows[index * recruiters_per_company:(index + 1) * recruiters_per_company]
+            rows = [
+                {
+                    'title': fake.job()[:200],
+                    'description': fake.paragraph(nb_sentences=6),
+                    'location': rng.choice(CITIES),
+                    'requirements': rng.sample(SKILLS, rng.randint(2, 6)),
+                    'salary': rng.randrange(8000, 45000, 500),
+                    'job_type': rng.choice(JOB_TYPES),
+                    'job_sitting': rng.choice(Job.JOB_SITTING)[0],
+                    'division': rng.choice(company.divisions),
+                    'end_date': today + datetime.timedelta(days=rng.randint(-30, 120)),
+                    'recruiter': rng.choice(company_recruiters).id if company_recruiters else None,
+                }
+                for _ in range(jobs // companies + (index < jobs % companies))
+            ]
+            job_ids += [row['job_id'] for row in onboard_jobs(company, rows)['created']]
+
+        # A few talents on every shortlist, counted like the tag views count them
+        jobs_by_id = {str(job['id']): job for job in Job.objects.filter(id__in=job_ids).values('id', 'company_id', 'recruiter_id')}
+        shortlisted, deltas = [], Counter()
+        for job_id in job_ids:
+            for talent in rng.sample(talent_rows, min(shortlist, len(talent_rows))):
+                shortlisted.append(JobShortlist(
+                    job_id=job_id, talent=talent,
+                    match_by_form=round(rng.random(), 4), match_by_cv=round(rng.random(), 4),
+                ))
+                for key in shortlist_keys(jobs_by_id[job_id]):
+                    deltas[key] += 1
+        JobShortlist.objects.bulk_create(shortlisted, batch_size=BULK_BATCH_SIZE)
+        apply_counter_deltas(deltas)
+
+    return {
+        'companies': len(company_rows),
+        'recruiters': len(recruiter_rows),
+        'talents': len(talent_rows),
+        'jobs': len(job_ids),
+        'shortlisted': len(shortlisted),
+    }
@@ -0,0 +1,61 @@
+import logging
+from django.conf import settings
+from django.core.cache import cache
+
+
+users_logger = logging.getLogger('users')
+
+
+# -------------------------------------user_detail-----------------------------------------------------------------------------------------------------------------------------------------------
+# The combined user + profile payload of `user_detail` GET, keyed by user id.
+# Entries are dropped by the post_save / post_delete receivers in users.signals,
+# the timeout only bounds how long a missed invalidation can serve stale data.
+
+def user_detail_key(user_id):
+    return f'user_detail:{user_id}'
+
+
+def get_cached_user_detail(user_id):
+    try:
+        return cache.get(user_detail_key(user_id))
+    except Exception as e:
+        # A cache outage must never take the endpoint down, fall back to the database
+        users_logger.warning('user_detail cache read failed for %s: %s', user_id, e)
+        return None
+
+
+def set_cached_user_detail(user_id, data):
+    try:
+        cache.set(user_detail_key(user_id), dict(data), settings.USER_DETAIL_CACHE_TIMEOUT)
+    except Exception as e:
+        users_logger.warning('user_detail cache write failed for %s: %s', user_id, e)
+
+
+async def aget_cached_user_detail(user_id):
+    try:
+        return await cache.aget(user_detail_key(user_id))
+    except Exception as e:
+        users_logger.warning('user_detail cache read failed for %s: %s', user_id, e)
+        return None
+
+
+async def aset_cached_user_detail(user_id, data):
+    try:
+        await cache.aset(user_detail_key(user_id), dict(data), settings.USER_DETAIL_CACHE_TIMEOUT)
+    except Exception as e:
+        users_logger.warning('user_detail cache write failed for %s: %s', user_id, e)
+
+
+def invalidate_user_detail(user_id):
+    try:
+        cache.delete(user_detail_key(user_id))
+    except Exception as e:
+        users_logger.error('user_detail cache invalidation failed for %s: %s', user_id, e)
+
+
+def invalidate_user_details(user_ids):
+    # Bulk writes skip the signals, one round trip for the whole batch
+    try:
+        cache.delete_many([user_detail_key(user_id) for user_id in user_ids])
+    except Exception as e:
+        users_logger.error('user_detail cache invalidation failed for %s users: %s', len(user_ids), e)
@@ -0,0 +1,220 @@
+"""
+Denormalized job counters for company and recruiter dashboards.
+
+Every job adds one to a handful of `JobCounter` rows of its company and of its
+recruiter (see `job_keys`). Job.save applies the difference between the old
+(locked) and new state of a job in the transaction that writes it, and
+users.signals uncounts deleted jobs inside the delete, so a dashboard reads a
+few counter rows instead of every job.
+
+Open jobs are not a stored counter: a job closes when its end date passes,
+without any write. Jobs are counted per end date instead ('ends:<date>') and
+open = jobs - jobs that ended before today.
+
+Shortlist writes are counted by the views that make them (one grouped update
+per request instead of one per row). Other writes that skip signals
+(queryset.update(), bulk_create()) must call `apply_counter_deltas`
+themselves, `reconcile_job_counters` rebuilds every counter from the tables
+and fixes any drift.
+"""
+
+import logging
+from collections import Counter
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from .models import Job, JobCounter, Recruiter
+
+
+users_logger = logging.getLogger('users')
+
+# Job fields the counters depend on, a save that changes none of them is free
+COUNTED_FIELDS = ('company_id', 'recruiter_id', 'job_sitting', 'division', 'end_date')
+
+
+# -------------------------------------Keys-----------------------------------------------------------------------------------------------------------------------------------------------
+
+def _key(name, value):
+    return f'{name}:{value}'[:300]
+
+
+def job_keys(job):
+    """Counter rows a job counts towards: [(scope, owner id, key)]."""
+    keys = []
+    dimensions = ['jobs']
+    if job['job_sitting']:
+        dimensions.append(_key('job_sitting', job['job_sitting']))
+    if job['division']:
+        dimensions.append(_key('division', job['division']))
+    if job['end_date']:
+        dimensions.append(_key('ends', job['end_date']))
+
+    if job['company_id']:
+        keys += [('company', job['company_id'], key) for key in dimensions]
+        if job['recruiter_id']:
+            keys.append(('company', job['company_id'], _key('recruiter', job['recruiter_id'])))
+    if job['recruiter_id']:
+        keys += [('recruiter', job['recruiter_id'], key) for key in dimensions]
+    return keys
+
+
+def shortlist_keys(job):
+    return [
+        (scope, owner_id, 'shortlisted')
+        for scope, owner_id in (('company', job['company_id']), ('recruiter', job['recruiter_id']))
+        if owner_id
+    ]
+
+
+def job_state(job):
+    """The counted fields of a Job instance, as job_keys expects them."""
+    return {field: getattr(job, field) for field in COUNTED_FIELDS}
+
+
+# -------------------------------------Updates-----------------------------------------------------------------------------------------------------------------------------------------------
+
+def job_deltas(old=None, new=None):
+    """Counter changes moving a job from state `old` to `new`, either may be None."""
+    deltas = Counter()
+    if old:
+        deltas.subtract(job_keys(old))
+    if new:
+        deltas.update(job_keys(new))
+    return deltas
+
+
+@transaction.atomic
+def apply_counter_deltas(deltas):
+    """Add each {(scope, owner id, key): delta} to its counter, creating missing rows."""
+    # Sorted so concurrent writers lock the rows in the same order
+    for (scope, owner_id, key), delta in sorted(deltas.items(), key=lambda item: (item[0][0], str(item[0][1]), item[0][2])):
+        if not delta:
+            continue
+        counters = JobCounter.objects.filter(scope=scope, owner_id=owner_id, key=key)
+        if counters.update(count=F('count') + delta):
+            continue
+        try:
+            with transaction.atomic():
+                JobCounter.objects.create(scope=scope, owner_id=owner_id, key=key, count=delta)
+        except IntegrityError:
+            # Created concurrently
+            counters.update(count=F('count') + delta)
+
+
+@transaction.atomic
+def save_counted_job(job, save):
+    """Run `save` for `job` and apply its counter deltas in the same transaction.
+
+    The old row is read with select_for_update, concurrent edits of the job
+    queue behind each other instead of both counting from the same state.
+    """
+    old = None
+    if not job._state.adding:
+        old = Job.objects.select_for_update().filter(pk=job.pk).values(*COUNTED_FIELDS).first()
+    save()
+    apply_counter_deltas(job_deltas(old, job_state(job)))
+
+
+def update_shortlist_counters(job_id, delta):
+    """Count `delta` talents tagged on (or removed from) one job."""
+    job = Job.objects.filter(pk=job_id).values('company_id', 'recruiter_id').first()
+    if job and delta:
+        apply_counter_deltas({key: delta for key in shortlist_keys(job)})
+
+
+def remove_shortlist_counters(rows):
+    """Uncount the JobShortlist queryset `rows` before it is deleted, one grouped query."""
+    deltas = Counter()
+    owners = rows.values(company_id=F('job__company_id'), recruiter_id=F('job__recruiter_id')).annotate(tagged=Count('id')).order_by()
+    for job in owners:
+        for key in shortlist_keys(job):
+            deltas[key] -= job['tagged']
+    apply_counter_deltas(deltas)
+
+
+def delete_owner_counters(scope, owner_id):
+    JobCounter.objects.filter(scope=scope, owner_id=owner_id).delete()
+
+
+# -------------------------------------Reads-----------------------------------------------------------------------------------------------------------------------------------------------
+
+def job_stats(scope, owner_id, today=None):
+    """Dashboard aggregates of one company or recruiter from its counter rows."""
+    today = (today or timezone.now().date()).isoformat()
+    stats = {'jobs': 0, 'open_jobs': 0, 'shortlisted': 0, 'by_job_sitting': {}, 'by_division': {}}
+    ended = 0
+    recruiters = {}
+    for key, count in JobCounter.objects.filter(scope=scope, owner_id=owner_id).values_list('key', 'count'):
+        if not count:
+            continue
+        name, _, value = key.partition(':')
+        if name in ('jobs', 'shortlisted'):
+            stats[name] = count
+        elif name == 'ends':
+            if value < today:
+                ended += count
+        elif name == 'recruiter':
+            recruiters[value] = count
+        else:
+            stats[f'by_{name}'][value] = count
+    stats['open_jobs'] = stats['jobs'] - ended
+
+    if scope == 'company':
+        # Keyed by the recruiter's user id, like every other recruiter reference in the API
+        user_ids = {
+            str(recruiter_id): str(user_id)
+            for recruiter_id, user_id in Recruiter.objects.filter(id__in=recruiters).values_list('id', 'user_id')
+        }
+        stats['by_recruiter'] = {
+            user_ids[recruiter_id]: count for recruiter_id, count in recruiters.items() if recruiter_id in user_ids
+        }
+    return stats
+
+
+# -------------------------------------Reconciliation-----------------------------------------------------------------------------------------------------------------------------------------------
+
+def expected_counters(chunk_size=2000):
+    """Every counter computed from the jobs and shortlist tables: {(scope, owner id, key): count}."""
+    counts = Counter()
+    # Grouped by id, jobs with the same counted fields are still separate jobs
+    jobs = Job.objects.values('id', *COUNTED_FIELDS).annotate(shortlisted=Count('shortlist')).order_by()
+    for job in jobs.iterator(chunk_size=chunk_size):
+        counts.update(job_keys(job))
+        for key in shortlist_keys(job):
+            counts[key] += job['shortlisted']
+    return +counts
+
+
+@transaction.atomic
+def reconcile_job_counters(dry_run=False):
+    """Rewrite the counters that differ from the tables, returns {'created', 'updated', 'deleted'}."""
+    # Locked first: concurrent job writes wait for the rebuilt values instead of being overwritten
+    current = {
+        (scope, owner_id, key): (pk, count)
+        for pk, scope, owner_id, key, count in JobCounter.objects.select_for_update()
+        .values_list('pk', 'scope', 'owner_id', 'key', 'count').iterator()
+    }
+    expected = expected_counters()
+
+    created = [
+        JobCounter(scope=scope, owner_id=owner_id, key=key, count=count)
+        for (scope, owner_id, key), count in expected.items()
+        if (scope, owner_id, key) not in current
+    ]
+    updated = [
+        JobCounter(pk=pk, count=expected[counter])
+        for counter, (pk, count) in current.items()
+        if counter in expected and expected[counter] != count
+    ]
+    # Rows left at zero are dropped too, they are not counted as drift
+    deleted = [pk for counter, (pk, count) in current.items() if counter not in expected]
+    stale = sum(1 for counter, (pk, count) in current.items() if counter not in expected and count)
+
+    if not dry_run:
+        JobCounter.objects.bulk_create(created, batch_size=1000)
+        JobCounter.objects.bulk_update(updated, ['count'], batch_size=1000)
+        for start in range(0, len(deleted), 1000):
+            JobCounter.objects.filter(pk__in=deleted[start:start + 1000]).delete()
+    result = {'created': len(created), 'updated': len(updated), 'deleted': stale}
+    users_logger.info(f"Job counters reconciled{' (dry run)' if dry_run else ''}: {result}")
+    return result
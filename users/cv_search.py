@@ -0,0 +1,223 @@
+"""
+CV text extraction and full-text search.
+
+Uploading a CV only queues a `CVDocument`. The `extract_cv_text` Celery task
+parses the PDF once, stores its text and the database keeps the full-text
+index in step with it (see migration 0009): a generated tsvector column with
+a GIN index on Postgres, an FTS5 table fed by triggers on SQLite. Searches and
+CV match scores only query that index, PDFs are never read again.
+
+Scores are normalized to [0, 1): ts_rank_cd with normalization 32 on
+Postgres, -bm25 / (1 - bm25) on SQLite. They rank CVs against each other
+but are not comparable between the two databases.
+"""
+
+import logging, re
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from PyPDF2 import PdfReader
+from PyPDF2.errors import PyPdfError
+from .matching import job_tokens
+from .models import CVDocument, Talent
+
+
+users_logger = logging.getLogger('users')
+
+PDF_MAGIC = b'%PDF'
+MAX_QUERY_WORDS = 32
+
+_whitespace = re.compile(r'\s+')
+_words = re.compile(r'\w+')
+
+
+class InvalidCV(ValueError):
+    pass
+
+
+# -------------------------------------Extraction-----------------------------------------------------------------------------------------------------------------------------------------------
+
+def queue_cv_extraction(talent):
+    """Queue the talent's current CV for extraction, drops the document when the CV was removed."""
+    source = talent.cv.name
+    if not source:
+        CVDocument.objects.filter(talent=talent).delete()
+        return
+    document = CVDocument.objects.filter(talent=talent).only('source', 'status').first()
+    if document and document.source == source and document.status != 'failed':
+        return
+    CVDocument.objects.update_or_create(
+        talent=talent,
+        defaults={'source': source, 'status': 'pending', 'error': None},
+    )
+
+    def schedule():
+        from .tasks import extract_cv_text
+        try:
+            extract_cv_text.apply_async((talent.pk,), retry=False)
+        except Exception as e:
+            # Still pending, the periodic extract_pending_cvs task picks it up
+            users_logger.warning(f"Could not queue CV extraction for talent {talent.pk}: {e}")
+    transaction.on_commit(schedule)
+
+
+def read_pdf_text(name):
+    """(text, page count) of the stored PDF `name`, capped at CV_MAX_PAGES / CV_MAX_CHARS."""
+    with default_storage.open(name, 'rb') as f:
+        if f.read(len(PDF_MAGIC)) != PDF_MAGIC:
+            raise InvalidCV('Not a PDF file')
+        f.seek(0)
+        try:
+            reader = PdfReader(f)
+            pages = []
+            length = 0
+            for page in reader.pages[:settings.CV_MAX_PAGES]:
+                text = _whitespace.sub(' ', page.extract_text() or '').strip()
+                pages.append(text)
+                length += len(text) + 1
+                if length >= settings.CV_MAX_CHARS:
+                    break
+            page_count = len(reader.pages)
+        except (PyPdfError, ValueError, KeyError, TypeError) as e:
+            raise InvalidCV(f'Unreadable PDF: {e}')
+    return '\n'.join(pages)[:settings.CV_MAX_CHARS], page_count
+
+
+def extract_cv_text(talent_id):
+    """Extract the pending CV of one talent, returns the document status or None when there is nothing to do."""
+    document = CVDocument.objects.filter(talent_id=talent_id, status='pending').first()
+    if not document:
+        return None
+
+    # Blobs are content addressed: the same path means the same file, reuse its text
+    done = (
+        CVDocument.objects.filter(source=document.source, status='ready')
+        .exclude(pk=document.pk)
+        .values_list('text', 'page_count')
+        .first()
+    )
+    try:
+        text, page_count = done or read_pdf_text(document.source)
+        status, error = 'ready', None
+    except (InvalidCV, OSError) as e:
+        text, page_count = '', 0
+        status, error = 'failed', str(e)[:1000]
+        users_logger.warning(f"CV extraction failed for talent {talent_id}: {e}")
+
+    # Only if the CV did not change while it was being parsed
+    updated = CVDocument.objects.filter(pk=document.pk, source=document.source, status='pending').update(
+        text=text, page_count=page_count, status=status, error=error,
+        extracted_at=timezone.now(), updated_at=timezone.now(),
+    )
+    if updated:
+        users_logger.debug(f"CV of talent {talent_id} {status} ({page_count} pages, {len(text)} chars)")
+    return status
+
+
+def extract_pending_cvs(batch_size=100):
+    """Extract up to `batch_size` pending CVs, oldest first, returns how many were processed."""
+    talent_ids = list(
+        CVDocument.objects.filter(status='pending').order_by('updated_at').values_list('talent_id', flat=True)[:batch_size]
+    )
+    for talent_id in talent_ids:
+        extract_cv_text(talent_id)
+    return len(talent_ids)
+
+
+# -------------------------------------Search-----------------------------------------------------------------------------------------------------------------------------------------------
+
+def query_words(text):
+    return _words.findall(text.lower())[:MAX_QUERY_WORDS]
+
+
+def _search_postgres(tsquery, query, limit, talent_id=None):
+    # `tsquery` is the SQL function building the query, `query` its only parameter
+    talent_filter = 'AND d.talent_id = %s' if talent_id else ''
+    sql = f"""
+        SELECT d.talent_id, ts_rank_cd(d.search_vector, q, 32) AS score
+        FROM users_cvdocument d, {tsquery}('english', %s) q
+        WHERE d.status = 'ready' AND d.search_vector @@ q {talent_filter}
+        ORDER BY score DESC, d.talent_id
+        LIMIT %s
+    """
+    params = [query, talent_id, limit] if talent_id else [query, limit]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(row_talent_id, float(score)) for row_talent_id, score in cursor.fetchall()]
+
+
+def _search_sqlite(match, limit, talent_id=None):
+    talent_filter = 'AND d.talent_id = %s' if talent_id else ''
+    sql = f"""
+        SELECT d.talent_id, bm25(users_cvdocument_fts) AS rank
+        FROM users_cvdocument_fts JOIN users_cvdocument d ON d.id = users_cvdocument_fts.rowid
+        WHERE users_cvdocument_fts MATCH %s AND d.status = 'ready' {talent_filter}
+        ORDER BY rank, d.talent_id
+        LIMIT %s
+    """
+    params = [match, talent_id, limit] if talent_id else [match, limit]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        # bm25 is negative, lower is better
+        return [(row_talent_id, -rank / (1 - rank)) for row_talent_id, rank in cursor.fetchall()]
+
+
+def search_cv_index(text, limit=20, talent_id=None):
+    """[(talent pk, score)] of the CVs containing every word of `text`, best first."""
+    words = query_words(text)
+    if not words:
+        return []
+    if connection.vendor == 'postgresql':
+        # websearch_to_tsquery takes raw user input safely, ANDs the words and stems them
+        return _search_postgres('websearch_to_tsquery', ' '.join(words), limit, talent_id)
+    if connection.vendor == 'sqlite':
+        return _search_sqlite(' '.join(f'"{word}"' for word in words), limit, talent_id)
+    raise NotImplementedError(f'No CV index on {connection.vendor}')
+
+
+def match_cv_index(job, limit=20, talent_id=None):
+    """[(talent pk, score)] of the CVs mentioning any of the job requirements, best first."""
+    phrases = [words for words in map(query_words, sorted(job_tokens(job))) if words][:MAX_QUERY_WORDS]
+    if not phrases:
+        return []
+    if connection.vendor == 'postgresql':
+        # Multi-word requirements are phrases ("machine <-> learning"), any requirement matches
+        query = ' | '.join('(' + ' <-> '.join(words) + ')' for words in phrases)
+        return _search_postgres('to_tsquery', query, limit, talent_id)
+    if connection.vendor == 'sqlite':
+        return _search_sqlite(' OR '.join('"' + ' '.join(words) + '"' for words in phrases), limit, talent_id)
+    raise NotImplementedError(f'No CV index on {connection.vendor}')
+
+
+def with_talents(ranked):
+    """Attach the talent names to [(talent pk, score)], in the job_matches response format."""
+    talents = Talent.objects.select_related('user').only(
+        'id', 'user_id', 'user__first_name', 'user__last_name'
+    ).in_bulk([talent_id for talent_id, _ in ranked])
+    return [
+        {
+            'talent_id': talents[talent_id].user_id,
+            'first_name': talents[talent_id].user.first_name,
+            'last_name': talents[talent_id].user.last_name,
+            'score': round(score, 4),
+        }
+        for talent_id, score in ranked
+        if talent_id in talents
+    ]
+
+
+def search_cvs(text, limit=20):
+    return with_talents(search_cv_index(text, limit))
+
+
+def cv_matches(job, limit=20):
+    return with_talents(match_cv_index(job, limit))
+
+
+def cv_match_score(job, talent):
+    """Match score of the talent's extracted CV against the job, None when it has no extracted CV."""
+    if not CVDocument.objects.filter(talent=talent, status='ready').exists():
+        return None
+    ranked = match_cv_index(job, limit=1, talent_id=talent.pk)
+    return round(ranked[0][1], 4) if ranked else 0.0
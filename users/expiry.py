@@ -0,0 +1,78 @@
+"""
+Job expiry.
+
+A job ends on its end_date but nothing is written then. The `expire_jobs`
+sweep (beat entry 'expire-jobs') takes ended jobs out of the live set in
+batches, each one transaction of set based statements:
+
+- one UPDATE stamping expired_at (and updated_at) and clearing is_relevant;
+- the batch's shortlist rows uncounted and deleted, its JobMatch rows deleted;
+- the jobs removed from their companies' open_jobs, whose user_detail
+  payloads are invalidated.
+
+Listings read Job.objects.live(), served by partial indexes over the rows
+with expired_at IS NULL, so expired jobs cost them nothing however many pile
+up. A job whose end date is moved forward again is live again (Job.save and
+spreadsheet imports). is_relevant is not restored then, the sweep does not
+keep what it was: it stays cleared until the recruiter sets it again.
+The dashboard counters need no change, open jobs are derived from the end
+dates (see users.counters).
+"""
+
+import logging
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .cache import invalidate_user_details
+from .counters import remove_shortlist_counters
+from .models import Company, Job, JobMatch, JobShortlist
+
+
+users_logger = logging.getLogger('users')
+
+
+def expirable_jobs(today=None):
+    """Live jobs whose end date is before `today`."""
+    today = today or timezone.now().date()
+    return Job.objects.live().filter(end_date__lt=today)
+
+
+def expire_job_batch(today=None, batch_size=None):
+    """Expire up to `batch_size` ended jobs, returns how many were expired."""
+    batch_size = batch_size or settings.JOB_EXPIRY_BATCH_SIZE
+    now = timezone.now()
+    open_jobs = Company.open_jobs.through.objects
+    with transaction.atomic():
+        # Locked until the batch commits, jobs being edited are left to the next run
+        job_ids = list(
+            expirable_jobs(today).order_by('end_date', 'pk').select_for_update(skip_locked=True)
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not job_ids:
+            return 0
+        Job.objects.filter(pk__in=job_ids).update(expired_at=now, is_relevant=False, updated_at=now)
+
+        shortlist = JobShortlist.objects.filter(job_id__in=job_ids)
+        remove_shortlist_counters(shortlist)
+        shortlist.delete()
+        JobMatch.objects.filter(job_id__in=job_ids).delete()
+
+        owners = set(open_jobs.filter(job_id__in=job_ids).values_list('company__user_id', flat=True))
+        open_jobs.filter(job_id__in=job_ids).delete()
+
+    if owners:
+        invalidate_user_details(owners)
+    return len(job_ids)
+
+
+def expire_jobs(today=None, batch_size=None):
+    """Expire every ended job batch by batch, returns how many were expired."""
+    batch_size = batch_size or settings.JOB_EXPIRY_BATCH_SIZE
+    expired = 0
+    while True:
+        count = expire_job_batch(today, batch_size)
+        expired += count
+        if count < batch_size:
+            break
+    users_logger.info(f"Job expiry sweep expired {expired} jobs")
+    return expired
@@ -0,0 +1,207 @@
+"""
+Read only fast path of the list serializers.
+
+A ModelSerializer builds every row field by field through get_attribute and
+to_representation, most of the CPU time of a long list. A RowPlan builds the
+same data from `.values()` rows instead: it is compiled once per serializer
+and field selection (see SparseFieldsMixin) into one converter per field,
+each returning what the field's to_representation would:
+
+- UUIDs as strings, dates in the field's format (JobSerializer's %d-%m-%Y),
+  ISO datetimes in the current time zone;
+- file fields as their storage URL;
+- nested serializers from the joined `user__...` columns;
+- method fields from the serializer's `row_<name>(request, *columns)`, the
+  columns listed in Meta.field_columns, or `rows_<name>(request, pks)` which
+  loads the field for a whole page at once.
+
+A selection with a field that has no row version (many to many fields,
+method fields without row_ / rows_) has no plan and callers use the
+serializer. users.tests checks both render the same bytes.
+
+Converted rows come as a RowList telling users.renderers whether orjson can
+write their floats (float and JSON columns, rows_ values are checked, row_
+values must not hold floats).
+"""
+
+import datetime, functools
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.fields import ISO_8601
+from rest_framework.settings import api_settings
+from .renderers import exact_floats
+
+
+COLUMN, DATETIME, NESTED, COMPUTED, BATCHED = range(5)
+
+# Fields whose to_representation returns the database value unchanged
+PASSTHROUGH = (
+    serializers.CharField, serializers.EmailField, serializers.URLField, serializers.IntegerField,
+    serializers.BooleanField, serializers.JSONField, serializers.ReadOnlyField, serializers.PrimaryKeyRelatedField,
+)
+
+
+class Unsupported(Exception):
+    pass
+
+
+class RowList(list):
+    exact_floats = False
+
+
+def date_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATE_FORMAT)
+    if output_format is None:
+        return None
+    if output_format.lower() == ISO_8601:
+        return datetime.date.isoformat
+    return lambda value: value.strftime(output_format)
+
+
+def column_converter(field):
+    """One argument converter of a non null column value, None when it is sent as is."""
+    if isinstance(field, serializers.UUIDField):
+        return str if field.uuid_format == 'hex_verbose' else field.to_representation
+    if isinstance(field, serializers.DateTimeField):
+        return field.to_representation
+    if isinstance(field, serializers.DateField):
+        return date_converter(field)
+    if isinstance(field, serializers.FloatField):
+        return float
+    if type(field) in PASSTHROUGH and getattr(field, 'pk_field', None) is None and not getattr(field, 'binary', False):
+        return None
+    return field.to_representation
+
+
+def file_url(field, model_field):
+    storage = model_field.storage
+    use_url = getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL)
+
+    def url(request, name):
+        if not name:
+            return None
+        if not use_url:
+            return name
+        url = storage.url(name)
+        return request.build_absolute_uri(url) if request is not None else url
+    return url
+
+
+class RowPlan:
+    """Converters of the selected fields of one serializer, applied to `.values()` rows."""
+
+    def __init__(self, serializer, prefix=''):
+        opts = serializer.Meta.model._meta
+        field_columns = getattr(serializer.Meta, 'field_columns', {})
+        self.pk = prefix + opts.pk.name
+        self.lookups = [self.pk]
+        self.steps = []
+        self.batches = []
+        # Columns that may hold floats
+        self.float_lookups = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            row_method = getattr(serializer, f'row_{name}', None)
+            rows_method = getattr(serializer, f'rows_{name}', None)
+            if row_method is not None:
+                keys = [prefix + column for column in field_columns.get(name, ())]
+                self.lookups += keys
+                self.steps.append((name, COMPUTED, keys, row_method))
+                continue
+            if rows_method is not None:
+                if prefix:
+                    raise Unsupported(name)
+                self.batches.append((name, rows_method))
+                self.steps.append((name, BATCHED, None, None))
+                continue
+            if len(field.source_attrs) != 1 or isinstance(field, (serializers.ManyRelatedField, serializers.ListSerializer)):
+                raise Unsupported(name)
+            try:
+                model_field = opts.get_field(field.source)
+            except FieldDoesNotExist:
+                raise Unsupported(name)
+            if model_field.many_to_many or model_field.one_to_many:
+                raise Unsupported(name)
+            key = prefix + field.source
+            if isinstance(field, serializers.BaseSerializer):
+                nested = RowPlan(field, f'{key}__')
+                self.lookups += nested.lookups
+                self.float_lookups += nested.float_lookups
+                self.steps.append((name, NESTED, None, nested))
+            elif (
+                isinstance(field, serializers.DateTimeField) and not hasattr(field, 'timezone')
+                and getattr(field, 'format', api_settings.DATETIME_FORMAT).lower() == ISO_8601
+            ):
+                # Aware values are converted here, anything else by the field
+                self.lookups.append(key)
+                self.steps.append((name, DATETIME, key, field.to_representation))
+            elif isinstance(field, serializers.FileField):
+                self.lookups.append(key)
+                self.steps.append((name, COMPUTED, [key], file_url(field, model_field)))
+            else:
+                convert = column_converter(field)
+                self.lookups.append(key)
+                self.steps.append((name, COLUMN, key, convert))
+                if convert is float or convert == field.to_representation or isinstance(field, serializers.JSONField):
+                    self.float_lookups.append(key)
+        self.lookups = list(dict.fromkeys(self.lookups))
+
+    def values(self, queryset):
+        """`queryset` as the `.values()` rows this plan converts."""
+        return queryset.values(*self.lookups)
+
+    def convert(self, rows, request=None):
+        """serializer(instances, many=True).data of `rows`, `request` is the serializer context's."""
+        rows = list(rows)
+        batches = {name: load(request, [row[self.pk] for row in rows]) for name, load in self.batches}
+        # DateTimeField.enforce_timezone looks the zone up for every value
+        tz = timezone.get_current_timezone() if settings.USE_TZ else None
+        data = RowList(self.row(row, request, batches, tz) for row in rows)
+        data.exact_floats = (
+            all(exact_floats(row[key]) for key in self.float_lookups for row in rows)
+            and all(exact_floats(list(values.values())) for values in batches.values())
+        )
+        return data
+
+    def row(self, row, request, batches, tz):
+        data = {}
+        for name, kind, key, convert in self.steps:
+            if kind == COLUMN:
+                value = row[key]
+                data[name] = value if value is None or convert is None else convert(value)
+            elif kind == DATETIME:
+                value = row[key]
+                if value is None:
+                    data[name] = None
+                elif tz is not None and value.utcoffset() is not None:
+                    value = value.astimezone(tz).isoformat()
+                    data[name] = value[:-6] + 'Z' if value.endswith('+00:00') else value
+                else:
+                    data[name] = convert(value)
+            elif kind == NESTED:
+                data[name] = None if row[convert.pk] is None else convert.row(row, request, batches, tz)
+            elif kind == COMPUTED:
+                data[name] = convert(request, *[row[column] for column in key])
+            else:
+                data[name] = batches[name][row[self.pk]]
+        return data
+
+
+@functools.lru_cache(maxsize=256)
+def row_plan(serializer_class, fields=None, expand=None):
+    """RowPlan of serializer_class for a `fields` / `expand` selection, None when a field has no row version."""
+    try:
+        return RowPlan(serializer_class(fields=fields, expand=expand))
+    except Unsupported:
+        return None
+
+
+def serialize_list(serializer_class, queryset, fields=None, expand=None):
+    """serializer_class(queryset, many=True, fields=fields, expand=expand).data, from `.values()` rows when it can."""
+    plan = row_plan(serializer_class, fields, expand)
+    if plan is None:
+        return serializer_class(serializer_class.sparse_queryset(queryset, fields, expand), many=True, fields=fields, expand=expand).data
+    return plan.convert(plan.values(queryset))
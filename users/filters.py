@@ -0,0 +1,83 @@
+from django.utils import timezone
+from rest_framework import serializers
+
+
+# Search parameters accepted by the talents endpoint, mapped to the indexed Talent columns
+TALENT_EXACT_FILTERS = {
+    'residence': 'residence',
+    'job_type': 'job_type',
+    'job_sitting': 'job_sitting',
+}
+
+
+def _parse_number(params, key):
+    value = params.get(key)
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise serializers.ValidationError({key: 'Enter a valid number.'})
+
+
+def _parse_age(params, key):
+    value = _parse_number(params, key)
+    if value is None:
+        return None
+    if value < 0:
+        raise serializers.ValidationError({key: 'Age can not be negative.'})
+    return int(value)
+
+
+def years_ago(today, years):
+    # 29/02 has no counterpart on non leap years, fall back to the 28th
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:
+        return today.replace(year=today.year - years, day=28)
+
+
+def filter_talents(queryset, params):
+    """Narrow a Talent queryset by the search query params.
+
+    Every filter translates to a plain comparison on a stored column so the
+    database can serve it from an index; age bands are turned into
+    ``birth_date`` ranges instead of being computed per row.
+    """
+    for param, field in TALENT_EXACT_FILTERS.items():
+        values = [value for value in params.getlist(param) if value]
+        if len(values) == 1:
+            queryset = queryset.filter(**{field: values[0]})
+        elif values:
+            queryset = queryset.filter(**{f'{field}__in': values})
+
+    min_salary = _parse_number(params, 'min_salary')
+    max_salary = _parse_number(params, 'max_salary')
+    if min_salary is not None:
+        queryset = queryset.filter(desired_salary__gte=min_salary)
+    if max_salary is not None:
+        queryset = queryset.filter(desired_salary__lte=max_salary)
+
+    min_age = _parse_age(params, 'min_age')
+    max_age = _parse_age(params, 'max_age')
+    today = timezone.now().date()
+    if min_age is not None:
+        # Old enough: born on or before the date `min_age` years ago
+        queryset = queryset.filter(birth_date__lte=years_ago(today, min_age))
+    if max_age is not None:
+        # Young enough: not yet `max_age + 1` years old
+        queryset = queryset.filter(birth_date__gt=years_ago(today, max_age + 1))
+
+    return queryset
+
+
+def filter_jobs(queryset, params):
+    """Narrow a Job listing to the live jobs, unless ``include_expired`` is set."""
+    value = params.get('include_expired')
+    if value in (None, ''):
+        return queryset.live()
+    try:
+        include_expired = serializers.BooleanField().to_internal_value(value)
+    except serializers.ValidationError:
+        raise serializers.ValidationError({'include_expired': 'Must be a valid boolean.'})
+    return queryset if include_expired else queryset.live()
@@ -0,0 +1,48 @@
+"""
+Password hashers with their cost taken from settings.
+
+Each one keeps the algorithm name of the Django hasher it extends, so hashes
+stored before a cost change still verify. Django's `must_update` compares
+the stored parameters with the configured ones, and `user.check_password`
+re-hashes a mismatching password on the next successful login. Changing the
+cost (or PASSWORD_HASHER) therefore migrates users transparently as they sign in.
+"""
+
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, PBKDF2PasswordHasher, ScryptPasswordHasher
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS or PBKDF2PasswordHasher.iterations
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    # Memory use is 128 * work_factor * block_size bytes per hash
+    @property
+    def work_factor(self):
+        return settings.PASSWORD_SCRYPT_WORK_FACTOR
+
+    @property
+    def block_size(self):
+        return settings.PASSWORD_SCRYPT_BLOCK_SIZE
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_SCRYPT_PARALLELISM
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    # Needs argon2-cffi, only loaded when an argon2 hash is created or checked
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_ARGON2_PARALLELISM
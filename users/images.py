@@ -0,0 +1,192 @@
+"""
+Profile picture processing.
+
+Uploads are stored as received and handed to the `process_profile_picture`
+Celery task, which fully decodes them, rejects anything that is not a sane
+image and rewrites the original without metadata (EXIF, GPS, ICC, comments).
+
+Square variants (VARIANT_SIZES x WebP/JPEG) are produced lazily the first
+time the `profile_picture_variant` endpoint is hit and stored next to the
+original, e.g. `.../me.png` -> `.../me_128.webp`. Their URLs are cached, so
+later hits are a cache lookup and a redirect to the stored file.
+"""
+
+import hashlib, io, logging, os
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.urls import reverse
+from PIL import Image, ImageOps, UnidentifiedImageError
+from .models import Recruiter, Talent
+
+
+users_logger = logging.getLogger('users')
+
+VARIANT_SIZES = (64, 128, 512)
+# format -> (Pillow format, extension, save options)
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+ALLOWED_FORMATS = ('JPEG', 'PNG', 'WEBP')
+PROFILE_MODELS = {'Talent': Talent, 'Recruiter': Recruiter}
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+# -------------------------------------Decoding-----------------------------------------------------------------------------------------------------------------------------------------------
+
+def decode_image(name):
+    """Open, verify and fully decode a stored image, upright and without metadata."""
+    try:
+        with default_storage.open(name, 'rb') as f:
+            image = Image.open(f)
+            if image.format not in ALLOWED_FORMATS:
+                raise InvalidImage(f'Unsupported image format {image.format}')
+            width, height = image.size
+            # Checked before decoding, a tiny file can claim billions of pixels
+            if width * height > settings.IMAGE_MAX_PIXELS:
+                raise InvalidImage(f'Image is too large ({width}x{height})')
+            image.verify()
+
+            # verify() leaves the image unusable, decode from the start again
+            f.seek(0)
+            image = Image.open(f)
+            image.load()
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise InvalidImage(str(e))
+
+    fmt = image.format
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+    # Nothing from the source file is written back out
+    image.info = {}
+    image.format = fmt
+    return image
+
+
+def encode_image(image, fmt, **options):
+    if fmt == 'JPEG' and image.mode != 'RGB':
+        # JPEG has no alpha, flatten on white
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A') if image.mode == 'RGBA' else None)
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+# -------------------------------------Originals-----------------------------------------------------------------------------------------------------------------------------------------------
+
+def strip_original(name):
+    """Re-encode the stored original in its own format without metadata, returns False if it is not an image."""
+    try:
+        image = decode_image(name)
+    except InvalidImage as e:
+        users_logger.warning(f"Rejected profile picture {name}: {e}")
+        return False
+
+    options = {'optimize': True} if image.format == 'PNG' else {'quality': 90}
+    data = encode_image(image, image.format, **options)
+    default_storage.delete(name)
+    # Same name, the stored path does not change
+    default_storage.save(name, ContentFile(data))
+    return True
+
+
+def process_profile_picture(profile_type, user_id, name):
+    """Validate and strip a freshly uploaded picture, clears the field when it is not a usable image."""
+    profile = PROFILE_MODELS[profile_type].objects.filter(user_id=user_id).first()
+    if not profile or profile.profile_picture.name != name:
+        # Replaced or deleted before the task ran
+        return
+    if not strip_original(name):
+        delete_picture_files(name)
+        profile.profile_picture = None
+        profile.save(update_fields=['profile_picture'])
+        return
+    users_logger.debug(f"Profile picture {name} processed for {profile_type.lower()}_id={user_id}")
+
+
+def schedule_profile_picture_processing(profile_type, user_id, name):
+    """Process the picture in a worker once the upload is committed."""
+    def schedule():
+        from .tasks import process_profile_picture as task
+        try:
+            task.apply_async((profile_type, str(user_id), name), retry=False)
+        except Exception as e:
+            # No broker, metadata must still go: do it here
+            users_logger.warning(f"Could not queue profile picture processing, processing inline: {e}")
+            process_profile_picture(profile_type, user_id, name)
+    transaction.on_commit(schedule)
+
+
+# -------------------------------------Variants-----------------------------------------------------------------------------------------------------------------------------------------------
+
+def variant_name(name, size, fmt):
+    return f'{os.path.splitext(name)[0]}_{size}.{VARIANT_FORMATS[fmt][1]}'
+
+
+def variant_cache_key(name, size, fmt):
+    digest = hashlib.sha1(name.encode()).hexdigest()
+    return f'image_variant:{digest}:{size}:{fmt}'
+
+
+def get_variant_url(name, size, fmt):
+    """URL of the `size` px `fmt` variant of the picture `name`, generating it on first use."""
+    key = variant_cache_key(name, size, fmt)
+    url = cache.get(key)
+    if url:
+        return url
+
+    path = variant_name(name, size, fmt)
+    if not default_storage.exists(path):
+        image = ImageOps.fit(decode_image(name), (size, size), Image.LANCZOS)
+        pillow_format, _, options = VARIANT_FORMATS[fmt]
+        path = default_storage.save(path, ContentFile(encode_image(image, pillow_format, **options)))
+        users_logger.debug(f"Generated variant {path}")
+
+    url = default_storage.url(path)
+    cache.set(key, url, settings.IMAGE_VARIANT_CACHE_TIMEOUT)
+    return url
+
+
+def delete_picture_files(name):
+    """Delete an original and every variant generated from it."""
+    if not name:
+        return
+    default_storage.delete(name)
+    for size in VARIANT_SIZES:
+        for fmt in VARIANT_FORMATS:
+            default_storage.delete(variant_name(name, size, fmt))
+            cache.delete(variant_cache_key(name, size, fmt))
+
+
+def variant_urls(profile, request=None):
+    """{size: {format: url}} for serializers, None without a picture.
+
+    URLs point at the lazy variant endpoint, versioned by the picture name so
+    a new picture is never served from a stale browser cache.
+    """
+    return picture_variant_urls(profile.profile_picture.name, profile.user_id, request)
+
+
+def picture_variant_urls(name, user_id, request=None):
+    """variant_urls from the stored picture name and the profile's user id."""
+    if not name:
+        return None
+    version = hashlib.sha1(name.encode()).hexdigest()[:10]
+    urls = {}
+    for size in VARIANT_SIZES:
+        urls[str(size)] = {}
+        for fmt in VARIANT_FORMATS:
+            url = reverse('profile_picture_variant', kwargs={'user_id': user_id, 'size': size, 'fmt': fmt})
+            url = f'{url}?v={version}'
+            urls[str(size)][fmt] = request.build_absolute_uri(url) if request else url
+    return urls
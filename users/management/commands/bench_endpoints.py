@@ -0,0 +1,461 @@
+import csv, datetime, hashlib, io, json, threading, uuid
+from django.contrib.auth.tokens import default_token_generator
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+from PIL import Image
+from rest_framework_simplejwt.tokens import RefreshToken
+from users.benchmark import (
+    CITIES, JOB_TYPES, SEED_EMAIL_PREFIX, SEED_PASSWORD, SKILLS, delete_population, run_load, seed_email, seed_population,
+    seeded_users,
+)
+from users.models import Company, CustomUser, Job, Recruiter, Talent
+from users.spreadsheets import LIST_SEPARATOR
+
+
+# Smallest PDF the upload views accept, every upload appends its request number so it is new content
+PDF = b'%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n2 0 obj<</Type/Pages/Count 0/Kids[]>>endobj\ntrailer<</Root 1 0 R>>\n%%EOF\n'
+
+# Routes of users/urls.py that are not benchmarked: external OAuth flows, session logout,
+# destructive or password changing requests and the scrape endpoint
+SKIPPED_ROUTES = (
+    'google_login', 'google_calendar_auth', 'logout', 'reset_password', 'profile_picture_variant', 'metrics',
+)
+
+
+def png(i):
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (i % 256, (i // 256) % 256, 128)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class Endpoints:
+    """One method per benchmarked endpoint: (client, request number) -> response."""
+
+    # name -> (user role, URL name)
+    ROUTES = {
+        'signin': (None, 'signin'),
+        'token_obtain_pair': (None, 'token_obtain_pair'),
+        'token_refresh': (None, 'token_refresh'),
+        'get_user': (None, 'get_user'),
+        'validate_reset_token': (None, 'validate_reset_token'),
+        'talent_signup': (None, 'talent_signup'),
+        'company_signup': (None, 'company_signup'),
+        'recruiter_signup': (None, 'recruiter_signup'),
+        'check_auth': ('talent', 'check_auth'),
+        'user_detail': ('talent', 'user_detail'),
+        'talent_open_processes': ('talent', 'talent_open_processes'),
+        'complete_profile': ('talent', 'complete_talent_profile'),
+        'manage_cv': ('talent', 'manage_cv'),
+        'manage_recommendation_letter': ('talent', 'manage_recommendation_letter'),
+        'manage_profile_pic': ('talent', 'manage_profile_pic'),
+        'resumable_upload': ('talent', 'resumable_upload'),
+        'get_talents': ('company', 'get_talents'),
+        'cv_search': ('company', 'cv_search'),
+        'companies_detail': ('company', 'companies_detail'),
+        'company_recruiters': ('company', 'company_recruiters'),
+        'company_jobs': ('company', 'company-jobs'),
+        'company_job_stats': ('company', 'company_job_stats'),
+        'manage_jobs_get': ('company', 'manage_jobs'),
+        'manage_jobs_put': ('company', 'manage_jobs'),
+        'create_job': ('company', 'create_job'),
+        'job_matches': ('company', 'job_matches'),
+        'job_cv_matches': ('company', 'job_cv_matches'),
+        'manage_tags': ('company', 'manage_tags'),
+        'manage_tags_bulk': ('company', 'manage_tags_bulk'),
+        'bulk_create_jobs': ('company', 'bulk_create_jobs'),
+        'bulk_onboard_recruiters': ('company', 'bulk_onboard_recruiters'),
+        'export_data': ('company', 'export_data'),
+        'import_data': ('company', 'import_data'),
+        'get_inactive_users': ('company', 'get_inactive_users'),
+        'recruiter_jobs': ('recruiter', 'recruiter-jobs'),
+        'recruiter_job_stats': ('recruiter', 'recruiter_job_stats'),
+        'manage_recruiters': ('recruiter', 'manage_recruiters'),
+    }
+
+    def __init__(self, run_id, users_per_role):
+        self.run_id = run_id
+        seeded = seeded_users()
+        self.talents = list(
+            Talent.objects.filter(user__in=seeded, user__email__startswith=f'{SEED_EMAIL_PREFIX}talent-')
+            .order_by('user__email').values('id', 'user_id', 'user__email')
+        )
+        self.companies = list(
+            Company.objects.filter(user__in=seeded, user__email__startswith=f'{SEED_EMAIL_PREFIX}company-')
+            .order_by('user__email').values('id', 'user_id')
+        )
+        self.recruiters = list(
+            Recruiter.objects.filter(user__in=seeded, user__email__startswith=f'{SEED_EMAIL_PREFIX}recruiter-', company__isnull=False)
+            .order_by('user__email').values('id', 'user_id', 'company__user_id')
+        )
+        self.jobs = list(
+            Job.objects.filter(company__user__in=seeded).order_by('id')
+            .values('id', 'company__user_id', 'company_id', 'recruiter_id', 'title', 'job_type', 'job_sitting', 'end_date')
+        )
+        if not (self.talents and self.companies and self.jobs):
+            raise CommandError('No benchmark population, run without --no-seed first')
+
+        # Signed in users per role, requests go round robin over them
+        self.users = {
+            'talent': [talent['user_id'] for talent in self.talents[:users_per_role]],
+            'company': [company['user_id'] for company in self.companies[:users_per_role]],
+            'recruiter': [recruiter['user_id'] for recruiter in self.recruiters[:users_per_role]],
+        }
+        # The claims signin puts in its tokens
+        recruiter_companies = {recruiter['user_id']: str(recruiter['company__user_id']) for recruiter in self.recruiters}
+        self.tokens = {}
+        for user in CustomUser.objects.filter(id__in=[user_id for ids in self.users.values() for user_id in ids]):
+            refresh = RefreshToken.for_user(user)
+            refresh['user_type'] = user.user_type
+            refresh['first_name'] = user.first_name
+            refresh['last_name'] = user.last_name
+            refresh['company_id'] = recruiter_companies.get(user.id)
+            refresh['user_id'] = str(user.id)
+            self.tokens[user.id] = (str(refresh.access_token), str(refresh))
+        self.jobs_by_company = {}
+        for job in self.jobs:
+            self.jobs_by_company.setdefault(job['company__user_id'], []).append(job)
+        reset_users = CustomUser.objects.filter(id__in=[talent['user_id'] for talent in self.talents[:users_per_role]])
+        self.reset_tokens = [(user.email, default_token_generator.make_token(user)) for user in reset_users]
+
+    def user(self, role, i):
+        users = self.users[role]
+        return users[i % len(users)]
+
+    def auth(self, user_id):
+        return {'HTTP_AUTHORIZATION': f'Bearer {self.tokens[user_id][0]}'}
+
+    def company_job(self, i):
+        """(company user id, one of its jobs)."""
+        company_id = self.user('company', i)
+        jobs = self.jobs_by_company.get(company_id) or self.jobs
+        return company_id, jobs[i % len(jobs)]
+
+    def anonymous(self, i):
+        # Auth endpoints are throttled per address, every request comes from another one
+        return {'REMOTE_ADDR': f'10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}'}
+
+    def signup_email(self, kind, i):
+        return seed_email(f'signup-{kind}-{self.run_id}', i)
+
+    # -------------------------------------Auth-------------------------------------
+
+    def signin(self, client, i):
+        email = self.talents[i % len(self.talents)]['user__email']
+        return client.post(reverse('signin'), {'email': email, 'password': SEED_PASSWORD}, content_type='application/json', **self.anonymous(i))
+
+    def token_obtain_pair(self, client, i):
+        email = self.talents[i % len(self.talents)]['user__email']
+        return client.post(reverse('token_obtain_pair'), {'username': email, 'password': SEED_PASSWORD}, content_type='application/json')
+
+    def token_refresh(self, client, i):
+        refresh = self.tokens[self.user('talent', i)][1]
+        return client.post(reverse('token_refresh'), {'refresh': refresh}, content_type='application/json')
+
+    def get_user(self, client, i):
+        email = self.talents[i % len(self.talents)]['user__email']
+        return client.post(reverse('get_user'), {'email': email}, content_type='application/json', **self.anonymous(i))
+
+    def validate_reset_token(self, client, i):
+        email, token = self.reset_tokens[i % len(self.reset_tokens)]
+        return client.post(reverse('validate_reset_token'), {'email': email, 'token': token}, content_type='application/json', **self.anonymous(i))
+
+    def talent_signup(self, client, i):
+        data = {'email': self.signup_email('talent', i), 'password': SEED_PASSWORD, 'first_name': 'Bench', 'last_name': 'Talent', 'gender': 'other'}
+        return client.post(reverse('talent_signup'), data, content_type='application/json', **self.anonymous(i))
+
+    def company_signup(self, client, i):
+        data = {
+            'email': self.signup_email('company', i), 'password': SEED_PASSWORD, 'name': f'Bench {i}',
+            'website': 'https://benchmark.invalid', 'address': CITIES[i % len(CITIES)], 'phone_number': '0501234567',
+        }
+        return client.post(reverse('company_signup'), data, content_type='application/json', **self.anonymous(i))
+
+    def recruiter_signup(self, client, i):
+        data = {
+            'email': self.signup_email('recruiter', i), 'password': SEED_PASSWORD, 'first_name': 'Bench', 'last_name': 'Recruiter',
+            'division': 'R&D', 'position': 'Recruiter', 'gender': 'other', 'phone_number': '0501234567',
+            'company': str(self.user('company', i)),
+        }
+        return client.post(reverse('recruiter_signup'), data, content_type='application/json', **self.anonymous(i))
+
+    # -------------------------------------Talent-------------------------------------
+
+    def check_auth(self, client, i):
+        return client.get(reverse('check_auth'), **self.auth(self.user('talent', i)))
+
+    def user_detail(self, client, i):
+        user_id = self.user('talent', i)
+        return client.get(reverse('user_detail', kwargs={'user_id': user_id}), **self.auth(user_id))
+
+    def talent_open_processes(self, client, i):
+        user_id = self.user('talent', i)
+        return client.get(reverse('talent_open_processes', kwargs={'talent_id': user_id}), **self.auth(user_id))
+
+    def complete_profile(self, client, i):
+        data = {'phone_number': f'05{i % 100000000:08d}'}
+        return client.post(reverse('complete_talent_profile'), data, content_type='application/json', **self.auth(self.user('talent', i)))
+
+    def manage_cv(self, client, i):
+        user_id = self.user('talent', i)
+        upload = SimpleUploadedFile('cv.pdf', PDF + f'%{self.run_id}-{i}\n'.encode(), content_type='application/pdf')
+        return client.post(reverse('manage_cv', kwargs={'talent_id': user_id}), {'cv': upload}, **self.auth(user_id))
+
+    def manage_recommendation_letter(self, client, i):
+        user_id = self.user('talent', i)
+        upload = SimpleUploadedFile('letter.pdf', PDF + f'%{self.run_id}-{i}\n'.encode(), content_type='application/pdf')
+        url = reverse('manage_recommendation_letter', kwargs={'user_id': user_id})
+        return client.post(url, {'recommendation_letter': upload}, **self.auth(user_id))
+
+    def manage_profile_pic(self, client, i):
+        user_id = self.user('talent', i)
+        upload = SimpleUploadedFile('me.png', png(i), content_type='image/png')
+        return client.post(reverse('manage_profile_pic', kwargs={'user_id': user_id}), {'profile_picture': upload}, **self.auth(user_id))
+
+    def resumable_upload(self, client, i):
+        # The whole flow: start, one chunk, complete
+        auth = self.auth(self.user('talent', i))
+        content = PDF + f'%{self.run_id}-resumable-{i}\n'.encode()
+        started = client.post(
+            reverse('start_resumable_upload'), {'kind': 'cv', 'filename': 'cv.pdf', 'size': len(content)},
+            content_type='application/json', **auth,
+        )
+        if started.status_code != 201:
+            return started
+        upload_id = started.json()['upload_id']
+        chunk = client.put(
+            reverse('resumable_upload', kwargs={'upload_id': upload_id}), content,
+            content_type='application/octet-stream', HTTP_UPLOAD_OFFSET='0', **auth,
+        )
+        if chunk.status_code != 200:
+            return chunk
+        return client.post(
+            reverse('complete_resumable_upload', kwargs={'upload_id': upload_id}),
+            {'sha256': hashlib.sha256(content).hexdigest()}, content_type='application/json', **auth,
+        )
+
+    # -------------------------------------Company-------------------------------------
+
+    def get_talents(self, client, i):
+        filters = ({}, {'job_sitting': 'Remote'}, {'residence': CITIES[i % len(CITIES)]}, {'min_salary': 10000, 'max_salary': 30000})
+        return client.get(reverse('get_talents'), filters[i % len(filters)], **self.auth(self.user('company', i)))
+
+    def cv_search(self, client, i):
+        query = ' '.join(SKILLS[(i + offset) % len(SKILLS)] for offset in range(2))
+        return client.get(reverse('cv_search'), {'q': query}, **self.auth(self.user('company', i)))
+
+    def companies_detail(self, client, i):
+        return client.get(reverse('companies_detail'), **self.auth(self.user('company', i)))
+
+    def company_recruiters(self, client, i):
+        company_id = self.user('company', i)
+        return client.get(reverse('company_recruiters', kwargs={'company_id': company_id}), **self.auth(company_id))
+
+    def company_jobs(self, client, i):
+        company_id = self.user('company', i)
+        return client.get(reverse('company-jobs', kwargs={'company_id': company_id}), **self.auth(company_id))
+
+    def company_job_stats(self, client, i):
+        company_id = self.user('company', i)
+        return client.get(reverse('company_job_stats', kwargs={'company_id': company_id}), **self.auth(company_id))
+
+    def manage_jobs_get(self, client, i):
+        company_id, job = self.company_job(i)
+        return client.get(reverse('manage_jobs', kwargs={'job_id': job['id']}), **self.auth(company_id))
+
+    def manage_jobs_put(self, client, i):
+        company_id, job = self.company_job(i)
+        data = {
+            'title': job['title'], 'company': str(job['company_id']), 'job_type': job['job_type'],
+            'job_sitting': job['job_sitting'], 'end_date': str(job['end_date']),
+            'requirements': [SKILLS[(i + offset) % len(SKILLS)] for offset in range(3)],
+        }
+        if job['recruiter_id']:
+            data['recruiter'] = str(job['recruiter_id'])
+        return client.put(reverse('manage_jobs', kwargs={'job_id': job['id']}), data, content_type='application/json', **self.auth(company_id))
+
+    def job_row(self, i):
+        return {
+            'title': f'Benchmark job {self.run_id} {i}', 'job_type': JOB_TYPES[i % len(JOB_TYPES)], 'job_sitting': 'Hybrid',
+            'location': CITIES[i % len(CITIES)], 'requirements': [SKILLS[i % len(SKILLS)], SKILLS[(i + 7) % len(SKILLS)]],
+            'end_date': str(datetime.date.today() + datetime.timedelta(days=30)),
+        }
+
+    def create_job(self, client, i):
+        company_id = self.user('company', i)
+        url = reverse('create_job', kwargs={'company_id': company_id})
+        return client.post(url, self.job_row(i), content_type='application/json', **self.auth(company_id))
+
+    def job_matches(self, client, i):
+        company_id, job = self.company_job(i)
+        return client.get(reverse('job_matches', kwargs={'job_id': job['id']}), **self.auth(company_id))
+
+    def job_cv_matches(self, client, i):
+        company_id, job = self.company_job(i)
+        return client.get(reverse('job_cv_matches', kwargs={'job_id': job['id']}), **self.auth(company_id))
+
+    def manage_tags(self, client, i):
+        # Tag then untag, the shortlist ends as it started
+        company_id, job = self.company_job(i)
+        url = reverse('manage_tags', kwargs={'job_id': job['id']})
+        talent_id = str(self.talents[-1 - i % len(self.talents)]['user_id'])
+        tagged = client.post(url, {'talent_id': talent_id, 'match_by_form': 0.5, 'match_by_cv': 0.5}, content_type='application/json', **self.auth(company_id))
+        if tagged.status_code != 200:
+            return tagged
+        return client.delete(url, {'talent_id': talent_id}, content_type='application/json', **self.auth(company_id))
+
+    def manage_tags_bulk(self, client, i):
+        company_id, job = self.company_job(i)
+        url = reverse('manage_tags_bulk', kwargs={'job_id': job['id']})
+        talent_ids = [str(self.talents[(i * 10 + offset) % len(self.talents)]['user_id']) for offset in range(10)]
+        data = {'talents': [{'talent_id': talent_id, 'match_by_form': 0.5} for talent_id in talent_ids]}
+        tagged = client.post(url, data, content_type='application/json', **self.auth(company_id))
+        if tagged.status_code >= 400:
+            return tagged
+        return client.delete(url, {'talent_ids': talent_ids}, content_type='application/json', **self.auth(company_id))
+
+    def bulk_create_jobs(self, client, i):
+        company_id = self.user('company', i)
+        url = reverse('bulk_create_jobs', kwargs={'company_id': company_id})
+        data = {'jobs': [self.job_row(i * 10 + offset) for offset in range(10)]}
+        return client.post(url, data, content_type='application/json', **self.auth(company_id))
+
+    def bulk_onboard_recruiters(self, client, i):
+        company_id = self.user('company', i)
+        url = reverse('bulk_onboard_recruiters', kwargs={'company_id': company_id})
+        rows = [
+            {'email': self.signup_email('bulk-recruiter', i * 5 + offset), 'first_name': 'Bench', 'last_name': 'Recruiter'}
+            for offset in range(5)
+        ]
+        return client.post(url, {'recruiters': rows}, content_type='application/json', **self.auth(company_id))
+
+    def export_data(self, client, i):
+        company_id = self.user('company', i)
+        file_format = ('csv', 'xlsx')[i % 2]
+        return client.get(reverse('export_data', kwargs={'entity': 'jobs'}), {'type': file_format}, **self.auth(company_id))
+
+    def import_data(self, client, i):
+        company_id = self.user('company', i)
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, ('title', 'job_type', 'job_sitting', 'location', 'requirements', 'end_date'))
+        writer.writeheader()
+        for row in map(self.job_row, range(i * 10, i * 10 + 10)):
+            writer.writerow({**row, 'requirements': LIST_SEPARATOR.join(row['requirements'])})
+        upload = SimpleUploadedFile('jobs.csv', buffer.getvalue().encode(), content_type='text/csv')
+        return client.post(reverse('import_data', kwargs={'entity': 'jobs'}), {'file': upload}, **self.auth(company_id))
+
+    def get_inactive_users(self, client, i):
+        return client.get(reverse('get_inactive_users'), {'limit': 100}, **self.auth(self.user('company', i)))
+
+    # -------------------------------------Recruiter-------------------------------------
+
+    def recruiter_jobs(self, client, i):
+        user_id = self.user('recruiter', i)
+        return client.get(reverse('recruiter-jobs', kwargs={'recruiter_id': user_id}), **self.auth(user_id))
+
+    def recruiter_job_stats(self, client, i):
+        user_id = self.user('recruiter', i)
+        return client.get(reverse('recruiter_job_stats', kwargs={'recruiter_id': user_id}), **self.auth(user_id))
+
+    def manage_recruiters(self, client, i):
+        recruiter = self.recruiters[i % len(self.recruiters)]
+        return client.get(reverse('manage_recruiters', kwargs={'recruiter_id': recruiter['id']}), **self.auth(self.user('recruiter', i)))
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a synthetic population and measure throughput, latency percentiles and queries per request '
+        'of every endpoint of users/urls.py, in process, at a fixed concurrency'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', type=int, default=5)
+        parser.add_argument('--recruiters-per-company', type=int, default=3)
+        parser.add_argument('--jobs', type=int, default=200)
+        parser.add_argument('--talents', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=42, help='Faker seed, the same seed and sizes give the same data')
+        parser.add_argument('--no-seed', action='store_true', help='Reuse the population of an earlier --keep run')
+        parser.add_argument('--keep', action='store_true', help='Keep the population (and what the run created) afterwards')
+        parser.add_argument('--requests', type=int, default=100, help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per endpoint first')
+        parser.add_argument('--concurrency', type=int, default=4, help='Client threads')
+        parser.add_argument('--users', type=int, default=50, help='Signed in users per role, round robin')
+        parser.add_argument('--endpoints', help='Comma separated subset of: ' + ', '.join(Endpoints.ROUTES))
+        parser.add_argument('--output', help='Write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        for option in ('companies', 'jobs', 'talents', 'requests', 'concurrency', 'users'):
+            if options[option] < 1:
+                raise CommandError(f'--{option} must be positive')
+        names = list(Endpoints.ROUTES)
+        if options['endpoints']:
+            names = [name.strip() for name in options['endpoints'].split(',') if name.strip()]
+            unknown = set(names) - set(Endpoints.ROUTES)
+            if unknown:
+                raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+        population = None
+        if not options['no_seed']:
+            self.stdout.write('Seeding the benchmark population...')
+            population = seed_population(
+                companies=options['companies'], recruiters_per_company=options['recruiters_per_company'],
+                jobs=options['jobs'], talents=options['talents'], seed=options['seed'],
+            )
+
+        try:
+            endpoints = Endpoints(uuid.uuid4().hex[:8], options['users'])
+            results = {}
+            for name in names:
+                results[name] = self.run(endpoints, name, options)
+                self.report(name, results[name])
+        finally:
+            connections.close_all()
+            if not options['keep']:
+                delete_population()
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({
+                    'started_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                    'database': connection.vendor,
+                    'seed': options['seed'],
+                    'population': population,
+                    'requests': options['requests'],
+                    'warmup': options['warmup'],
+                    'concurrency': options['concurrency'],
+                    'skipped_routes': SKIPPED_ROUTES,
+                    'endpoints': results,
+                }, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def run(self, endpoints, name, options):
+        role, url_name = Endpoints.ROUTES[name]
+        send = getattr(endpoints, name)
+        local = threading.local()
+        # Request numbers keep growing across the warm up and the timed run, so nothing is created twice
+        offset = options['warmup']
+
+        def call(i):
+            # One client per thread, like one connection per worker thread. Server errors are
+            # counted, not raised, and the host must be one ALLOWED_HOSTS accepts
+            if not hasattr(local, 'client'):
+                local.client = Client(raise_request_exception=False, HTTP_HOST='localhost')
+            response = send(local.client, i)
+            if response.streaming:
+                # Exports are only done once the last chunk is produced
+                for _ in response.streaming_content:
+                    pass
+            return response.status_code < 400
+
+        if options['warmup']:
+            run_load(call, options['warmup'], options['concurrency'])
+        result = run_load(lambda i: call(offset + i), options['requests'], options['concurrency'], count_queries=True)
+        return {'url_name': url_name, 'role': role, **result}
+
+    def report(self, name, result):
+        self.stdout.write(
+            f"{name}: {result['requests_per_second']} req/s, p50 {result['p50_ms']}ms, p99 {result['p99_ms']}ms, "
+            f"{result['queries_per_request']} queries/request (max {result['max_queries']}), {result['errors']} errors"
+        )
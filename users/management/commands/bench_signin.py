@@ -0,0 +1,108 @@
+import contextlib, json, threading
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+from users.benchmark import run_load
+from users.models import CustomUser
+from users.throttling import AUTH_THROTTLES, TokenBucketThrottle
+
+
+BENCH_EMAIL = 'bench-signin-{}@benchmark.invalid'
+BENCH_PASSWORD = 'Bench-signin-0'
+# Every request signs in from the same address to one of a few accounts
+BENCH_THROTTLE_RATE = '1000000/s'
+
+
+@contextlib.contextmanager
+def unthrottled_auth():
+    """Raise the auth throttle rates, the buckets are still checked but never run out."""
+    # Read from the class on every request, override_settings would not reach them
+    TokenBucketThrottle.THROTTLE_RATES = {
+        **TokenBucketThrottle.THROTTLE_RATES, **{throttle.scope: BENCH_THROTTLE_RATE for throttle in AUTH_THROTTLES}
+    }
+    try:
+        yield
+    finally:
+        del TokenBucketThrottle.THROTTLE_RATES
+
+
+class Command(BaseCommand):
+    help = 'Measure signin requests/sec and latency percentiles for one worker with the configured password hasher'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Signin requests to time')
+        parser.add_argument('--concurrency', type=int, default=1, help='Threads, 1 for a sync worker, N for gthread workers')
+        parser.add_argument('--users', type=int, default=20, help='Benchmark users to sign in, round robin')
+        parser.add_argument('--hasher', choices=('pbkdf2', 'scrypt', 'argon2'), help='Override PASSWORD_HASHER for this run')
+        parser.add_argument('--json', action='store_true', help='Print the result as JSON')
+        parser.add_argument('--force', action='store_true', help='Run with DEBUG off, benchmark users are created and deleted')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests, --users and --concurrency must be positive')
+        if not settings.DEBUG and not options['force']:
+            raise CommandError(
+                f"DEBUG is off, refusing to create benchmark users in the {connection.settings_dict['NAME']} database "
+                "(pass --force if it is a disposable one)"
+            )
+
+        overrides = {}
+        if options['hasher']:
+            preferred = settings.PASSWORD_HASHER_CHOICES[options['hasher']]
+            overrides['PASSWORD_HASHERS'] = [preferred] + [h for h in settings.PASSWORD_HASHERS if h != preferred]
+
+        with override_settings(**overrides), unthrottled_auth():
+            emails = self.create_users(options['users'])
+            try:
+                result = self.run(emails, options)
+            finally:
+                CustomUser.objects.filter(email__in=emails).delete()
+
+        if options['json']:
+            self.stdout.write(json.dumps(result))
+        else:
+            self.stdout.write(
+                f"{result['hasher']}: {result['requests_per_second']} req/s, "
+                f"p50 {result['p50_ms']}ms, p95 {result['p95_ms']}ms, p99 {result['p99_ms']}ms, "
+                f"max {result['max_ms']}ms ({result['requests']} requests, {result['errors']} errors, "
+                f"concurrency {result['concurrency']})"
+            )
+        if result['errors']:
+            raise CommandError(f"{result['errors']} of {result['requests']} signin requests failed")
+
+    def create_users(self, count):
+        emails = [BENCH_EMAIL.format(i) for i in range(count)]
+        CustomUser.objects.filter(email__in=emails).delete()
+        for email in emails:
+            CustomUser.objects.create_user(
+                username=email, email=email, password=BENCH_PASSWORD, user_type='Talent', first_name='Bench'
+            )
+        return emails
+
+    def run(self, emails, options):
+        url = reverse('signin')
+        local = threading.local()
+
+        def signin(i):
+            # One client per thread, like one connection per worker thread. Server errors are
+            # counted, not raised, and the host must be one ALLOWED_HOSTS accepts
+            if not hasattr(local, 'client'):
+                local.client = Client(raise_request_exception=False, HTTP_HOST='localhost')
+            response = local.client.post(
+                url, {'email': emails[i % len(emails)], 'password': BENCH_PASSWORD}, content_type='application/json'
+            )
+            return response.status_code == 200
+
+        try:
+            # Warm up: first login per user, also re-hashes any user made with another hasher
+            warmup = run_load(signin, len(emails), options['concurrency'])
+            if warmup['errors']:
+                raise CommandError(f"{warmup['errors']} of {warmup['requests']} warm up signin requests failed")
+            result = run_load(signin, options['requests'], options['concurrency'])
+        finally:
+            connections.close_all()
+
+        return {'hasher': get_hasher().algorithm, 'concurrency': options['concurrency'], **result}
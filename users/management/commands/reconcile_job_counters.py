@@ -0,0 +1,19 @@
+import time
+from django.core.management.base import BaseCommand
+from users.counters import reconcile_job_counters
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the company / recruiter job counters from the jobs and shortlist tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report the counters that drifted')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        result = reconcile_job_counters(dry_run=options['dry_run'])
+        elapsed = time.perf_counter() - started
+        verb = 'Would fix' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result['created']} missing, {result['updated']} wrong and {result['deleted']} stale counters in {elapsed:.2f}s"
+        ))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from users.matching import rebuild_skill_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the talent skills / job requirements inverted index from scratch'
+
+    def handle(self, *args, **options):
+        talent_count, job_count = rebuild_skill_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {talent_count} talents and {job_count} jobs'))
@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand
+from users.matching import rematch_open_jobs
+
+
+class Command(BaseCommand):
+    help = 'Score every open job against every open to work talent and store the best matches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=100, help='Matches kept per job')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Talents scored per matrix block')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk INSERT')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = rematch_open_jobs(
+            top=options['top'],
+            chunk_size=options['chunk_size'],
+            batch_size=options['batch_size'],
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Stored {count} matches in {elapsed:.2f}s'))
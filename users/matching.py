@@ -0,0 +1,382 @@
+import logging, re
+import numpy as np
+from django.db import transaction
+from django.db.models import Case, ExpressionWrapper, F, FloatField, Q, Sum, Value, When
+from django.utils import timezone
+from .models import Job, JobMatch, JobSkill, Talent, TalentSkill
+
+
+users_logger = logging.getLogger('users')
+
+# Weights of the job <-> talent score. Requirement hits are normalized by the
+# number of requirements, so a talent covering every requirement with skills
+# scores SKILL_WEIGHT + the job_type / job_sitting bonuses.
+SKILL_WEIGHT = 1.0
+LANGUAGE_WEIGHT = 0.5
+JOB_TYPE_WEIGHT = 0.25
+JOB_SITTING_WEIGHT = 0.25
+
+TOKEN_MAX_LENGTH = 100
+INDEX_BATCH_SIZE = 1000
+
+_whitespace = re.compile(r'\s+')
+
+
+# -------------------------------------Tokens-----------------------------------------------------------------------------------------------------------------------------------------------
+
+def normalize_token(value):
+    # Entries are usually plain strings, but tolerate {"name": ...} objects sent by older clients
+    if isinstance(value, dict):
+        value = value.get('name') or value.get('skill') or value.get('language')
+    if not isinstance(value, str):
+        return None
+    token = _whitespace.sub(' ', value).strip().lower()
+    return token[:TOKEN_MAX_LENGTH] or None
+
+
+def tokenize(values):
+    if not isinstance(values, (list, tuple)):
+        return set()
+    return {token for token in map(normalize_token, values) if token}
+
+
+def talent_tokens(talent):
+    """Return the (kind, token) pairs a talent should be indexed under."""
+    return (
+        {('skill', token) for token in tokenize(talent.skills)}
+        | {('language', token) for token in tokenize(talent.languages)}
+    )
+
+
+def job_tokens(job):
+    return tokenize(job.requirements)
+
+
+# -------------------------------------Index maintenance-----------------------------------------------------------------------------------------------------------------------------------------------
+
+def reindex_talent(talent):
+    """Sync the inverted index rows of one talent, touching only the tokens that changed."""
+    wanted = talent_tokens(talent)
+    existing = {
+        (kind, token): pk
+        for pk, kind, token in TalentSkill.objects.filter(talent=talent).values_list('id', 'kind', 'token')
+    }
+
+    stale = [pk for key, pk in existing.items() if key not in wanted]
+    missing = [TalentSkill(talent=talent, kind=kind, token=token) for kind, token in wanted - existing.keys()]
+
+    with transaction.atomic():
+        if stale:
+            TalentSkill.objects.filter(id__in=stale).delete()
+        if missing:
+            TalentSkill.objects.bulk_create(missing, ignore_conflicts=True)
+
+
+def reindex_job(job):
+    """Sync the requirement tokens of one job, touching only the tokens that changed."""
+    wanted = job_tokens(job)
+    existing = dict(JobSkill.objects.filter(job=job).values_list('token', 'id'))
+
+    stale = [pk for token, pk in existing.items() if token not in wanted]
+    missing = [JobSkill(job=job, token=token) for token in wanted - existing.keys()]
+
+    with transaction.atomic():
+        if stale:
+            JobSkill.objects.filter(id__in=stale).delete()
+        if missing:
+            JobSkill.objects.bulk_create(missing, ignore_conflicts=True)
+
+
+def index_jobs(jobs):
+    """Index freshly bulk created jobs, which never go through post_save."""
+    rows = [JobSkill(job=job, token=token) for job in jobs for token in job_tokens(job)]
+    JobSkill.objects.bulk_create(rows, batch_size=INDEX_BATCH_SIZE, ignore_conflicts=True)
+
+
+def reindex_jobs(jobs):
+    """Re-index bulk updated jobs: their tokens are dropped and written again, two queries per batch."""
+    with transaction.atomic():
+        JobSkill.objects.filter(job__in=jobs).delete()
+        index_jobs(jobs)
+
+
+def reindex_talents(talents):
+    """Re-index bulk updated talents, same as reindex_jobs."""
+    rows = [
+        TalentSkill(talent=talent, kind=kind, token=token)
+        for talent in talents
+        for kind, token in talent_tokens(talent)
+    ]
+    with transaction.atomic():
+        TalentSkill.objects.filter(talent__in=talents).delete()
+        TalentSkill.objects.bulk_create(rows, batch_size=INDEX_BATCH_SIZE, ignore_conflicts=True)
+
+
+def rebuild_skill_index():
+    """Rebuild both indexes from scratch, used for backfills and after bulk imports."""
+    with transaction.atomic():
+        TalentSkill.objects.all().delete()
+        JobSkill.objects.all().delete()
+
+        rows = []
+        talent_count = 0
+        for talent in Talent.objects.only('id', 'skills', 'languages').iterator(chunk_size=INDEX_BATCH_SIZE):
+            talent_count += 1
+            rows.extend(TalentSkill(talent_id=talent.id, kind=kind, token=token) for kind, token in talent_tokens(talent))
+            if len(rows) >= INDEX_BATCH_SIZE:
+                TalentSkill.objects.bulk_create(rows)
+                rows = []
+        TalentSkill.objects.bulk_create(rows)
+
+        rows = []
+        job_count = 0
+        for job in Job.objects.only('id', 'requirements').iterator(chunk_size=INDEX_BATCH_SIZE):
+            job_count += 1
+            rows.extend(JobSkill(job_id=job.id, token=token) for token in job_tokens(job))
+            if len(rows) >= INDEX_BATCH_SIZE:
+                JobSkill.objects.bulk_create(rows)
+                rows = []
+        JobSkill.objects.bulk_create(rows)
+
+    users_logger.info('Skill index rebuilt for %s talents and %s jobs', talent_count, job_count)
+    return talent_count, job_count
+
+
+# -------------------------------------Ranking-----------------------------------------------------------------------------------------------------------------------------------------------
+
+def _field_bonus(lookup, value, weight):
+    if not value:
+        return Value(0.0)
+    return Case(When(**{lookup: value}, then=Value(weight)), default=Value(0.0), output_field=FloatField())
+
+
+def rank_talents(job, limit=20):
+    """Return the top `limit` open to work talents for a job, best match first.
+
+    Candidates are collected through the token index, so only talents sharing
+    at least one requirement are looked at, and the weighted score is computed
+    and ordered by the database.
+    """
+    tokens = list(job.skill_tokens.values_list('token', flat=True))
+    if not tokens:
+        return []
+
+    overlap = Sum(
+        Case(
+            When(kind='skill', then=Value(SKILL_WEIGHT)),
+            default=Value(LANGUAGE_WEIGHT),
+            output_field=FloatField(),
+        )
+    )
+    score = ExpressionWrapper(
+        F('overlap') / Value(float(len(tokens)))
+        + _field_bonus('talent__job_type__iexact', job.job_type, JOB_TYPE_WEIGHT)
+        + _field_bonus('talent__job_sitting__iexact', job.job_sitting, JOB_SITTING_WEIGHT),
+        output_field=FloatField(),
+    )
+
+    ranked = list(
+        TalentSkill.objects.filter(token__in=tokens, talent__is_open_to_work=True)
+        .values('talent_id', 'talent__job_type', 'talent__job_sitting')
+        .annotate(overlap=overlap)
+        .annotate(score=score)
+        .order_by('-score', 'talent_id')
+        .values_list('talent_id', 'score')[:limit]
+    )
+
+    talents = Talent.objects.select_related('user').in_bulk([talent_id for talent_id, _ in ranked])
+    return [
+        {
+            'talent_id': talents[talent_id].user_id,
+            'first_name': talents[talent_id].user.first_name,
+            'last_name': talents[talent_id].user.last_name,
+            'score': round(score, 4),
+        }
+        for talent_id, score in ranked
+        if talent_id in talents
+    ]
+
+
+def stored_matches(job, limit=20):
+    """The best `limit` JobMatch rows of a job, shaped like rank_talents, empty until the job was rematched."""
+    matches = (
+        JobMatch.objects.filter(job=job, talent__is_open_to_work=True)
+        .order_by('-score', 'talent_id')
+        .values_list('talent__user_id', 'talent__user__first_name', 'talent__user__last_name', 'score')[:limit]
+    )
+    return [
+        {'talent_id': user_id, 'first_name': first_name, 'last_name': last_name, 'score': round(score, 4)}
+        for user_id, first_name, last_name, score in matches
+    ]
+
+
+# -------------------------------------Batch scoring-----------------------------------------------------------------------------------------------------------------------------------------------
+
+def open_jobs(today=None):
+    today = today or timezone.now().date()
+    # Live jobs the sweep has not reached yet are filtered by their end date
+    return Job.objects.live().filter(Q(end_date__isnull=True) | Q(end_date__gte=today))
+
+
+def _category_codes(values, codes):
+    # Map job_type / job_sitting values to ints so equality is a vectorized compare, -1 means unset
+    return np.array(
+        [codes.setdefault(value.strip().lower(), len(codes)) if value else -1 for value in values],
+        dtype=np.int32,
+    )
+
+
+def _top_k(best_scores, best_ids, scores, ids, k):
+    # Keep the k best (score, talent id) pairs per job column across talent blocks
+    scores = np.vstack([best_scores, scores])
+    ids = np.vstack([best_ids, np.broadcast_to(ids[:, None], (len(ids), scores.shape[1]))])
+    if scores.shape[0] > k:
+        keep = np.argpartition(-scores, k - 1, axis=0)[:k]
+        scores = np.take_along_axis(scores, keep, axis=0)
+        ids = np.take_along_axis(ids, keep, axis=0)
+    return scores, ids
+
+
+class _OpenJobsMatrix:
+    """Requirements of the open jobs as a sparse (vocabulary x jobs) 0/1 matrix in CSR form.
+
+    Only the (token, job) pairs that exist are stored: the jobs requiring
+    token t are `indices[indptr[t]:indptr[t + 1]]`. Memory grows with the
+    total number of requirements, not with vocabulary x jobs.
+    """
+
+    def __init__(self, jobs):
+        self.jobs = []
+        self.vocabulary = {}
+        tokens, columns = [], []
+        for job in jobs:
+            job_token_set = job_tokens(job)
+            if not job_token_set:
+                continue
+            for token in job_token_set:
+                tokens.append(self.vocabulary.setdefault(token, len(self.vocabulary)))
+                columns.append(len(self.jobs))
+            self.jobs.append(job)
+
+        tokens = np.array(tokens, dtype=np.int64)
+        columns = np.array(columns, dtype=np.int64)
+        self.indices = columns[np.argsort(tokens, kind='stable')]
+        self.indptr = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(tokens, minlength=len(self.vocabulary)), out=self.indptr[1:])
+        if self.jobs:
+            self.requirement_weight = (1.0 / np.bincount(columns, minlength=len(self.jobs))).astype(np.float32)
+
+        self.type_codes, self.sitting_codes = {}, {}
+        self.job_types = _category_codes([job.job_type for job in self.jobs], self.type_codes)
+        self.job_sittings = _category_codes([job.job_sitting for job in self.jobs], self.sitting_codes)
+
+    def overlap(self, talents):
+        """Weighted requirement overlap of a block of talents with every job, a (talents x jobs) matrix.
+
+        The talents are sparse too, (row, token, weight) triples of the tokens
+        some job requires. Their product with the CSR matrix spreads each
+        weight over the jobs requiring the token, one scatter add for the block.
+        """
+        rows, tokens, weights = [], [], []
+        for row, talent in enumerate(talents):
+            for kind, token in talent_tokens(talent):
+                column = self.vocabulary.get(token)
+                if column is not None:
+                    rows.append(row)
+                    tokens.append(column)
+                    weights.append(SKILL_WEIGHT if kind == 'skill' else LANGUAGE_WEIGHT)
+
+        overlap = np.zeros((len(talents), len(self.jobs)), dtype=np.float32)
+        if not tokens:
+            return overlap
+        tokens = np.array(tokens, dtype=np.int64)
+        starts = self.indptr[tokens]
+        counts = self.indptr[tokens + 1] - starts
+        # Position of each product term inside its token's slice of `indices`
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        job_columns = self.indices[np.repeat(starts, counts) + offsets]
+        cells = np.repeat(np.array(rows, dtype=np.int64), counts) * len(self.jobs) + job_columns
+        np.add.at(overlap.ravel(), cells, np.repeat(np.array(weights, dtype=np.float32), counts))
+        return overlap
+
+    def score(self, talents):
+        """Score a block of talents against every job, returns a (talents x jobs) matrix."""
+        overlap = self.overlap(talents)
+        scores = overlap * self.requirement_weight
+
+        # Values no job uses map to -2, which never equals a job code
+        talent_types = np.array([self.type_codes.get((t.job_type or '').strip().lower(), -2) for t in talents], dtype=np.int32)
+        talent_sittings = np.array([self.sitting_codes.get((t.job_sitting or '').strip().lower(), -2) for t in talents], dtype=np.int32)
+        scores += JOB_TYPE_WEIGHT * (talent_types[:, None] == self.job_types[None, :])
+        scores += JOB_SITTING_WEIGHT * (talent_sittings[:, None] == self.job_sittings[None, :])
+
+        # Like the index based ranking, a talent has to share at least one requirement
+        scores[overlap <= 0] = -np.inf
+        return scores
+
+
+def score_open_jobs(top=100, chunk_size=2000):
+    """Score every open job against every open to work talent.
+
+    Requirements and each block of `chunk_size` talents are encoded as sparse
+    matrices, so the block's requirement overlap with all jobs is a single
+    sparse product. Only the vocabulary of the job requirements is encoded,
+    talent tokens outside of it can never contribute to a score. Only the
+    (talents x jobs) scores of one block are dense, `chunk_size` bounds them.
+    Uses the same weights as `rank_talents`.
+
+    Returns a list of (job_id, talent_id, score) with at most `top` rows per job.
+    """
+    matrix = _OpenJobsMatrix(
+        open_jobs().only('id', 'requirements', 'job_type', 'job_sitting').iterator(chunk_size=chunk_size)
+    )
+    if not matrix.jobs:
+        return []
+
+    best_scores = np.full((0, len(matrix.jobs)), -np.inf, dtype=np.float32)
+    best_ids = np.empty((0, len(matrix.jobs)), dtype=np.int64)
+
+    talents = (
+        Talent.objects.filter(is_open_to_work=True)
+        .only('id', 'skills', 'languages', 'job_type', 'job_sitting')
+        .order_by('id')
+        .iterator(chunk_size=chunk_size)
+    )
+    block = []
+    for talent in talents:
+        block.append(talent)
+        if len(block) == chunk_size:
+            ids = np.fromiter((t.id for t in block), dtype=np.int64, count=len(block))
+            best_scores, best_ids = _top_k(best_scores, best_ids, matrix.score(block), ids, top)
+            block = []
+    if block:
+        ids = np.fromiter((t.id for t in block), dtype=np.int64, count=len(block))
+        best_scores, best_ids = _top_k(best_scores, best_ids, matrix.score(block), ids, top)
+
+    results = []
+    for column, job in enumerate(matrix.jobs):
+        found = np.isfinite(best_scores[:, column])
+        results.extend(
+            (job.id, int(talent_id), float(score))
+            for talent_id, score in zip(best_ids[found, column], best_scores[found, column])
+        )
+    return results
+
+
+def rematch_open_jobs(top=100, chunk_size=2000, batch_size=5000):
+    """Recompute the JobMatch table for all open jobs in one transaction."""
+    results = score_open_jobs(top=top, chunk_size=chunk_size)
+    computed_at = timezone.now()
+
+    with transaction.atomic():
+        JobMatch.objects.all().delete()
+        JobMatch.objects.bulk_create(
+            (
+                JobMatch(job_id=job_id, talent_id=talent_id, score=round(score, 4), computed_at=computed_at)
+                for job_id, talent_id, score in results
+            ),
+            batch_size=batch_size,
+        )
+
+    users_logger.info('Rematch stored %s job matches', len(results))
+    return len(results)
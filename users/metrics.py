@@ -0,0 +1,298 @@
+"""
+Per-endpoint request metrics, exposed in the Prometheus text format.
+
+`MetricsMiddleware` times every request and labels it with the URL name it
+resolved to (users/urls.py). Database queries are counted by a wrapper that
+`install_query_recorder` adds to each connection as it opens, and serializer
+time by timing `BaseSerializer.data`. Both find the current request through a
+context variable, so they also see the queries of async views, which run the
+ORM in sync_to_async threads.
+
+An N+1 shows up as a jump in `db_queries_per_request` and
+`db_duplicate_queries_per_request` (the same SQL run again with other
+parameters) of one view. With METRICS_SLOW_QUERIES = N, the N slowest queries
+of a request above METRICS_SLOW_QUERY_MS are logged with the line of our code
+that ran them.
+
+Metrics live in the memory of each process: every worker exposes its own and
+they start again from zero on restart, Prometheus' rate() handles both.
+"""
+
+import bisect, heapq, logging, os, sys, threading, time
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+
+users_logger = logging.getLogger('users')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Views whose requests are not recorded
+SKIPPED_VIEWS = ('metrics',)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+# -------------------------------------Registry-----------------------------------------------------------------------------------------------------------------------------------------------
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def lines(self):
+        yield f'# HELP {self.name} {self.help_text}'
+        yield f'# TYPE {self.name} {self.kind}'
+        with self.lock:
+            samples = sorted(self.samples.items())
+        for values, sample in samples:
+            yield from self.sample_lines(values, sample)
+
+
+class CounterMetric(Metric):
+    kind = 'counter'
+
+    def inc(self, labels, amount=1):
+        with self.lock:
+            self.samples[labels] = self.samples.get(labels, 0) + amount
+
+    def sample_lines(self, values, total):
+        yield f'{self.name}{_labels(self.label_names, values)} {_number(total)}'
+
+
+class GaugeMetric(CounterMetric):
+    kind = 'gauge'
+
+    def set(self, labels, value):
+        with self.lock:
+            self.samples[labels] = value
+
+
+class HistogramMetric(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        # Per bucket counts, made cumulative when exposed
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            sample = self.samples.get(labels)
+            if sample is None:
+                sample = self.samples[labels] = [[0] * (len(self.buckets) + 1), 0, 0]
+            sample[0][index] += 1
+            sample[1] += value
+            sample[2] += 1
+
+    def sample_lines(self, values, sample):
+        counts, total, count = sample
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+            cumulative += bucket_count
+            le = bound if bound == '+Inf' else _number(float(bound))
+            labels = _labels(self.label_names, values, f'le="{le}"')
+            yield f'{self.name}_bucket{labels} {cumulative}'
+        yield f'{self.name}_sum{_labels(self.label_names, values)} {_number(float(total))}'
+        yield f'{self.name}_count{_labels(self.label_names, values)} {count}'
+
+
+REQUESTS = CounterMetric('http_requests_total', 'Requests by URL name, method and status code.', ('view', 'method', 'status'))
+LATENCY = HistogramMetric('http_request_duration_seconds', 'Request latency by URL name.', ('view', 'method'), LATENCY_BUCKETS)
+RESPONSE_SIZE = HistogramMetric('http_response_size_bytes', 'Response body size by URL name, streamed responses are not counted.', ('view',), SIZE_BUCKETS)
+QUERIES = HistogramMetric('db_queries_per_request', 'Database queries per request by URL name.', ('view',), QUERY_BUCKETS)
+DUPLICATE_QUERIES = HistogramMetric('db_duplicate_queries_per_request', 'Queries repeating the SQL of an earlier query of the same request.', ('view',), QUERY_BUCKETS)
+QUERY_TIME = HistogramMetric('db_query_duration_seconds_per_request', 'Total database time per request by URL name.', ('view',), LATENCY_BUCKETS)
+SERIALIZER_TIME = HistogramMetric('serializer_duration_seconds_per_request', 'Time spent building serializer.data per request by URL name.', ('view',), LATENCY_BUCKETS)
+PROCESS_START = GaugeMetric('process_start_time_seconds', 'Start time of this process since the epoch.')
+PROCESS_START.set((), time.time())
+
+REGISTRY = (REQUESTS, LATENCY, RESPONSE_SIZE, QUERIES, DUPLICATE_QUERIES, QUERY_TIME, SERIALIZER_TIME, PROCESS_START)
+
+
+def render_metrics():
+    """The registry in the Prometheus text exposition format (0.0.4)."""
+    return '\n'.join(line for metric in REGISTRY for line in metric.lines()) + '\n'
+
+
+# -------------------------------------Request recording-----------------------------------------------------------------------------------------------------------------------------------------------
+
+_site_packages = tuple(path for path in sys.path if path.endswith(('site-packages', 'dist-packages')))
+_this_file = os.path.abspath(__file__)
+
+
+def call_site():
+    """'file:line in function' of the innermost project frame on the stack."""
+    frame = sys._getframe(2)
+    while frame:
+        filename = frame.f_code.co_filename
+        if (
+            filename.startswith(settings.BASE_DIR) and filename != _this_file
+            and not filename.startswith(_site_packages)
+        ):
+            return f'{os.path.relpath(filename, settings.BASE_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return 'unknown'
+
+
+class RequestMetrics:
+    """What one request did, filled in by the query wrapper and the serializer timer."""
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.statements = set()
+        self.serializer_time = 0.0
+        self.serializing = 0
+        # Min-heap of (seconds, sequence, sql, call site), the slowest kept
+        self.slow_queries = []
+
+    def add_query(self, sql, elapsed):
+        self.queries += 1
+        self.query_time += elapsed
+        self.statements.add(sql)
+        if settings.METRICS_SLOW_QUERIES and elapsed * 1000 >= settings.METRICS_SLOW_QUERY_MS:
+            # Only slow queries pay for walking the stack
+            entry = (elapsed, self.queries, sql, call_site())
+            if len(self.slow_queries) < settings.METRICS_SLOW_QUERIES:
+                heapq.heappush(self.slow_queries, entry)
+            else:
+                heapq.heappushpop(self.slow_queries, entry)
+
+    @property
+    def duplicate_queries(self):
+        return self.queries - len(self.statements)
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper counting the queries of the current request."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(sql, time.perf_counter() - start)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created receiver: wrap every query of the connection with record_query."""
+    if record_query not in connection.execute_wrappers:
+        # First, execute_wrapper() blocks pop the last wrapper when they exit
+        connection.execute_wrappers.insert(0, record_query)
+
+
+def instrument_serializers():
+    """Time serializer.data, where DRF serializers turn instances into response data."""
+    from rest_framework.serializers import BaseSerializer
+    data = BaseSerializer.data
+    if getattr(data.fget, 'instrumented', False):
+        return
+
+    def timed_data(serializer):
+        metrics = _current.get()
+        if metrics is None or metrics.serializing:
+            # Nested .data calls are already inside the outer timing
+            return data.fget(serializer)
+        metrics.serializing += 1
+        start = time.perf_counter()
+        try:
+            return data.fget(serializer)
+        finally:
+            metrics.serializing -= 1
+            metrics.serializer_time += time.perf_counter() - start
+    timed_data.instrumented = True
+    BaseSerializer.data = property(timed_data)
+
+
+def response_size(response):
+    if isinstance(response, StreamingHttpResponse) or getattr(response, 'streaming', False):
+        length = response.get('Content-Length')
+        return int(length) if length else None
+    return len(response.content)
+
+
+def record_request(request, response, metrics, elapsed):
+    match = getattr(request, 'resolver_match', None)
+    view = (match.view_name if match else None) or 'unmatched'
+    if view in SKIPPED_VIEWS:
+        return
+    REQUESTS.inc((view, request.method, str(response.status_code)))
+    LATENCY.observe((view, request.method), elapsed)
+    QUERIES.observe((view,), metrics.queries)
+    DUPLICATE_QUERIES.observe((view,), metrics.duplicate_queries)
+    QUERY_TIME.observe((view,), metrics.query_time)
+    SERIALIZER_TIME.observe((view,), metrics.serializer_time)
+    size = response_size(response)
+    if size is not None:
+        RESPONSE_SIZE.observe((view,), size)
+
+    if metrics.slow_queries:
+        slowest = sorted(metrics.slow_queries, reverse=True)
+        users_logger.warning(
+            '%s %s (%s): %d queries, %d repeated, %.1f ms in the database, slowest:\n%s',
+            request.method, request.path, view, metrics.queries, metrics.duplicate_queries, metrics.query_time * 1000,
+            '\n'.join(f'  {seconds * 1000:.1f} ms at {site}: {sql[:500]}' for seconds, _, sql, site in slowest),
+        )
+
+
+class MetricsMiddleware:
+    """Records latency, queries, serializer time and response size of every request."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        record_request(request, response, metrics, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        record_request(request, response, metrics, time.perf_counter() - start)
+        return response
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='talent',
+            index=models.Index(fields=['is_open_to_work', 'residence'], name='talent_open_residence_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='talent',
+            index=models.Index(fields=['is_open_to_work', 'job_type'], name='talent_open_job_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='talent',
+            index=models.Index(fields=['is_open_to_work', 'job_sitting'], name='talent_open_job_sitting_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='talent',
+            index=models.Index(fields=['is_open_to_work', 'desired_salary'], name='talent_open_salary_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='talent',
+            index=models.Index(fields=['is_open_to_work', 'birth_date'], name='talent_open_birth_date_idx'),
+        ),
+    ]
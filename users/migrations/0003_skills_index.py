@@ -0,0 +1,101 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:24
+
+import re
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Frozen copy of the tokenizer in users.matching at the time of this migration,
+# so later changes to matching do not change what this migration writes
+TOKEN_MAX_LENGTH = 100
+BATCH_SIZE = 1000
+
+_whitespace = re.compile(r'\s+')
+
+
+def normalize_token(value):
+    if isinstance(value, dict):
+        value = value.get('name') or value.get('skill') or value.get('language')
+    if not isinstance(value, str):
+        return None
+    token = _whitespace.sub(' ', value).strip().lower()
+    return token[:TOKEN_MAX_LENGTH] or None
+
+
+def tokenize(values):
+    if not isinstance(values, (list, tuple)):
+        return set()
+    return {token for token in map(normalize_token, values) if token}
+
+
+def bulk_create_in_chunks(model, rows):
+    # Never more than one batch of rows in memory
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            model.objects.bulk_create(batch)
+            batch = []
+    model.objects.bulk_create(batch)
+
+
+def backfill_skills_index(apps, schema_editor):
+    Talent = apps.get_model('users', 'Talent')
+    TalentSkill = apps.get_model('users', 'TalentSkill')
+    Job = apps.get_model('users', 'Job')
+    JobSkill = apps.get_model('users', 'JobSkill')
+
+    bulk_create_in_chunks(TalentSkill, (
+        TalentSkill(talent_id=talent.id, kind=kind, token=token)
+        for talent in Talent.objects.only('id', 'skills', 'languages').iterator(chunk_size=BATCH_SIZE)
+        for kind, values in (('skill', talent.skills), ('language', talent.languages))
+        for token in tokenize(values)
+    ))
+    bulk_create_in_chunks(JobSkill, (
+        JobSkill(job_id=job.id, token=token)
+        for job in Job.objects.only('id', 'requirements').iterator(chunk_size=BATCH_SIZE)
+        for token in tokenize(job.requirements)
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_talent_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobSkill',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=100)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='skill_tokens', to='users.job')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TalentSkill',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=100)),
+                ('kind', models.CharField(choices=[('skill', 'Skill'), ('language', 'Language')], default='skill', max_length=20)),
+                ('talent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='skill_tokens', to='users.talent')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token', 'kind'], name='talent_skill_token_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='talentskill',
+            constraint=models.UniqueConstraint(fields=('talent', 'kind', 'token'), name='unique_talent_skill_token'),
+        ),
+        migrations.AddIndex(
+            model_name='jobskill',
+            index=models.Index(fields=['token'], name='job_skill_token_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='jobskill',
+            constraint=models.UniqueConstraint(fields=('job', 'token'), name='unique_job_skill_token'),
+        ),
+        migrations.RunPython(backfill_skills_index, migrations.RunPython.noop),
+    ]
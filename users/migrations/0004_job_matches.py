@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_skills_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='users.job')),
+                ('talent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='job_matches', to='users.talent')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['job', '-score'], name='job_match_score_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='jobmatch',
+            constraint=models.UniqueConstraint(fields=('job', 'talent'), name='unique_job_match'),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+BATCH_SIZE = 1000
+
+
+def _score(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def shortlist_rows(Job, Talent, JobShortlist):
+    # One Talent query per batch of jobs, never more than a batch of jobs in memory
+    jobs = Job.objects.exclude(relevant_talents__isnull=True).only('id', 'relevant_talents').iterator(chunk_size=BATCH_SIZE)
+    batch = []
+    for job in jobs:
+        batch.append(job)
+        if len(batch) == BATCH_SIZE:
+            yield from batch_rows(batch, Talent, JobShortlist)
+            batch = []
+    yield from batch_rows(batch, Talent, JobShortlist)
+
+
+def batch_rows(jobs, Talent, JobShortlist):
+    entries = {}
+    for job in jobs:
+        for entry in job.relevant_talents or []:
+            try:
+                entries[(job.id, uuid.UUID(str(entry.get('talent_id'))))] = entry
+            except (AttributeError, ValueError):
+                continue
+
+    talents = dict(Talent.objects.filter(user_id__in={user_id for _, user_id in entries}).values_list('user_id', 'id'))
+    for (job_id, user_id), entry in entries.items():
+        if user_id in talents:
+            yield JobShortlist(
+                job_id=job_id,
+                talent_id=talents[user_id],
+                match_by_cv=_score(entry.get('match_by_cv')),
+                match_by_form=_score(entry.get('match_by_form')),
+            )
+
+
+def copy_relevant_talents(apps, schema_editor):
+    JobShortlist = apps.get_model('users', 'JobShortlist')
+    rows = shortlist_rows(apps.get_model('users', 'Job'), apps.get_model('users', 'Talent'), JobShortlist)
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            JobShortlist.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    JobShortlist.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_job_matches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobShortlist',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('match_by_cv', models.FloatField(blank=True, null=True)),
+                ('match_by_form', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shortlist', to='users.job')),
+                ('talent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shortlisted_for', to='users.talent')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='jobshortlist',
+            constraint=models.UniqueConstraint(fields=('job', 'talent'), name='unique_job_shortlist'),
+        ),
+        migrations.RunPython(copy_relevant_talents, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='job',
+            name='relevant_talents',
+        ),
+    ]
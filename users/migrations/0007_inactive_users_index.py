@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_notification_outbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['is_active', 'last_login'], name='user_active_last_login_idx'),
+        ),
+    ]
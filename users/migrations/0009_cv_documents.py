@@ -0,0 +1,88 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Postgres: a generated column keeps the tsvector in step with `text`, no trigger needed
+POSTGRES_SQL = [
+    "ALTER TABLE users_cvdocument ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('english', coalesce(text, ''))) STORED",
+    "CREATE INDEX cv_search_vector_idx ON users_cvdocument USING GIN (search_vector)",
+]
+POSTGRES_REVERSE_SQL = [
+    "DROP INDEX IF EXISTS cv_search_vector_idx",
+    "ALTER TABLE users_cvdocument DROP COLUMN IF EXISTS search_vector",
+]
+
+# SQLite: external content FTS5 table over users_cvdocument.text, synced by triggers.
+# A later migration that rebuilds users_cvdocument on SQLite drops the triggers and must recreate them
+SQLITE_SQL = [
+    "CREATE VIRTUAL TABLE users_cvdocument_fts USING fts5("
+    "text, content='users_cvdocument', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER users_cvdocument_fts_ai AFTER INSERT ON users_cvdocument BEGIN "
+    "INSERT INTO users_cvdocument_fts(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER users_cvdocument_fts_ad AFTER DELETE ON users_cvdocument BEGIN "
+    "INSERT INTO users_cvdocument_fts(users_cvdocument_fts, rowid, text) VALUES ('delete', old.id, old.text); END",
+    "CREATE TRIGGER users_cvdocument_fts_au AFTER UPDATE OF text ON users_cvdocument BEGIN "
+    "INSERT INTO users_cvdocument_fts(users_cvdocument_fts, rowid, text) VALUES ('delete', old.id, old.text); "
+    "INSERT INTO users_cvdocument_fts(rowid, text) VALUES (new.id, new.text); END",
+]
+SQLITE_REVERSE_SQL = [
+    "DROP TRIGGER IF EXISTS users_cvdocument_fts_au",
+    "DROP TRIGGER IF EXISTS users_cvdocument_fts_ad",
+    "DROP TRIGGER IF EXISTS users_cvdocument_fts_ai",
+    "DROP TABLE IF EXISTS users_cvdocument_fts",
+]
+
+
+def run_vendor_sql(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+def queue_existing_cvs(apps, schema_editor):
+    # Extracted by the periodic extract_pending_cvs task
+    Talent = apps.get_model('users', 'Talent')
+    CVDocument = apps.get_model('users', 'CVDocument')
+    CVDocument.objects.bulk_create(
+        [
+            CVDocument(talent_id=talent_id, source=cv)
+            for talent_id, cv in Talent.objects.exclude(cv='').exclude(cv=None).values_list('id', 'cv').iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_stored_blobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CVDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255)),
+                ('text', models.TextField(blank=True, default='')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('page_count', models.PositiveIntegerField(default=0)),
+                ('extracted_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('talent', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='cv_document', to='users.talent')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['updated_at'], name='cv_pending_idx'), models.Index(fields=['source'], name='cv_source_idx')],
+            },
+        ),
+        migrations.RunPython(
+            run_vendor_sql({'postgresql': POSTGRES_SQL, 'sqlite': SQLITE_SQL}),
+            run_vendor_sql({'postgresql': POSTGRES_REVERSE_SQL, 'sqlite': SQLITE_REVERSE_SQL}),
+        ),
+        migrations.RunPython(queue_existing_cvs, migrations.RunPython.noop),
+    ]
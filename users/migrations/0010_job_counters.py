@@ -0,0 +1,85 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:47
+
+from collections import Counter
+from django.db import migrations, models
+from django.db.models import Count
+
+
+# Frozen copy of the counter keys in users.counters at the time of this migration,
+# so later changes to the counters do not change what this migration writes
+COUNTED_FIELDS = ('company_id', 'recruiter_id', 'job_sitting', 'division', 'end_date')
+BATCH_SIZE = 1000
+
+
+def _key(name, value):
+    return f'{name}:{value}'[:300]
+
+
+def job_keys(job):
+    keys = []
+    dimensions = ['jobs']
+    if job['job_sitting']:
+        dimensions.append(_key('job_sitting', job['job_sitting']))
+    if job['division']:
+        dimensions.append(_key('division', job['division']))
+    if job['end_date']:
+        dimensions.append(_key('ends', job['end_date']))
+
+    if job['company_id']:
+        keys += [('company', job['company_id'], key) for key in dimensions]
+        if job['recruiter_id']:
+            keys.append(('company', job['company_id'], _key('recruiter', job['recruiter_id'])))
+    if job['recruiter_id']:
+        keys += [('recruiter', job['recruiter_id'], key) for key in dimensions]
+    return keys
+
+
+def shortlist_keys(job):
+    return [
+        (scope, owner_id, 'shortlisted')
+        for scope, owner_id in (('company', job['company_id']), ('recruiter', job['recruiter_id']))
+        if owner_id
+    ]
+
+
+def backfill_job_counters(apps, schema_editor):
+    # Existing jobs and shortlists are counted once here, job saves keep the counters from then on
+    Job = apps.get_model('users', 'Job')
+    JobCounter = apps.get_model('users', 'JobCounter')
+
+    counts = Counter()
+    jobs = Job.objects.values('id', *COUNTED_FIELDS).annotate(shortlisted=Count('shortlist')).order_by()
+    for job in jobs.iterator(chunk_size=BATCH_SIZE):
+        counts.update(job_keys(job))
+        for key in shortlist_keys(job):
+            counts[key] += job['shortlisted']
+    # The table was created above, every counter is new
+    JobCounter.objects.bulk_create([
+        JobCounter(scope=scope, owner_id=owner_id, key=key, count=count)
+        for (scope, owner_id, key), count in (+counts).items()
+    ], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_cv_documents'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('company', 'Company'), ('recruiter', 'Recruiter')], max_length=20)),
+                ('owner_id', models.UUIDField()),
+                ('key', models.CharField(max_length=300)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='jobcounter',
+            constraint=models.UniqueConstraint(fields=('scope', 'owner_id', 'key'), name='unique_job_counter'),
+        ),
+        migrations.RunPython(backfill_job_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Postgres only: GIN indexes for JSON containment lookups (skills__contains=['python'], ...).
+# jsonb_path_ops is smaller and faster than the default opclass and only serves @>, the one operator used on them
+POSTGRES_SQL = [
+    "CREATE INDEX IF NOT EXISTS talent_skills_gin_idx ON users_talent USING GIN (skills jsonb_path_ops)",
+    "CREATE INDEX IF NOT EXISTS talent_languages_gin_idx ON users_talent USING GIN (languages jsonb_path_ops)",
+    "CREATE INDEX IF NOT EXISTS job_requirements_gin_idx ON users_job USING GIN (requirements jsonb_path_ops)",
+]
+POSTGRES_REVERSE_SQL = [
+    "DROP INDEX IF EXISTS job_requirements_gin_idx",
+    "DROP INDEX IF EXISTS talent_languages_gin_idx",
+    "DROP INDEX IF EXISTS talent_skills_gin_idx",
+]
+
+
+def run_vendor_sql(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_job_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['company', 'end_date'], name='job_company_end_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['recruiter', 'end_date'], name='job_recruiter_end_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['end_date'], name='job_end_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='talent',
+            index=models.Index(condition=models.Q(('is_open_to_work', True)), fields=['id'], name='talent_open_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uploadsession',
+            index=models.Index(fields=['updated_at'], name='upload_session_updated_idx'),
+        ),
+        # The composite indexes above lead with these columns, their own indexes are dropped last
+        migrations.AlterField(
+            model_name='job',
+            name='company',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='users.company'),
+        ),
+        migrations.AlterField(
+            model_name='job',
+            name='recruiter',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='users.recruiter'),
+        ),
+        migrations.RunPython(
+            run_vendor_sql({'postgresql': POSTGRES_SQL}),
+            run_vendor_sql({'postgresql': POSTGRES_REVERSE_SQL}),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_index_plan'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='job',
+            name='job_end_date_idx',
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='expired_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(condition=models.Q(('expired_at__isnull', True)), fields=['company', 'end_date'], name='job_live_company_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(condition=models.Q(('expired_at__isnull', True)), fields=['recruiter', 'end_date'], name='job_live_recruiter_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(condition=models.Q(('expired_at__isnull', True)), fields=['end_date'], name='job_live_end_date_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0012_job_expiry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationoutbox',
+            name='leased_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='notificationoutbox',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('in_flight', 'In flight'), ('sent', 'Sent'), ('dead', 'Dead')], default='pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='notificationoutbox',
+            index=models.Index(condition=models.Q(('status', 'in_flight')), fields=['leased_until'], name='outbox_leased_idx'),
+        ),
+    ]
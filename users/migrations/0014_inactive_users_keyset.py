@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0013_outbox_leases'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='customuser',
+            name='user_active_last_login_idx',
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['last_login', 'id'], name='user_active_login_id_idx'),
+        ),
+    ]
@@ -33,6 +33,11 @@ class CustomUser(AbstractUser):
         verbose_name = 'Custom User'
         verbose_name_plural = 'Custom Users'
         # db_table ='custom_users'
+        indexes = [
+            # Inactive users sweep and feed: is_active = true AND last_login < threshold, keyset on (last_login, id).
+            # Partial rather than led by is_active, SQLite can not match its bare boolean test to an index column
+            models.Index(fields=['last_login', 'id'], condition=models.Q(is_active=True), name='user_active_login_id_idx'),
+        ]
 
    
 
@@ -40,6 +45,13 @@ class CustomUser(AbstractUser):
         return self.email
 
 
+def age_from_birth_date(birth_date):
+    if birth_date:
+        today = timezone.now().date()
+        return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+    return None
+
+
 # Talent model extending CustomUser for specific fields
 class Talent(models.Model):
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='talent_profile')
@@ -61,15 +73,21 @@ class Talent(models.Model):
     profile_picture = models.ImageField(upload_to=profile_picture_upload_path, blank=True, null=True)
     recommendation_letter = models.FileField(upload_to=recommendation_letter_upload_path, blank=True, null=True)
 
+    class Meta:
+        # Back the talent search filters, all of them are scoped to open to work talents
+        indexes = [
+            # Keyset pagination (get_talents) and batch scoring walk open to work talents by id
+            models.Index(fields=['id'], condition=models.Q(is_open_to_work=True), name='talent_open_id_idx'),
+            models.Index(fields=['is_open_to_work', 'residence'], name='talent_open_residence_idx'),
+            models.Index(fields=['is_open_to_work', 'job_type'], name='talent_open_job_type_idx'),
+            models.Index(fields=['is_open_to_work', 'job_sitting'], name='talent_open_job_sitting_idx'),
+            models.Index(fields=['is_open_to_work', 'desired_salary'], name='talent_open_salary_idx'),
+            models.Index(fields=['is_open_to_work', 'birth_date'], name='talent_open_birth_date_idx'),
+        ]
+
     @property
     def age(self):
-        if self.birth_date:
-            today = timezone.now().date()
-            user_age = today.year - self.birth_date.year - (
-                (today.month, today.day) < (self.birth_date.month, self.birth_date.day)
-            )
-            return user_age
-        return None
+        return age_from_birth_date(self.birth_date)
 
 
     def __str__(self):
@@ -109,6 +127,12 @@ class Recruiter(models.Model):
     db_table = 'Recruiters'
 
 # Job model with proper ForeignKey references
+class JobQuerySet(models.QuerySet):
+    def live(self):
+        # Jobs not expired yet (see users.expiry), what the listings show
+        return self.filter(expired_at__isnull=True)
+
+
 class Job(models.Model):
     JOB_SITTING = (
         ("Office", "Office"),
@@ -119,8 +143,9 @@ class Job(models.Model):
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     title = models.CharField(max_length=200)
-    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='jobs', null=True)  
-    recruiter = models.ForeignKey(Recruiter, on_delete=models.CASCADE, related_name='jobs',null=True)  
+    # Not indexed on their own, the (company|recruiter, end_date) indexes below lead with them
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='jobs', null=True, db_index=False)
+    recruiter = models.ForeignKey(Recruiter, on_delete=models.CASCADE, related_name='jobs', null=True, db_index=False)
     description = models.TextField(blank=True, null=True)
     location = models.CharField(max_length=200,blank=True, null=True)
     requirements = models.JSONField(default=list, blank=True)
@@ -130,11 +155,247 @@ class Job(models.Model):
     division = models.CharField(max_length=200,blank=True, null=True)
     end_date = models.DateField(blank=True, null=True) 
     is_relevant = models.BooleanField(default=False,blank=True, null=True)
-    relevant_talents = models.JSONField(blank=True, null=True)
+    # Set by the expiry sweep once end_date has passed, NULL while the job is live
+    expired_at = models.DateTimeField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = JobQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Every job of a company / recruiter, expired ones included (?include_expired=true, cascades)
+            models.Index(fields=['company', 'end_date'], name='job_company_end_date_idx'),
+            models.Index(fields=['recruiter', 'end_date'], name='job_recruiter_end_date_idx'),
+            # Partial indexes over the live rows only, they do not grow with the expired jobs
+            models.Index(fields=['company', 'end_date'], name='job_live_company_idx', condition=models.Q(expired_at__isnull=True)),
+            models.Index(fields=['recruiter', 'end_date'], name='job_live_recruiter_idx', condition=models.Q(expired_at__isnull=True)),
+            # open_jobs() across companies and the expiry sweep (end_date < today)
+            models.Index(fields=['end_date'], name='job_live_end_date_idx', condition=models.Q(expired_at__isnull=True)),
+        ]
+
     db_table = 'Jobs'
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+    def has_ended(self, today=None):
+        return self.end_date is not None and self.end_date < (today or timezone.now().date())
+
+    def save(self, *args, **kwargs):
+        # An expired job whose end date was moved forward is live again
+        if self.expired_at is not None and not self.has_ended():
+            self.expired_at = None
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'expired_at'}
+
+        from .counters import COUNTED_FIELDS, save_counted_job  # counters imports the models
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not set(update_fields) & {*COUNTED_FIELDS, 'company', 'recruiter'}:
+            super().save(*args, **kwargs)
+            return
+        # The row write and its counter deltas commit together
+        save_counted_job(self, lambda: super(Job, self).save(*args, **kwargs))
+
+# Talents tagged on a job by its recruiters, one row per (job, talent)
+class JobShortlist(models.Model):
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name='shortlist')
+    talent = models.ForeignKey(Talent, on_delete=models.CASCADE, related_name='shortlisted_for')
+    match_by_cv = models.FloatField(blank=True, null=True)
+    match_by_form = models.FloatField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'talent'], name='unique_job_shortlist'),
+        ]
+
+    def __str__(self):
+        return f'{self.job_id} -> {self.talent_id}'
+
+
+# Inverted index of normalized skill/language tokens -> talents, maintained by users.signals
+class TalentSkill(models.Model):
+    KIND_CHOICES = (
+        ('skill', 'Skill'),
+        ('language', 'Language'),
+    )
+
+    talent = models.ForeignKey(Talent, on_delete=models.CASCADE, related_name='skill_tokens')
+    token = models.CharField(max_length=100)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='skill')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['talent', 'kind', 'token'], name='unique_talent_skill_token'),
+        ]
+        indexes = [
+            models.Index(fields=['token', 'kind'], name='talent_skill_token_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind}:{self.token}'
+
+
+# Normalized requirement tokens of a job, maintained by users.signals
+class JobSkill(models.Model):
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name='skill_tokens')
+    token = models.CharField(max_length=100)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'token'], name='unique_job_skill_token'),
+        ]
+        indexes = [
+            models.Index(fields=['token'], name='job_skill_token_idx'),
+        ]
+
+    def __str__(self):
+        return self.token
+
+
+# Precomputed job <-> talent scores written in bulk by the rematch_jobs command
+class JobMatch(models.Model):
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name='matches')
+    talent = models.ForeignKey(Talent, on_delete=models.CASCADE, related_name='job_matches')
+    score = models.FloatField()
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'talent'], name='unique_job_match'),
+        ]
+        indexes = [
+            models.Index(fields=['job', '-score'], name='job_match_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.job_id} -> {self.talent_id} ({self.score})'
+
+
+# Notifications written in the same transaction as the change that triggers them,
+# delivered to the notification service by the dispatch_notifications task
+class NotificationOutbox(models.Model):
+    KIND_CHOICES = (
+        ('signup', 'Signup'),
+        ('inactive_user_check', 'Inactive user check'),
+    )
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('in_flight', 'In flight'),
+        ('sent', 'Sent'),
+        ('dead', 'Dead'),
+    )
+
+    kind = models.CharField(max_length=50, choices=KIND_CHOICES)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # End of the dispatcher's claim on an in_flight row, a row still in flight after it is pending again
+    leased_until = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_attempt_at'], condition=models.Q(status='pending'), name='outbox_pending_idx'),
+            models.Index(fields=['leased_until'], condition=models.Q(status='in_flight'), name='outbox_leased_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} ({self.status})'
+
+
+# Uploaded file content stored once per SHA-256 and shared by every profile field pointing at it,
+# see users/storage.py. `ref_count` is the number of such fields, the file goes when it drops to 0
+class StoredBlob(models.Model):
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    path = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField()
+    content_type = models.CharField(max_length=255, blank=True, null=True)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.sha256} ({self.ref_count} refs)'
+
+
+# Resumable upload in progress, chunks are appended to a partial file until `received == size`
+class UploadSession(models.Model):
+    KIND_CHOICES = (
+        ('cv', 'CV'),
+        ('recommendation_letter', 'Recommendation letter'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='upload_sessions')
+    kind = models.CharField(max_length=50, choices=KIND_CHOICES)
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=255, blank=True, null=True)
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # purge_stale_uploads
+            models.Index(fields=['updated_at'], name='upload_session_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} upload {self.id} ({self.received}/{self.size})'
+
+
+# Text extracted once from a talent's current CV, searched through users/cv_search.py.
+# The full-text index is not a model field: migration 0009 adds a generated tsvector
+# column + GIN index on Postgres and an FTS5 table kept in sync by triggers on SQLite
+class CVDocument(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    )
+
+    talent = models.OneToOneField(Talent, on_delete=models.CASCADE, related_name='cv_document')
+    source = models.CharField(max_length=255)  # CV file the text was extracted from
+    text = models.TextField(blank=True, default='')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    error = models.TextField(blank=True, null=True)
+    page_count = models.PositiveIntegerField(default=0)
+    extracted_at = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at'], condition=models.Q(status='pending'), name='cv_pending_idx'),
+            models.Index(fields=['source'], name='cv_source_idx'),
+        ]
+
+    def __str__(self):
+        return f'CV of {self.talent_id} ({self.status})'
+
+
+# Denormalized job aggregates of a company or recruiter, maintained by users.signals (see users/counters.py).
+# `key` is the counted dimension: 'jobs', 'shortlisted', 'job_sitting:<value>', 'division:<value>',
+# 'ends:<end_date>' and, for companies, 'recruiter:<recruiter id>'
+class JobCounter(models.Model):
+    SCOPE_CHOICES = (
+        ('company', 'Company'),
+        ('recruiter', 'Recruiter'),
+    )
+
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES)
+    owner_id = models.UUIDField()  # Company.id or Recruiter.id
+    key = models.CharField(max_length=300)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'owner_id', 'key'], name='unique_job_counter'),
+        ]
+
+    def __str__(self):
+        return f'{self.scope} {self.owner_id} {self.key}={self.count}'
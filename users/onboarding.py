@@ -0,0 +1,177 @@
+"""
+Bulk company onboarding: many recruiters or jobs in one request.
+
+Rows are validated one by one and a bad row is reported with its index
+instead of failing the batch. Valid rows are inserted with bulk_create in
+one transaction, recruiter passwords are hashed in a thread pool first
+(PBKDF2, scrypt and argon2 all release the GIL) and the signup notifications
+go to the outbox as a single batch.
+
+bulk_create skips post_save, so what the signals would do for a single
+insert is done here for the whole batch: the job skill index (`index_jobs`)
+and the job counters.
+"""
+
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from .counters import apply_counter_deltas, job_deltas, job_state
+from .matching import index_jobs
+from .models import CustomUser, Job, Recruiter
+from .serializers import BulkJobSerializer, BulkRecruiterSerializer
+from .utils import enqueue_notifications
+
+
+users_logger = logging.getLogger('users')
+
+BULK_BATCH_SIZE = 500
+
+
+def hash_passwords(passwords):
+    """make_password over a thread pool, None gives an unusable password like create_user."""
+    with ThreadPoolExecutor(max_workers=settings.ONBOARDING_HASH_WORKERS) as pool:
+        return list(pool.map(make_password, passwords))
+
+
+def row_error(index, errors):
+    return {'row': index, 'errors': errors}
+
+
+# -------------------------------------Recruiters-----------------------------------------------------------------------------------------------------------------------------------------------
+
+def validate_recruiters(rows):
+    """[(row index, validated data)] of the usable rows and the errors of the others."""
+    valid, errors = [], []
+    seen = set()
+    for index, row in enumerate(rows):
+        serializer = BulkRecruiterSerializer(data=row)
+        if not serializer.is_valid():
+            errors.append(row_error(index, serializer.errors))
+            continue
+        data = serializer.validated_data
+        data['email'] = CustomUser.objects.normalize_email(data['email'])
+        if data['email'].lower() in seen:
+            errors.append(row_error(index, {'email': ['Duplicate email in this batch.']}))
+            continue
+        seen.add(data['email'].lower())
+        valid.append((index, data))
+
+    # One query for the whole batch
+    taken = {
+        email.lower()
+        for email in CustomUser.objects.filter(email__in=[data['email'] for _, data in valid]).values_list('email', flat=True)
+    }
+    usable = []
+    for index, data in valid:
+        if data['email'].lower() in taken:
+            errors.append(row_error(index, {'email': ['User with this email already exists.']}))
+        else:
+            usable.append((index, data))
+    return usable, errors
+
+
+def onboard_recruiters(company, rows):
+    """Create a recruiter per valid row of `rows`, returns {'created': [...], 'errors': [...]}."""
+    usable, errors = validate_recruiters(rows)
+    passwords = hash_passwords([data.get('password') for _, data in usable])
+
+    users = [
+        CustomUser(
+            username=data['email'],  # Use email as the username, like user_signup
+            email=data['email'],
+            password=password,
+            user_type='Recruiter',
+            first_name=(data['first_name'] or '').capitalize(),
+            last_name=(data['last_name'] or '').capitalize(),
+            phone_number=data.get('phone_number'),
+        )
+        for (_, data), password in zip(usable, passwords)
+    ]
+
+    with transaction.atomic():
+        # ignore_conflicts: an email signed up since validation skips its row instead of failing the batch.
+        # Ids are generated here, so the rows that made it in are the ids found afterwards
+        CustomUser.objects.bulk_create(users, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+        inserted = set(CustomUser.objects.filter(id__in=[user.id for user in users]).values_list('id', flat=True))
+
+        created, recruiters = [], []
+        for (index, data), user in zip(usable, users):
+            if user.id not in inserted:
+                errors.append(row_error(index, {'email': ['User with this email already exists.']}))
+                continue
+            recruiters.append(Recruiter(
+                user=user,
+                company=company,
+                division=(data.get('division') or '').capitalize() or None,
+                position=(data.get('position') or '').capitalize() or None,
+                gender=data.get('gender'),
+            ))
+            created.append({'row': index, 'user_id': str(user.id), 'email': user.email})
+        Recruiter.objects.bulk_create(recruiters, batch_size=BULK_BATCH_SIZE)
+
+        # Delivered by the outbox worker once this transaction commits
+        enqueue_notifications('signup', [{'user_email': row['email']} for row in created])
+
+    users_logger.info(f"Onboarded {len(created)} recruiters for company {company.user_id}, {len(errors)} rows rejected")
+    return {'created': created, 'errors': sorted(errors, key=lambda error: error['row'])}
+
+
+# -------------------------------------Jobs-----------------------------------------------------------------------------------------------------------------------------------------------
+
+def job_recruiter_resolver(company):
+    """resolve(validated row) -> (recruiter id or None, errors or None), the company's recruiters are loaded once.
+
+    A row names its recruiter by `recruiter` (Recruiter id) or
+    `recruiter_email`, both must belong to `company`. Both keys are popped
+    from the row.
+    """
+    recruiters = list(Recruiter.objects.filter(company=company).values_list('id', 'user__email'))
+    recruiter_ids = {recruiter_id for recruiter_id, _ in recruiters}
+    recruiters_by_email = {email.lower(): recruiter_id for recruiter_id, email in recruiters}
+
+    def resolve(data):
+        recruiter_id = data.pop('recruiter', None)
+        recruiter_email = data.pop('recruiter_email', None)
+        if recruiter_email:
+            recruiter_id = recruiters_by_email.get(recruiter_email.lower())
+            if recruiter_id is None:
+                return None, {'recruiter_email': ['No recruiter of this company has this email.']}
+        elif recruiter_id and recruiter_id not in recruiter_ids:
+            return None, {'recruiter': ['Recruiter not found in this company.']}
+        return recruiter_id, None
+    return resolve
+
+
+def onboard_jobs(company, rows, resolve_recruiter=None):
+    """Create a job per valid row of `rows`, returns {'created': [...], 'errors': [...]}."""
+    resolve_recruiter = resolve_recruiter or job_recruiter_resolver(company)
+
+    jobs, created, errors = [], [], []
+    for index, row in enumerate(rows):
+        serializer = BulkJobSerializer(data=row)
+        if not serializer.is_valid():
+            errors.append(row_error(index, serializer.errors))
+            continue
+        data = dict(serializer.validated_data)
+        recruiter_id, recruiter_errors = resolve_recruiter(data)
+        if recruiter_errors:
+            errors.append(row_error(index, recruiter_errors))
+            continue
+
+        job = Job(company=company, recruiter_id=recruiter_id, **data)
+        jobs.append(job)
+        created.append({'row': index, 'job_id': str(job.id), 'title': job.title})
+
+    with transaction.atomic():
+        Job.objects.bulk_create(jobs, batch_size=BULK_BATCH_SIZE)
+        index_jobs(jobs)
+        deltas = Counter()
+        for job in jobs:
+            deltas.update(job_deltas(new=job_state(job)))
+        apply_counter_deltas(deltas)
+
+    users_logger.info(f"Onboarded {len(created)} jobs for company {company.user_id}, {len(errors)} rows rejected")
+    return {'created': created, 'errors': errors}
@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class TalentCursorPagination(CursorPagination):
+    """Keyset pagination over talents.
+
+    Pages are fetched with ``WHERE id > <cursor> ORDER BY id LIMIT n`` so the
+    cost of a page does not depend on how deep the client has scrolled.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = 'id'
@@ -2,8 +2,11 @@ from rest_framework import serializers
 from .models import *
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.core.exceptions import ValidationError
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
 import os, re
 from urllib.parse import urlparse
+from .images import picture_variant_urls, variant_urls
 
 
 # Helper to validate phone number
@@ -34,13 +37,115 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
         return token
 
 
+# -------------------------------------Sparse fieldsets-----------------------------------------------------------------------------------------------------------------------------------------------
+
+def parse_field_paths(value):
+    """'id,user.email,user.first_name' -> {'id': {}, 'user': {'email': {}, 'first_name': {}}}, None when empty."""
+    tree = {}
+    for path in (value or '').split(','):
+        node = tree
+        for name in filter(None, (part.strip() for part in path.split('.'))):
+            node = node.setdefault(name, {})
+    return tree or None
+
+
+def sparse_fields(request):
+    """The fields / expand arguments of a SparseFieldsMixin serializer, from the query string."""
+    params = getattr(request, 'query_params', request.GET)
+    return {'fields': params.get('fields'), 'expand': params.get('expand')}
+
+
+class SparseFieldsMixin:
+    """`fields` / `expand` selection for model serializers (`?fields=id,user.email&expand=user.groups`).
+
+    `fields` keeps the listed fields only, a dotted name selects inside a nested
+    serializer. Meta.expandable_fields are left out unless `expand` or `fields`
+    names them. `sparse_queryset` fetches the columns, joins and prefetches of
+    the selected fields only: Meta.field_columns lists the columns read by
+    fields that are not model fields, Meta.field_prefetches their prefetches.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.selected_fields = parse_field_paths(fields) if isinstance(fields, str) else fields
+        self.expanded_fields = (parse_field_paths(expand) if isinstance(expand, str) else expand) or {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        expandable = getattr(self.Meta, 'expandable_fields', ())
+        for name in list(fields):
+            if self.selected_fields is not None:
+                keep = name in self.selected_fields
+            else:
+                keep = name not in expandable or name in self.expanded_fields
+            if not keep:
+                del fields[name]
+                continue
+            nested = getattr(fields[name], 'child', fields[name])
+            if isinstance(nested, SparseFieldsMixin):
+                # `user` alone keeps the nested serializer's default fields
+                nested.selected_fields = (self.selected_fields or {}).get(name) or None
+                nested.expanded_fields = self.expanded_fields.get(name, {})
+        return fields
+
+    def query_plan(self, prefix=''):
+        """(columns or None for every column, select_related, prefetch_related) of the selected fields."""
+        opts = self.Meta.model._meta
+        field_columns = getattr(self.Meta, 'field_columns', {})
+        field_prefetches = getattr(self.Meta, 'field_prefetches', {})
+        columns, related, prefetches = {prefix + opts.pk.name}, [], []
+        for name, field in self.fields.items():
+            if field.write_only:
+                continue
+            if name in field_columns or name in field_prefetches:
+                columns.update(prefix + column for column in field_columns.get(name, ()))
+                if name in field_prefetches:
+                    prefetches.append(field_prefetches[name](prefix))
+            elif isinstance(field, SparseFieldsMixin):
+                nested_columns, nested_related, nested_prefetches = field.query_plan(f'{prefix}{field.source}__')
+                if nested_columns is None:
+                    columns = None
+                elif columns is not None:
+                    columns.update(nested_columns)
+                if columns is not None:
+                    columns.add(prefix + field.source)
+                related += [prefix + field.source] + nested_related
+                prefetches += nested_prefetches
+            elif isinstance(field, serializers.ManyRelatedField):
+                prefetches.append(prefix + field.source)
+            elif columns is not None:
+                try:
+                    model_field = opts.get_field(field.source)
+                except FieldDoesNotExist:
+                    # Reads something we cannot tell, every column is fetched
+                    columns = None
+                    continue
+                columns.add(prefix + model_field.name)
+        return columns, related, prefetches
+
+    @classmethod
+    def sparse_queryset(cls, queryset, fields=None, expand=None):
+        """`queryset` narrowed to what the selected fields read, joins and prefetches included."""
+        columns, related, prefetches = cls(fields=fields, expand=expand).query_plan()
+        if related:
+            queryset = queryset.select_related(*related)
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        if columns is not None:
+            queryset = queryset.only(*columns)
+        return queryset
+
+
 # CustomUser Serializer with phone number validation
-class CustomUserSerializer(serializers.ModelSerializer):
+class CustomUserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     phone_number = serializers.CharField(validators=[validate_phone_number])
 
     class Meta:
         model = CustomUser
         fields = "__all__"
+        # One query each per list, only sent when asked for
+        expandable_fields = ('groups', 'user_permissions')
+        extra_kwargs = {'password': {'write_only': True}}
 
 
 
@@ -85,13 +190,27 @@ class CompleteProfileSerializer(serializers.ModelSerializer):
 
         return instance
 
-class TalentSerializer(serializers.ModelSerializer):
+class TalentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = CustomUserSerializer()  # This now includes `phone_number`
     age = serializers.ReadOnlyField()
+    profile_picture_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Talent
         fields = "__all__"
+        field_columns = {'age': ('birth_date',), 'profile_picture_variants': ('profile_picture', 'user')}
+
+    def get_profile_picture_variants(self, obj):
+        return variant_urls(obj, self.context.get('request'))
+
+    # Row versions for users.fast_serializers, from the Meta.field_columns values
+    @staticmethod
+    def row_age(request, birth_date):
+        return age_from_birth_date(birth_date)
+
+    @staticmethod
+    def row_profile_picture_variants(request, name, user_id):
+        return picture_variant_urls(name, user_id, request)
 
     def validate_email(self, email):
         public_domains = ['gmail.com', 'yahoo.com', 'hotmail.com', 'outlook.com']
@@ -125,7 +244,7 @@ class TalentSerializer(serializers.ModelSerializer):
 
 
 # Company Serializer
-class CompanySerializer(serializers.ModelSerializer):
+class CompanySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = CustomUserSerializer(required=False)
 
     class Meta:
@@ -164,12 +283,21 @@ class CompanySerializer(serializers.ModelSerializer):
 
 
 # Recruiter Serializer
-class RecruiterSerializer(serializers.ModelSerializer):
+class RecruiterSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = CustomUserSerializer()
+    profile_picture_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recruiter
         fields = "__all__"
+        field_columns = {'profile_picture_variants': ('profile_picture', 'user')}
+
+    def get_profile_picture_variants(self, obj):
+        return variant_urls(obj, self.context.get('request'))
+
+    @staticmethod
+    def row_profile_picture_variants(request, name, user_id):
+        return picture_variant_urls(name, user_id, request)
 
     def validate_email(self, email):
         # Assuming `self.context` provides `company_id` for additional validation
@@ -200,9 +328,56 @@ class RecruiterSerializer(serializers.ModelSerializer):
         return instance
 
 
+# Recruiter merged with its user in a single pass, the shape company_recruiters returns.
+# Expects the user to be select_related (see sparse_queryset), user fields are selected as `user.<name>`.
+class RecruiterWithUserSerializer(RecruiterSerializer):
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Not there when ?fields= leaves the user out, once merged its fields are not repeated under `user`
+        user = data.pop('user', None) or {}
+        return {**user, **data}
+
+
+# Prefetch feeding JobSerializer.relevant_talents with one query for a whole list of jobs
+def job_shortlist_prefetch(prefix=''):
+    return Prefetch(f'{prefix}shortlist', queryset=JobShortlist.objects.select_related('talent__user').order_by('created_at', 'id'))
+
+
 # Job Serializer
-class JobSerializer(serializers.ModelSerializer):
+class JobSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     end_date = serializers.DateField(format="%d-%m-%Y", input_formats=["%d-%m-%Y", "%Y-%m-%d"])
+    relevant_talents = serializers.SerializerMethodField()
+
+    def get_relevant_talents(self, obj):
+        # Same shape the old relevant_talents JSON list had
+        return [
+            {
+                'talent_id': str(entry.talent.user_id),
+                'match_by_cv': entry.match_by_cv,
+                'match_by_form': entry.match_by_form,
+                'first_name': entry.talent.user.first_name,
+                'last_name': entry.talent.user.last_name,
+            }
+            for entry in obj.shortlist.all()
+        ]
+
+    @staticmethod
+    def rows_relevant_talents(request, job_ids):
+        # get_relevant_talents of a page of jobs from one query, same rows as job_shortlist_prefetch
+        talents = {job_id: [] for job_id in job_ids}
+        shortlist = (
+            JobShortlist.objects.filter(job_id__in=job_ids).order_by('created_at', 'id')
+            .values_list('job_id', 'talent__user_id', 'match_by_cv', 'match_by_form', 'talent__user__first_name', 'talent__user__last_name')
+        )
+        for job_id, user_id, match_by_cv, match_by_form, first_name, last_name in shortlist:
+            talents[job_id].append({
+                'talent_id': str(user_id),
+                'match_by_cv': match_by_cv,
+                'match_by_form': match_by_form,
+                'first_name': first_name,
+                'last_name': last_name,
+            })
+        return talents
 
     def update(self, instance, validated_data):
         user_data = validated_data.pop('user', None)
@@ -220,4 +395,45 @@ class JobSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Job
-        fields = "__all__"
\ No newline at end of file
+        fields = "__all__"
+        read_only_fields = ('expired_at',)
+        field_prefetches = {'relevant_talents': job_shortlist_prefetch}
+
+# -------------------------------------Bulk onboarding-----------------------------------------------------------------------------------------------------------------------------------------------
+
+# One row of a bulk recruiter onboarding, validated without touching the database
+class BulkRecruiterSerializer(serializers.Serializer):
+    email = serializers.EmailField(max_length=254)
+    password = serializers.CharField(max_length=128, required=False, allow_null=True, write_only=True)
+    first_name = serializers.CharField(max_length=150, required=False, allow_blank=True, allow_null=True, default='')
+    last_name = serializers.CharField(max_length=150, required=False, allow_blank=True, allow_null=True, default='')
+    phone_number = serializers.CharField(max_length=15, required=False, allow_null=True, validators=[validate_phone_number])
+    division = serializers.CharField(max_length=255, required=False, allow_null=True)
+    position = serializers.CharField(max_length=255, required=False, allow_null=True)
+    gender = serializers.CharField(max_length=255, required=False, allow_null=True)
+
+
+# One row of a bulk job onboarding. The company comes from the URL and the recruiter is resolved
+# by the caller (`recruiter` id or `recruiter_email`), so validating a row runs no query
+class BulkJobSerializer(JobSerializer):
+    recruiter = serializers.UUIDField(required=False, allow_null=True)
+    recruiter_email = serializers.EmailField(required=False, allow_null=True)
+
+    class Meta:
+        model = Job
+        exclude = ('company',)
+        read_only_fields = ('expired_at',)
+
+
+# One row of a talent spreadsheet import, updates the talent and its user's name / phone
+class TalentImportSerializer(serializers.ModelSerializer):
+    first_name = serializers.CharField(max_length=150, required=False, allow_blank=True, allow_null=True)
+    last_name = serializers.CharField(max_length=150, required=False, allow_blank=True, allow_null=True)
+    phone_number = serializers.CharField(max_length=15, required=False, allow_null=True, validators=[validate_phone_number])
+
+    class Meta:
+        model = Talent
+        fields = (
+            'first_name', 'last_name', 'phone_number', 'gender', 'birth_date', 'is_open_to_work', 'residence',
+            'desired_salary', 'about_me', 'job_type', 'job_sitting', 'skills', 'languages', 'certificates',
+        )
@@ -0,0 +1,123 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.db import transaction
+from django.dispatch import receiver
+from .models import Company, CustomUser, Job, Recruiter, Talent
+from .cache import invalidate_user_detail
+from .cv_search import queue_cv_extraction
+from .counters import apply_counter_deltas, delete_owner_counters, job_deltas, job_state, remove_shortlist_counters
+from .matching import reindex_job, reindex_talent
+from .storage import release_blob
+
+
+# -------------------------------------Skills index-----------------------------------------------------------------------------------------------------------------------------------------------
+
+def _touches(update_fields, fields):
+    # `update_fields` is None on a full save
+    return update_fields is None or bool(set(update_fields) & set(fields))
+
+
+@receiver(post_save, sender=Talent)
+def index_talent_skills(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw or not _touches(update_fields, ('skills', 'languages')):
+        return
+    reindex_talent(instance)
+
+
+@receiver(post_save, sender=Job)
+def index_job_requirements(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw or not _touches(update_fields, ('requirements',)):
+        return
+    reindex_job(instance)
+
+
+# -------------------------------------user_detail cache-----------------------------------------------------------------------------------------------------------------------------------------------
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def invalidate_user_detail_for_user(sender, instance, **kwargs):
+    invalidate_user_detail(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Talent)
+@receiver([post_save, post_delete], sender=Company)
+@receiver([post_save, post_delete], sender=Recruiter)
+def invalidate_user_detail_for_profile(sender, instance, **kwargs):
+    invalidate_user_detail(instance.user_id)
+
+
+# The payload also lists the user's groups / permissions and the company's open jobs
+_payload_relations = {
+    CustomUser.groups.through: 'groups',
+    CustomUser.user_permissions.through: 'user_permissions',
+    Company.open_jobs.through: 'open_jobs',
+}
+
+
+@receiver(m2m_changed, sender=CustomUser.groups.through)
+@receiver(m2m_changed, sender=CustomUser.user_permissions.through)
+@receiver(m2m_changed, sender=Company.open_jobs.through)
+def invalidate_user_detail_for_relations(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            invalidate_user_detail(instance.user_id if isinstance(instance, Company) else instance.pk)
+        return
+
+    # Reverse calls such as job.companies.add() or group.user_set.clear(), the owners are on the other side
+    if action in ('post_add', 'post_remove'):
+        owners = model.objects.filter(pk__in=pk_set)
+    elif action == 'pre_clear':
+        owners = model.objects.filter(**{_payload_relations[sender]: instance})
+    else:
+        return
+    for user_id in owners.values_list('user_id' if model is Company else 'pk', flat=True):
+        invalidate_user_detail(user_id)
+
+
+# -------------------------------------Stored blobs-----------------------------------------------------------------------------------------------------------------------------------------------
+
+@receiver(post_delete, sender=Talent)
+def release_talent_documents(sender, instance, **kwargs):
+    # Deleting a talent (or its user) drops its references, shared files stay for the other owners
+    for field_name in ('cv', 'recommendation_letter'):
+        release_blob(getattr(instance, field_name).name)
+
+
+# -------------------------------------CV text-----------------------------------------------------------------------------------------------------------------------------------------------
+
+@receiver(post_save, sender=Talent)
+def extract_talent_cv(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw or not _touches(update_fields, ('cv',)):
+        return
+    queue_cv_extraction(instance)
+
+
+# -------------------------------------Job counters-----------------------------------------------------------------------------------------------------------------------------------------------
+
+# Saves are counted by Job.save, in the transaction that writes the row
+
+@receiver(pre_delete, sender=Job)
+def uncount_job_shortlist(sender, instance, **kwargs):
+    # The cascade deletes the rows without telling anyone
+    remove_shortlist_counters(instance.shortlist.all())
+
+
+@receiver(pre_delete, sender=Talent)
+def uncount_talent_shortlist(sender, instance, **kwargs):
+    remove_shortlist_counters(instance.shortlisted_for.all())
+
+
+@receiver(post_delete, sender=Job)
+def uncount_deleted_job(sender, instance, **kwargs):
+    apply_counter_deltas(job_deltas(old=job_state(instance)))
+
+
+# After commit: the cascade may delete the owner's jobs (and update its counters) after the owner itself
+@receiver(post_delete, sender=Company)
+def delete_company_counters(sender, instance, **kwargs):
+    owner_id = instance.pk
+    transaction.on_commit(lambda: delete_owner_counters('company', owner_id))
+
+
+@receiver(post_delete, sender=Recruiter)
+def delete_recruiter_counters(sender, instance, **kwargs):
+    owner_id = instance.pk
+    transaction.on_commit(lambda: delete_owner_counters('recruiter', owner_id))
@@ -0,0 +1,372 @@
+"""
+CSV / Excel import and export of jobs, talents and recruiters.
+
+Exports never hold the table in memory: rows are read in keyset pages of
+SPREADSHEET_CHUNK_SIZE (`pk > last ORDER BY pk`, like the inactive users
+sweep). CSV is streamed to the client page by page; XLSX goes through
+openpyxl's write-only workbook, which spools rows to a temporary file, and
+the finished file is streamed from disk.
+
+Imports read the upload row by row (csv module, openpyxl read-only mode)
+and write SPREADSHEET_CHUNK_SIZE rows per transaction with bulk_create /
+bulk_update. Rows with an `id` (jobs) or a known email (talents,
+recruiters) update, the others create: new jobs and recruiters go through
+users.onboarding, talents are update only, they sign up themselves. A bad
+row is reported with its spreadsheet line number and does not stop the
+import.
+"""
+
+import csv, datetime, io, json, logging, tempfile, uuid
+from collections import Counter
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from openpyxl import Workbook, load_workbook
+from .cache import invalidate_user_details
+from .counters import apply_counter_deltas, job_deltas, job_state
+from .matching import reindex_jobs, reindex_talents
+from .models import CustomUser, Job, Recruiter, Talent
+from .onboarding import job_recruiter_resolver, onboard_jobs, onboard_recruiters, row_error
+from .serializers import BulkJobSerializer, BulkRecruiterSerializer, TalentImportSerializer
+
+
+users_logger = logging.getLogger('users')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+LIST_SEPARATOR = ';'
+# Spreadsheet apps run cells starting with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@')
+
+# entity -> [(column, values() lookup)], the columns are also what the import reads back
+EXPORT_COLUMNS = {
+    'jobs': [
+        ('id', 'id'), ('title', 'title'), ('recruiter_email', 'recruiter__user__email'), ('description', 'description'),
+        ('location', 'location'), ('requirements', 'requirements'), ('salary', 'salary'), ('job_type', 'job_type'),
+        ('job_sitting', 'job_sitting'), ('division', 'division'), ('end_date', 'end_date'),
+        ('is_relevant', 'is_relevant'), ('created_at', 'created_at'),
+    ],
+    'talents': [
+        ('email', 'user__email'), ('first_name', 'user__first_name'), ('last_name', 'user__last_name'),
+        ('phone_number', 'user__phone_number'), ('gender', 'gender'), ('birth_date', 'birth_date'),
+        ('is_open_to_work', 'is_open_to_work'), ('residence', 'residence'), ('desired_salary', 'desired_salary'),
+        ('about_me', 'about_me'), ('job_type', 'job_type'), ('job_sitting', 'job_sitting'), ('skills', 'skills'),
+        ('languages', 'languages'), ('certificates', 'certificates'),
+    ],
+    'recruiters': [
+        ('email', 'user__email'), ('first_name', 'user__first_name'), ('last_name', 'user__last_name'),
+        ('phone_number', 'user__phone_number'), ('gender', 'gender'), ('division', 'division'), ('position', 'position'),
+    ],
+}
+LIST_COLUMNS = {'requirements', 'skills', 'languages'}
+ENTITIES = tuple(EXPORT_COLUMNS)
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# -------------------------------------Export-----------------------------------------------------------------------------------------------------------------------------------------------
+
+def export_queryset(entity, company=None):
+    if entity == 'jobs':
+        queryset = Job.objects.all()
+    elif entity == 'talents':
+        queryset = Talent.objects.all()
+    else:
+        queryset = Recruiter.objects.all()
+    return queryset.filter(company=company) if company is not None else queryset
+
+
+def iter_export_rows(queryset, lookups, chunk_size=None):
+    """Yield value tuples for `lookups`, one keyset query per `chunk_size` rows."""
+    chunk_size = chunk_size or settings.SPREADSHEET_CHUNK_SIZE
+    queryset = queryset.order_by('pk').values_list('pk', *lookups)
+    last_seen = None
+    while True:
+        page = queryset if last_seen is None else queryset.filter(pk__gt=last_seen)
+        chunk = list(page[:chunk_size])
+        for row in chunk:
+            yield row[1:]
+        if len(chunk) < chunk_size:
+            return
+        last_seen = chunk[-1][0]
+
+
+def export_cell(value, native=False):
+    """One value as written to a cell, `native` keeps numbers / dates / booleans for XLSX."""
+    if value is None:
+        return None if native else ''
+    if isinstance(value, list):
+        value = LIST_SEPARATOR.join(str(item) for item in value)
+    elif isinstance(value, dict):
+        value = json.dumps(value)
+    elif isinstance(value, uuid.UUID):
+        value = str(value)
+    elif isinstance(value, datetime.datetime):
+        # Excel has no time zones, write UTC
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return value if native else value.isoformat(sep=' ')
+    elif isinstance(value, (datetime.date, bool, int, float)):
+        return value if native else (value.isoformat() if isinstance(value, datetime.date) else str(value))
+    if value.startswith(FORMULA_PREFIXES):
+        value = "'" + value
+    return value
+
+
+class Echo:
+    # csv.writer target that hands back the formatted line instead of storing it
+    def write(self, value):
+        return value
+
+
+def stream_csv(entity, queryset):
+    """CSV lines of `queryset`, yielded a page at a time."""
+    columns = EXPORT_COLUMNS[entity]
+    writer = csv.writer(Echo())
+    yield '\ufeff' + writer.writerow([column for column, _ in columns])  # BOM, Excel then reads UTF-8
+    rows = iter_export_rows(queryset, [lookup for _, lookup in columns])
+    for chunk in chunked(rows, settings.SPREADSHEET_CHUNK_SIZE):
+        yield ''.join(writer.writerow([export_cell(value) for value in row]) for row in chunk)
+
+
+def write_xlsx(entity, queryset):
+    """A temporary file holding the XLSX export of `queryset`, rewound for reading."""
+    columns = EXPORT_COLUMNS[entity]
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(entity)
+    sheet.append([column for column, _ in columns])
+    for row in iter_export_rows(queryset, [lookup for _, lookup in columns]):
+        sheet.append([export_cell(value, native=True) for value in row])
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+# -------------------------------------Reading-----------------------------------------------------------------------------------------------------------------------------------------------
+
+def import_cell(column, value):
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith("'") and value[1:].startswith(FORMULA_PREFIXES):
+            value = value[1:]
+    if column in LIST_COLUMNS:
+        if isinstance(value, str):
+            return [item.strip() for item in value.split(LIST_SEPARATOR) if item.strip()]
+        return [] if value is None else [value]
+    if isinstance(value, datetime.datetime) and value.time() == datetime.time(0):
+        # Date cells come back from openpyxl as midnight datetimes
+        return value.date()
+    return None if value == '' else value
+
+
+def read_rows(uploaded_file, file_format):
+    """Yield (spreadsheet line number, {column: value}) from a CSV or XLSX upload, one row at a time."""
+    if file_format == 'xlsx':
+        workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+    else:
+        workbook = None
+        rows = csv.reader(io.TextIOWrapper(uploaded_file.file, encoding='utf-8-sig', newline=''))
+
+    try:
+        header = [str(column or '').strip().lower() for column in next(rows, [])]
+        for line, values in enumerate(rows, start=2):
+            if all(value in (None, '') for value in values):
+                continue
+            yield line, {column: import_cell(column, value) for column, value in zip(header, values) if column}
+    finally:
+        if workbook is not None:
+            workbook.close()
+
+
+# -------------------------------------Import-----------------------------------------------------------------------------------------------------------------------------------------------
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+        self.error_count = 0
+
+    def add_errors(self, errors, lines):
+        """Record onboarding style errors, `lines` maps their row index to a spreadsheet line."""
+        for error in errors:
+            self.add_error(lines[error['row']], error['errors'])
+
+    def add_error(self, line, errors):
+        self.error_count += 1
+        if len(self.errors) < settings.SPREADSHEET_MAX_ERRORS:
+            self.errors.append(row_error(line, errors))
+
+    def as_dict(self):
+        return {'created': self.created, 'updated': self.updated, 'errors': self.errors, 'error_count': self.error_count}
+
+
+def import_jobs(rows, company, result):
+    resolve_recruiter = job_recruiter_resolver(company)
+    for chunk in chunked(rows, settings.SPREADSHEET_CHUNK_SIZE):
+        new = [(line, row) for line, row in chunk if not row.get('id')]
+        outcome = onboard_jobs(company, [row for _, row in new], resolve_recruiter)
+        result.created += len(outcome['created'])
+        result.add_errors(outcome['errors'], [line for line, _ in new])
+        update_jobs([(line, row) for line, row in chunk if row.get('id')], company, resolve_recruiter, result)
+
+
+def update_jobs(rows, company, resolve_recruiter, result):
+    ids = {}
+    for line, row in rows:
+        try:
+            ids[line] = uuid.UUID(str(row['id']))
+        except ValueError:
+            result.add_error(line, {'id': ['Invalid job id.']})
+    jobs = Job.objects.filter(company=company, id__in=ids.values()).in_bulk()
+
+    updated, deltas = [], Counter()
+    for line, row in rows:
+        job = jobs.get(ids.get(line))
+        if line not in ids:
+            continue
+        if job is None:
+            result.add_error(line, {'id': ['Job not found in this company.']})
+            continue
+        serializer = BulkJobSerializer(job, data=row, partial=True)
+        if not serializer.is_valid():
+            result.add_error(line, serializer.errors)
+            continue
+        data = dict(serializer.validated_data)
+        if 'recruiter' in data or 'recruiter_email' in data:
+            recruiter_id, recruiter_errors = resolve_recruiter(data)
+            if recruiter_errors:
+                result.add_error(line, recruiter_errors)
+                continue
+            data['recruiter_id'] = recruiter_id
+
+        old = job_state(job)
+        for field, value in data.items():
+            setattr(job, field, value)
+        # Revived like Job.save does, is_relevant stays as the sheet (or the expiry sweep) left it
+        if job.expired_at is not None and not job.has_ended():
+            job.expired_at = None
+        job.updated_at = timezone.now()
+        deltas.update(job_deltas(old, job_state(job)))
+        updated.append(job)
+
+    fields = [field for field, _ in EXPORT_COLUMNS['jobs'] if field not in ('id', 'recruiter_email', 'created_at')]
+    with transaction.atomic():
+        # bulk_update skips Job.save and the signals, revive, re-index and count the batch here
+        Job.objects.bulk_update(
+            updated, fields + ['recruiter', 'expired_at', 'updated_at'], batch_size=settings.SPREADSHEET_CHUNK_SIZE,
+        )
+        reindex_jobs(updated)
+        apply_counter_deltas(deltas)
+    result.updated += len(updated)
+
+
+def import_talents(rows, company, result):
+    for chunk in chunked(rows, settings.SPREADSHEET_CHUNK_SIZE):
+        emails = [CustomUser.objects.normalize_email(str(row.get('email') or '')) for _, row in chunk]
+        talents = {
+            talent.user.email.lower(): talent
+            for talent in Talent.objects.select_related('user').filter(user__email__in=emails)
+        }
+
+        updated = []
+        for (line, row), email in zip(chunk, emails):
+            talent = talents.get(email.lower())
+            if talent is None:
+                result.add_error(line, {'email': ['No talent with this email.']})
+                continue
+            serializer = TalentImportSerializer(talent, data=row, partial=True)
+            if not serializer.is_valid():
+                result.add_error(line, serializer.errors)
+                continue
+            data = dict(serializer.validated_data)
+            for field in ('first_name', 'last_name'):
+                if field in data:
+                    setattr(talent.user, field, data.pop(field) or '')
+            if 'phone_number' in data:
+                talent.user.phone_number = data.pop('phone_number')
+            for field, value in data.items():
+                setattr(talent, field, value)
+            updated.append(talent)
+
+        talent_fields = [field for field in TalentImportSerializer.Meta.fields if field not in ('first_name', 'last_name', 'phone_number')]
+        with transaction.atomic():
+            Talent.objects.bulk_update(updated, talent_fields, batch_size=settings.SPREADSHEET_CHUNK_SIZE)
+            CustomUser.objects.bulk_update(
+                [talent.user for talent in updated], ['first_name', 'last_name', 'phone_number'],
+                batch_size=settings.SPREADSHEET_CHUNK_SIZE,
+            )
+            reindex_talents(updated)
+        invalidate_user_details([talent.user_id for talent in updated])
+        result.updated += len(updated)
+
+
+def import_recruiters(rows, company, result):
+    for chunk in chunked(rows, settings.SPREADSHEET_CHUNK_SIZE):
+        recruiters = {
+            recruiter.user.email.lower(): recruiter
+            for recruiter in Recruiter.objects.select_related('user').filter(
+                company=company,
+                user__email__in=[CustomUser.objects.normalize_email(str(row.get('email') or '')) for _, row in chunk],
+            )
+        }
+
+        new, updated = [], []
+        for line, row in chunk:
+            recruiter = recruiters.get(str(row.get('email') or '').lower())
+            if recruiter is None:
+                new.append((line, row))
+                continue
+            # Partial: columns missing from the sheet keep their values
+            serializer = BulkRecruiterSerializer(data=row, partial=True)
+            if not serializer.is_valid():
+                result.add_error(line, serializer.errors)
+                continue
+            data = serializer.validated_data
+            # Passwords are only set on creation, an import never resets one
+            for field in ('first_name', 'last_name'):
+                if field in data:
+                    setattr(recruiter.user, field, (data[field] or '').capitalize())
+            if 'phone_number' in data:
+                recruiter.user.phone_number = data['phone_number']
+            for field in ('division', 'position'):
+                if field in data:
+                    setattr(recruiter, field, (data[field] or '').capitalize() or None)
+            if 'gender' in data:
+                recruiter.gender = data['gender']
+            updated.append(recruiter)
+
+        with transaction.atomic():
+            Recruiter.objects.bulk_update(updated, ['division', 'position', 'gender'])
+            CustomUser.objects.bulk_update([recruiter.user for recruiter in updated], ['first_name', 'last_name', 'phone_number'])
+        invalidate_user_details([recruiter.user_id for recruiter in updated])
+        result.updated += len(updated)
+
+        outcome = onboard_recruiters(company, [row for _, row in new])
+        result.created += len(outcome['created'])
+        result.add_errors(outcome['errors'], [line for line, _ in new])
+
+
+IMPORTERS = {'jobs': import_jobs, 'talents': import_talents, 'recruiters': import_recruiters}
+
+
+def import_spreadsheet(entity, uploaded_file, file_format, company=None):
+    """Import every row of the upload, returns {'created', 'updated', 'errors', 'error_count'}."""
+    result = ImportResult()
+    IMPORTERS[entity](read_rows(uploaded_file, file_format), company, result)
+    users_logger.info(
+        f"Imported {entity}: {result.created} created, {result.updated} updated, {result.error_count} rows rejected"
+    )
+    return result.as_dict()
@@ -0,0 +1,266 @@
+"""
+Content addressed storage for uploaded documents.
+
+Every upload is hashed (SHA-256) while it streams to a temporary file and is
+stored once under `blobs/<aa>/<bb>/<sha256><ext>`. Profile FileFields point at
+that path and `StoredBlob.ref_count` tracks how many do, the file is removed
+when the last reference is released. Uploads never sit in memory: direct
+uploads go through `HashingUploadHandler`, resumable ones are appended chunk
+by chunk to a partial file (see `UploadSession`).
+"""
+
+import hashlib, logging, os, datetime, shutil, tempfile
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import StoredBlob, UploadSession
+
+
+users_logger = logging.getLogger('users')
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    """Spools every upload to a temporary file and hashes it chunk by chunk on the way."""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.sha256 = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        uploaded.sha256 = self.sha256.hexdigest()
+        return uploaded
+
+
+def use_hashing_uploads(request):
+    # Must run before request.FILES / request.data is first touched
+    request._request.upload_handlers = [HashingUploadHandler(request._request)]
+
+
+class LocalFile(File):
+    # Lets FileSystemStorage move the file into place instead of copying it
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def blob_path(sha256, filename):
+    ext = os.path.splitext(filename or '')[1].lower()[:16]
+    return f'blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}{ext}'
+
+
+# -------------------------------------Blobs-----------------------------------------------------------------------------------------------------------------------------------------------
+
+def store_blob(content, sha256, size, filename, content_type=None):
+    """Return the blob for `content` with one more reference, writing the file only if it is new.
+
+    Runs its own transactions and must not be wrapped in another one: a new
+    file is written before its row, the row has to be committed when this
+    returns or a rollback would leave the file with nothing pointing at it.
+    The caller owns the reference, `attach_blob` it or `release_blob` it.
+    """
+    with transaction.atomic():
+        # Locked so a concurrent release cannot delete the file under us
+        blob = StoredBlob.objects.select_for_update().filter(sha256=sha256).first()
+        if blob is not None:
+            StoredBlob.objects.filter(sha256=sha256).update(ref_count=F('ref_count') + 1)
+            return blob
+
+    # New content: written first, then the insert decides which upload's file becomes the blob
+    path = default_storage.save(blob_path(sha256, filename), content)
+    try:
+        with transaction.atomic():
+            blob, created = StoredBlob.objects.get_or_create(
+                sha256=sha256, defaults={'path': path, 'size': size, 'content_type': content_type},
+            )
+            StoredBlob.objects.filter(sha256=sha256).update(ref_count=F('ref_count') + 1)
+    except Exception:
+        default_storage.delete(path)
+        raise
+    if created:
+        users_logger.debug(f"Stored new blob {sha256} ({size} bytes)")
+    elif blob.path != path:
+        # Lost the race to another upload of the same content, its file is the one kept
+        default_storage.delete(path)
+    return blob
+
+
+def store_upload(uploaded_file):
+    """Store a file from request.FILES, hashed by HashingUploadHandler when it was used."""
+    sha256 = getattr(uploaded_file, 'sha256', None)
+    if sha256 is None:
+        hasher = hashlib.sha256()
+        for chunk in uploaded_file.chunks(HASH_CHUNK_SIZE):
+            hasher.update(chunk)
+        sha256 = hasher.hexdigest()
+        uploaded_file.seek(0)
+    return store_blob(uploaded_file, sha256, uploaded_file.size, uploaded_file.name, uploaded_file.content_type)
+
+
+@transaction.atomic
+def release_blob(path):
+    """Drop one reference to the file at `path`, deleting it with the last one.
+
+    Files that are not blobs (uploaded before the blob store) are deleted
+    right away, nothing else points at them.
+    """
+    if not path:
+        return
+    blob = StoredBlob.objects.select_for_update().filter(path=path).first()
+    if blob is None:
+        default_storage.delete(path)
+        return
+    if blob.ref_count > 1:
+        StoredBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') - 1)
+        return
+    # Deleted while the row is locked, a concurrent upload of the same content waits and stores it again
+    default_storage.delete(blob.path)
+    blob.delete()
+    users_logger.debug(f"Deleted blob {blob.sha256}")
+
+
+def attach_blob(instance, field_name, blob):
+    """Point `instance.<field_name>` at `blob`, releasing whatever it pointed at before.
+
+    Takes over the reference `store_blob` gave the caller, it is released if attaching fails.
+    """
+    try:
+        _attach_blob(instance, field_name, blob)
+    except Exception:
+        release_blob(blob.path)
+        raise
+
+
+@transaction.atomic
+def _attach_blob(instance, field_name, blob):
+    previous = getattr(instance, field_name).name
+    if previous == blob.path:
+        # Same content uploaded again, keep a single reference
+        release_blob(blob.path)
+        return
+    getattr(instance, field_name).name = blob.path
+    instance.save(update_fields=[field_name])
+    release_blob(previous)
+
+
+@transaction.atomic
+def detach_blob(instance, field_name):
+    previous = getattr(instance, field_name).name
+    if not previous:
+        return False
+    getattr(instance, field_name).name = None
+    instance.save(update_fields=[field_name])
+    release_blob(previous)
+    return True
+
+
+# -------------------------------------Resumable uploads-----------------------------------------------------------------------------------------------------------------------------------------------
+
+def session_path(session):
+    return os.path.join(settings.UPLOAD_SESSION_DIR, f'{session.id}.part')
+
+
+def start_upload(user_id, kind, filename, size, content_type=None):
+    session = UploadSession.objects.create(
+        user_id=user_id, kind=kind, filename=filename, size=size, content_type=content_type
+    )
+    os.makedirs(settings.UPLOAD_SESSION_DIR, exist_ok=True)
+    open(session_path(session), 'wb').close()
+    return session
+
+
+def append_chunk(session, offset, stream, length):
+    """Append `length` bytes read from `stream` at `offset`, returns the new offset.
+
+    Raises ValueError when `offset` is not where the upload stopped or the
+    chunk would go past the announced size. The chunk is read to a temporary
+    file first, the offset is only locked while it is copied into place, so
+    two clients resuming the same upload cannot interleave and a slow client
+    holds no lock.
+    """
+    if offset != session.received:
+        raise ValueError(f'Upload is at offset {session.received}')
+    if length <= 0 or offset + length > session.size:
+        raise ValueError('Chunk is empty or goes past the upload size')
+
+    with tempfile.TemporaryFile(dir=settings.UPLOAD_SESSION_DIR) as chunk:
+        written = 0
+        while written < length:
+            data = stream.read(min(HASH_CHUNK_SIZE, length - written))
+            if not data:
+                break
+            chunk.write(data)
+            written += len(data)
+        if written != length:
+            raise ValueError(f'Expected {length} bytes, received {written}')
+        chunk.seek(0)
+
+        with transaction.atomic():
+            session = UploadSession.objects.select_for_update().get(pk=session.pk)
+            # Checked again under the lock, another request may have appended meanwhile
+            if offset != session.received:
+                raise ValueError(f'Upload is at offset {session.received}')
+            with open(session_path(session), 'r+b') as f:
+                # Drop anything left behind by a request that died mid-copy
+                f.truncate(session.received)
+                f.seek(session.received)
+                shutil.copyfileobj(chunk, f, HASH_CHUNK_SIZE)
+            session.received += written
+            session.save(update_fields=['received', 'updated_at'])
+    return session.received
+
+
+def complete_upload(session, expected_sha256=None):
+    """Turn a fully received upload into a blob, returns it with one reference for the caller."""
+    path = session_path(session)
+    sha256 = file_sha256(path)
+    if expected_sha256 and expected_sha256.lower() != sha256:
+        raise ValueError('Checksum mismatch')
+
+    with open(path, 'rb') as f:
+        blob = store_blob(LocalFile(f), sha256, session.size, session.filename, session.content_type)
+    try:
+        discard_upload(session)
+    except Exception:
+        release_blob(blob.path)
+        raise
+    return blob
+
+
+def discard_upload(session):
+    # Path first, delete() clears the pk
+    path = session_path(session)
+    session.delete()
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def purge_stale_uploads(hours=None):
+    """Discard resumable uploads untouched for UPLOAD_SESSION_TTL_HOURS, returns how many."""
+    hours = settings.UPLOAD_SESSION_TTL_HOURS if hours is None else hours
+    stale = UploadSession.objects.filter(updated_at__lt=timezone.now() - datetime.timedelta(hours=hours))
+    count = 0
+    for session in stale.iterator():
+        discard_upload(session)
+        count += 1
+    users_logger.info(f"Purged {count} stale uploads")
+    return count
@@ -0,0 +1,47 @@
+from celery import shared_task
+from django.conf import settings
+from . import cv_search, expiry, images, matching, storage, utils
+
+
+@shared_task(ignore_result=True)
+def dispatch_notifications():
+    # Drain the outbox batch by batch, a full batch means more may be waiting
+    delivered = utils.dispatch_notifications()
+    if delivered >= settings.NOTIFICATION_BATCH_SIZE:
+        dispatch_notifications.apply_async()
+    return delivered
+
+
+@shared_task(ignore_result=True)
+def sweep_inactive_users():
+    return utils.sweep_inactive_users()
+
+
+@shared_task(ignore_result=True)
+def rematch_jobs():
+    return matching.rematch_open_jobs()
+
+
+@shared_task(ignore_result=True)
+def expire_jobs():
+    return expiry.expire_jobs()
+
+
+@shared_task(ignore_result=True)
+def purge_stale_uploads():
+    return storage.purge_stale_uploads()
+
+
+@shared_task(ignore_result=True)
+def process_profile_picture(profile_type, user_id, name):
+    images.process_profile_picture(profile_type, user_id, name)
+
+
+@shared_task(ignore_result=True)
+def extract_cv_text(talent_id):
+    return cv_search.extract_cv_text(talent_id)
+
+
+@shared_task(ignore_result=True)
+def extract_pending_cvs():
+    return cv_search.extract_pending_cvs()
@@ -1,3 +1,1370 @@
-from django.test import TestCase
+import csv, datetime, decimal, importlib, io, json, os, re, tempfile, time, uuid
+from types import SimpleNamespace
+from unittest import mock
+import aiohttp
+from openpyxl import Workbook, load_workbook
+from PIL import Image
+from asgiref.sync import async_to_sync
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from .models import *
+from . import async_views
+from .authentication import _revocation_cache, is_revoked
+from . import metrics
+from .images import InvalidImage, decode_image, delete_picture_files, process_profile_picture, variant_name
+from .storage import append_chunk, attach_blob, session_path, start_upload, store_blob
+from .throttling import AuthIPThrottle, LocalTokenBuckets, consume
+from .serializers import CustomUserSerializer, JobSerializer, RecruiterSerializer, TalentSerializer
+from .fast_serializers import row_plan
+from .filters import years_ago
+from .renderers import FastJSONRenderer, dumps
+from .urls import urlpatterns
+from .counters import expected_counters, job_stats, reconcile_job_counters
+from .cv_search import cv_match_score, cv_matches, search_cvs
+from .expiry import expirable_jobs, expire_jobs
+from .matching import index_jobs, open_jobs, rank_talents, rematch_open_jobs, reindex_talents, score_open_jobs
+from .utils import (
+    claim_notifications, dispatch_notifications, enqueue_notification, enqueue_notifications, inactive_users,
+    inactive_users_after, iter_inactive_user_chunks, sweep_inactive_users,
+)
 
-# Create your tests here.
+
+def create_user(email, user_type='Talent', **extra):
+    # No password, hashing would dominate the fixture time
+    return CustomUser.objects.create_user(username=email, email=email, password=None, user_type=user_type, **extra)
+
+
+def token_client(user):
+    """APIClient sending an access token with signin's claims, authenticated like production requests."""
+    refresh = RefreshToken.for_user(user)
+    refresh['user_type'] = user.user_type
+    refresh['first_name'] = user.first_name
+    refresh['last_name'] = user.last_name
+    company_id = Recruiter.objects.filter(user=user).values_list('company__user_id', flat=True).first()
+    refresh['company_id'] = str(company_id) if company_id else None
+    refresh['user_id'] = str(user.id)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+    return client
+
+
+class TalentSearchTest(TestCase):
+    def setUp(self):
+        today = timezone.now().date()
+        self.client = token_client(create_user('hr@acme.io', user_type='Company'))
+        for i in range(6):
+            Talent.objects.create(
+                user=create_user(f'talent{i}@x.io'), is_open_to_work=i != 5, residence='Haifa' if i % 2 else 'Tel Aviv',
+                desired_salary=1000 * i, birth_date=years_ago(today, 20 + i),
+            )
+
+    def search(self, **params):
+        response = self.client.get(reverse('get_talents'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_cursor_pages_walk_every_open_talent_once(self):
+        data = self.search(page_size=2)
+        seen = [talent['id'] for talent in data['results']]
+        while data['next']:
+            data = self.client.get(data['next']).data
+            seen += [talent['id'] for talent in data['results']]
+        self.assertEqual(seen, sorted(Talent.objects.filter(is_open_to_work=True).values_list('id', flat=True)))
+
+    def test_filters(self):
+        self.assertEqual({t['residence'] for t in self.search(residence='Haifa')['results']}, {'Haifa'})
+        self.assertEqual(len(self.search(residence=['Haifa', 'Tel Aviv'])['results']), 5)
+        self.assertEqual([t['desired_salary'] for t in self.search(min_salary=2000, max_salary=3000)['results']], [2000.0, 3000.0])
+        # Ages 20 to 24, born on this day
+        self.assertEqual(len(self.search(min_age=21, max_age=22)['results']), 2)
+        self.assertEqual(self.client.get(reverse('get_talents'), {'min_salary': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('get_talents'), {'min_age': -1}).status_code, 400)
+
+
+class SkillsIndexTest(TestCase):
+    def setUp(self):
+        company = Company.objects.create(user=create_user('hr@acme.io', user_type='Company'), name='Acme')
+        self.job = Job.objects.create(
+            title='Backend', company=company, job_type='Full time', job_sitting='Remote', requirements=['Python', ' django ', 'English'],
+        )
+        self.best = Talent.objects.create(
+            user=create_user('best@x.io'), is_open_to_work=True, skills=['python', 'Django'], languages=['English'],
+            job_type='Full time', job_sitting='Remote',
+        )
+        self.partial = Talent.objects.create(user=create_user('partial@x.io'), is_open_to_work=True, skills=['Python'])
+        self.closed = Talent.objects.create(user=create_user('closed@x.io'), is_open_to_work=False, skills=['Python'])
+        Talent.objects.create(user=create_user('other@x.io'), is_open_to_work=True, skills=['Go'])
+
+    def test_saves_keep_the_index_in_sync(self):
+        self.assertEqual(set(self.job.skill_tokens.values_list('token', flat=True)), {'python', 'django', 'english'})
+        self.partial.skills = ['Rust', {'name': 'Go'}, None]
+        self.partial.save()
+        self.assertEqual(set(self.partial.skill_tokens.values_list('kind', 'token')), {('skill', 'rust'), ('skill', 'go')})
+
+    def test_rank_talents_orders_by_score(self):
+        ranked = rank_talents(self.job)
+        self.assertEqual([row['talent_id'] for row in ranked], [self.best.user_id, self.partial.user_id])
+        # 2 skills + 1 language over 3 requirements, plus both bonuses
+        self.assertAlmostEqual(ranked[0]['score'], (2 * 1.0 + 0.5) / 3 + 0.5, places=4)
+        self.assertAlmostEqual(ranked[1]['score'], 1 / 3, places=4)
+
+    def test_migration_backfill_matches_the_index(self):
+        backfill = importlib.import_module('users.migrations.0003_skills_index').backfill_skills_index
+        expected = (set(TalentSkill.objects.values_list('talent_id', 'kind', 'token')), set(JobSkill.objects.values_list('job_id', 'token')))
+        TalentSkill.objects.all().delete()
+        JobSkill.objects.all().delete()
+        backfill(django_apps, None)
+        self.assertEqual(
+            (set(TalentSkill.objects.values_list('talent_id', 'kind', 'token')), set(JobSkill.objects.values_list('job_id', 'token'))),
+            expected,
+        )
+
+
+class BatchRematchTest(TestCase):
+    def setUp(self):
+        today = timezone.now().date()
+        self.company_user = create_user('hr@acme.io', user_type='Company')
+        company = Company.objects.create(user=self.company_user, name='Acme')
+        requirements = [['Python', 'Django'], ['Go', 'English'], ['Python', 'Go', 'SQL', 'French'], ['Cobol']]
+        self.jobs = [
+            Job.objects.create(
+                title=f'Job {i}', company=company, job_type='Full time' if i % 2 else 'Part time', job_sitting='Remote',
+                requirements=tokens, end_date=today + datetime.timedelta(days=10),
+            )
+            for i, tokens in enumerate(requirements)
+        ]
+        self.ended = Job.objects.create(
+            title='Ended', company=company, job_type='Full time', job_sitting='Remote', requirements=['Python'],
+            end_date=today - datetime.timedelta(days=1),
+        )
+        skills = [['python'], ['Go', 'SQL'], ['python', 'django', 'go'], ['French'], []]
+        for i, talent_skills in enumerate(skills):
+            Talent.objects.create(
+                user=create_user(f'talent{i}@x.io'), is_open_to_work=True, skills=talent_skills,
+                languages=['English', 'French'] if i % 2 else [], job_type='Full time', job_sitting='Office' if i % 3 else 'Remote',
+            )
+        Talent.objects.create(user=create_user('closed@x.io'), is_open_to_work=False, skills=['Python'])
+
+    def test_batch_scores_match_the_index_ranking(self):
+        results = {}
+        for job_id, talent_id, score in score_open_jobs(top=10, chunk_size=2):
+            results.setdefault(job_id, {})[Talent.objects.get(pk=talent_id).user_id] = round(score, 4)
+        self.assertNotIn(self.ended.id, results)
+        for job in self.jobs:
+            with self.subTest(job=job.title):
+                expected = {row['talent_id']: row['score'] for row in rank_talents(job, limit=10)}
+                self.assertEqual(results.get(job.id, {}).keys(), expected.keys())
+                for talent_id, score in expected.items():
+                    # float32 matrices
+                    self.assertAlmostEqual(results[job.id][talent_id], score, places=3)
+
+    def test_job_matches_serves_the_stored_matches(self):
+        rematch_open_jobs(top=2)
+        self.assertEqual(JobMatch.objects.filter(job=self.jobs[2]).count(), 2)
+        client = token_client(self.company_user)
+        url = reverse('job_matches', kwargs={'job_id': self.jobs[2].id})
+        self.assertEqual(client.get(url).data, rank_talents(self.jobs[2], limit=2))
+        # Not rematched yet, ranked live
+        JobMatch.objects.filter(job=self.jobs[2]).delete()
+        self.assertEqual(len(client.get(url).data), 4)
+
+
+class ShortlistTest(TestCase):
+    def setUp(self):
+        company_user = create_user('hr@acme.io', user_type='Company')
+        self.company = Company.objects.create(user=company_user, name='Acme')
+        self.job = Job.objects.create(title='Backend', company=self.company, job_type='Full time', job_sitting='Remote')
+        self.talents = [Talent.objects.create(user=create_user(f'talent{i}@x.io', first_name=f'T{i}')) for i in range(3)]
+        self.client = token_client(company_user)
+        self.bulk_url = reverse('manage_tags_bulk', kwargs={'job_id': self.job.id})
+
+    def shortlisted(self):
+        return job_stats('company', self.company.id)['shortlisted']
+
+    def test_bulk_tag_counts_only_inserted_rows(self):
+        self.client.post(reverse('manage_tags', kwargs={'job_id': self.job.id}),
+                         {'talent_id': str(self.talents[0].user_id), 'match_by_form': 0.5}, format='json')
+        missing = str(uuid.uuid4())
+        response = self.client.post(self.bulk_url, {'talents': [
+            {'talent_id': str(talent.user_id), 'match_by_cv': 0.9, 'match_by_form': 0.4} for talent in self.talents
+        ] + [{'talent_id': missing, 'match_by_form': 1}]}, format='json')
+
+        self.assertEqual(response.data['added'], 2)
+        self.assertEqual(response.data['already_saved'], [str(self.talents[0].user_id)])
+        self.assertEqual(response.data['not_found'], [missing])
+        self.assertEqual(self.shortlisted(), JobShortlist.objects.count())
+        self.assertEqual(self.shortlisted(), 3)
+
+        # Everything already saved, nothing counted twice
+        response = self.client.post(self.bulk_url, {'talents': [
+            {'talent_id': str(talent.user_id), 'match_by_form': 0.4} for talent in self.talents
+        ]}, format='json')
+        self.assertEqual(response.data['added'], 0)
+        self.assertEqual(self.shortlisted(), 3)
+
+    def test_untag_and_payload(self):
+        JobShortlist.objects.bulk_create([JobShortlist(job=self.job, talent=talent, match_by_form=0.5) for talent in self.talents])
+        reconcile_job_counters()
+        response = self.client.delete(self.bulk_url, {'talent_ids': [str(self.talents[0].user_id)]}, format='json')
+        self.assertEqual(response.data['removed'], 1)
+        self.assertEqual(self.shortlisted(), 2)
+
+        job = self.client.get(reverse('manage_jobs', kwargs={'job_id': self.job.id})).data
+        self.assertEqual([entry['first_name'] for entry in job['relevant_talents']], ['T1', 'T2'])
+
+    def test_migration_copies_a_batch_of_jobs_with_one_talent_query(self):
+        batch_rows = importlib.import_module('users.migrations.0005_job_shortlist').batch_rows
+        other = Job.objects.create(title='Frontend', company=self.company, job_type='Full time', job_sitting='Remote')
+        jobs = [
+            SimpleNamespace(id=self.job.id, relevant_talents=[
+                {'talent_id': str(self.talents[0].user_id), 'match_by_cv': '0.5'}, {'talent_id': 'nope'}, 'junk',
+            ]),
+            SimpleNamespace(id=other.id, relevant_talents=[
+                {'talent_id': str(talent.user_id), 'match_by_form': 1} for talent in self.talents
+            ] + [{'talent_id': str(uuid.uuid4())}]),
+        ]
+        with self.assertNumQueries(1):
+            rows = list(batch_rows(jobs, Talent, JobShortlist))
+        self.assertEqual(
+            sorted((row.job_id == other.id, row.talent_id, row.match_by_cv, row.match_by_form) for row in rows),
+            sorted([(False, self.talents[0].id, 0.5, None)] + [(True, talent.id, None, 1.0) for talent in self.talents]),
+        )
+
+
+class UserDetailCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('hr@acme.io', user_type='Company')
+        self.company = Company.objects.create(user=self.user, name='Acme')
+        self.client = token_client(self.user)
+        is_revoked(str(self.user.id))
+        self.url = reverse('user_detail', kwargs={'user_id': self.user.id})
+
+    def test_reads_are_served_from_the_cache(self):
+        first = self.client.get(self.url).data
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).data, first)
+
+    def test_writes_invalidate_the_payload(self):
+        self.client.get(self.url)
+        self.company.name = 'Acme Labs'
+        self.company.save()
+        self.assertEqual(self.client.get(self.url).data['name'], 'Acme Labs')
+
+        self.user.phone_number = '0501234567'
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).data['phone_number'], '0501234567')
+
+        # Reverse side of the company's open jobs
+        job = Job.objects.create(title='Backend', company=self.company, job_type='Full time', job_sitting='Remote')
+        job.companies.add(self.company)
+        self.assertEqual(self.client.get(self.url).data['open_jobs'], [job.id])
+
+
+class NotificationOutboxTest(TestCase):
+    def test_rolled_back_notifications_are_never_queued(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            enqueue_notification('signup', {'user_email': 'me@x.io'})
+            raise RuntimeError
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_dispatch_claims_sends_then_records(self):
+        rows = enqueue_notifications('signup', [{'user_email': f'{i}@x.io'} for i in range(3)])
+
+        def post(calls):
+            # Leased while the calls are out, a concurrent dispatcher finds nothing to claim
+            self.assertEqual(set(NotificationOutbox.objects.values_list('status', flat=True)), {'in_flight'})
+            self.assertEqual(claim_notifications(10, timezone.now()), [])
+            return [200, 503, aiohttp.ClientError('refused')]
+
+        with mock.patch('users.utils.post_notifications', side_effect=post):
+            self.assertEqual(dispatch_notifications(), 3)
+        sent, failed, refused = [NotificationOutbox.objects.get(pk=row.pk) for row in rows]
+        self.assertEqual((sent.status, sent.attempts), ('sent', 0))
+        self.assertEqual((failed.status, failed.attempts, failed.last_error), ('pending', 1, 'Status code: 503'))
+        self.assertEqual((refused.status, refused.last_error), ('pending', 'refused'))
+        self.assertGreater(failed.next_attempt_at, timezone.now())
+
+    @override_settings(NOTIFICATION_MAX_ATTEMPTS=1)
+    def test_lost_leases_are_retried_and_failures_dead_lettered(self):
+        # Claimed by a dispatcher that died before recording anything
+        row = NotificationOutbox.objects.create(kind='signup', status='in_flight', leased_until=timezone.now() - datetime.timedelta(seconds=1))
+        with mock.patch('users.utils.post_notifications', return_value=[500]):
+            self.assertEqual(dispatch_notifications(), 1)
+        row.refresh_from_db()
+        self.assertEqual(row.status, 'dead')
+
+
+class InactiveUsersTest(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        # Ties on last_login, the keyset must neither skip nor repeat them
+        logins = [now - datetime.timedelta(days=days) for days in (10, 10, 10, 5, 5, 4)] + [now, None]
+        self.users = [create_user(f'user{i}@x.io', last_login=login) for i, login in enumerate(logins)]
+        create_user('gone@x.io', last_login=now - datetime.timedelta(days=9), is_active=False)
+        self.inactive = {str(user.id) for user in self.users[:6]}
+        self.client = token_client(self.users[-1])
+
+    def test_chunks_walk_every_inactive_user_once(self):
+        seen = [str(row['pk']) for chunk in iter_inactive_user_chunks(('email',), hours=72, chunk_size=2) for row in chunk]
+        self.assertEqual(len(seen), 6)
+        self.assertEqual(set(seen), self.inactive)
+
+        self.assertEqual(sweep_inactive_users(hours=72, chunk_size=4), 6)
+        self.assertEqual(NotificationOutbox.objects.filter(kind='inactive_user_check').count(), 6)
+
+    def test_feed_pages_follow_the_cursor(self):
+        seen = []
+        params = {'limit': 2, 'fields': 'email'}
+        while True:
+            response = self.client.get(reverse('get_inactive_users'), params)
+            data = json.loads(b''.join(response.streaming_content))
+            seen += [row['id'] for row in data['results']]
+            self.assertTrue(all(set(row) == {'id', 'email'} for row in data['results']))
+            if not data['next']:
+                break
+            params['after'] = data['next']
+        self.assertEqual(len(seen), 6)
+        self.assertEqual(set(seen), self.inactive)
+        self.assertEqual(self.client.get(reverse('get_inactive_users'), {'after': 'nope'}).status_code, 400)
+
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        self.company_user = create_user('hr@acme.io', user_type='Company', first_name='Acme')
+        company = Company.objects.create(user=self.company_user, name='Acme')
+        Job.objects.create(title='Backend', company=company, job_type='Full time', job_sitting='Remote', requirements=['Python'])
+        self.client = token_client(self.company_user)
+
+    def call(self, view, url, **kwargs):
+        request = RequestFactory().get(url, HTTP_AUTHORIZATION=self.client._credentials['HTTP_AUTHORIZATION'])
+        return async_to_sync(view)(request, **kwargs)
+
+    def test_async_views_match_the_sync_payloads(self):
+        user_id = self.company_user.id
+        for view, url, kwargs in [
+            (async_views.user_detail, reverse('user_detail', kwargs={'user_id': user_id}), {'user_id': user_id}),
+            (async_views.company_jobs, reverse('company-jobs', kwargs={'company_id': user_id}) + '?fields=id,title', {'company_id': user_id}),
+        ]:
+            expected = self.client.get(url)
+            response = self.call(view, url, **kwargs)
+            self.assertEqual(response.status_code, expected.status_code)
+            self.assertEqual(json.loads(response.content), json.loads(expected.content))
+
+    def test_unauthenticated_requests_are_rejected(self):
+        response = async_to_sync(async_views.check_auth)(RequestFactory().get('/'))
+        self.assertEqual(response.status_code, 401)
+
+
+class BenchSigninTest(TransactionTestCase):
+    def test_refuses_to_write_users_with_debug_off(self):
+        with self.assertRaises(CommandError):
+            call_command('bench_signin', requests=1, users=1)
+        self.assertFalse(CustomUser.objects.exists())
+
+    def test_signs_in_past_the_auth_throttles(self):
+        # 12 signins of one account, the email bucket alone holds 10
+        out = io.StringIO()
+        call_command('bench_signin', requests=11, users=1, json=True, force=True, stdout=out)
+        result = json.loads(out.getvalue())
+        self.assertEqual((result['requests'], result['errors']), (11, 0))
+        self.assertFalse(CustomUser.objects.exists())
+
+
+@override_settings(THROTTLE_REDIS_URL='')
+class AuthThrottleTest(TestCase):
+    def setUp(self):
+        patcher = mock.patch('users.throttling.local_buckets', LocalTokenBuckets())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def signin(self, email, address):
+        return self.client.post(
+            reverse('signin'), {'email': email, 'password': 'wrong'}, content_type='application/json', REMOTE_ADDR=address,
+        )
+
+    def test_email_bucket_holds_across_addresses(self):
+        for i in range(10):
+            self.assertNotEqual(self.signin('me@x.io', f'10.0.0.{i}').status_code, 429)
+        response = self.signin('Me@x.io ', '10.0.1.1')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertNotEqual(self.signin('other@x.io', '10.0.1.1').status_code, 429)
+
+    def test_address_is_the_entry_the_proxy_appended(self):
+        # One proxy hop (NUM_PROXIES=1): entries before the last one are whatever the client sent
+        throttle, factory = AuthIPThrottle(), RequestFactory()
+        key = lambda forwarded: throttle.get_cache_key(
+            Request(factory.post('/', HTTP_X_FORWARDED_FOR=forwarded, REMOTE_ADDR='10.1.1.1')), None,
+        )
+        self.assertEqual(key('1.1.1.1, 203.0.113.7'), key('2.2.2.2, 203.0.113.7'))
+        self.assertEqual(key('203.0.113.7'), key('9.9.9.9, 203.0.113.7'))
+        self.assertNotEqual(key('1.1.1.1, 203.0.113.7'), key('1.1.1.1, 203.0.113.8'))
+
+    @override_settings(THROTTLE_REDIS_URL='redis://127.0.0.1:1/0')
+    def test_unreachable_redis_falls_back_to_local_buckets(self):
+        with mock.patch('users.throttling._redis_script', None), mock.patch('users.throttling._redis_down_until', 0.0):
+            self.assertEqual(consume('throttle:test:a', 1, 1 / 60), (True, 0.0))
+            allowed, wait = consume('throttle:test:a', 1, 1 / 60)
+        self.assertFalse(allowed)
+        self.assertGreater(wait, 0)
+
+
+class BlobStorageTest(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        settings = override_settings(MEDIA_ROOT=root.name, UPLOAD_SESSION_DIR=os.path.join(root.name, 'sessions'))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = create_user('me@x.io')
+
+    def blobs(self):
+        return sorted(os.listdir(os.path.join(default_storage.location, 'blobs/ab/cd')))
+
+    def test_same_content_is_stored_once(self):
+        first = store_blob(ContentFile(b'cv'), 'abcd' + '0' * 60, 2, 'cv.pdf')
+        second = store_blob(ContentFile(b'cv'), 'abcd' + '0' * 60, 2, 'other.pdf')
+        self.assertEqual(first.path, second.path)
+        self.assertEqual(StoredBlob.objects.get().ref_count, 2)
+        self.assertEqual(len(self.blobs()), 1)
+
+    def test_losing_the_insert_race_deletes_the_extra_file(self):
+        sha256 = 'abcd' + '1' * 60
+        save = default_storage.save
+
+        def concurrent_save(name, content):
+            # Another upload of the same content commits between our lookup and our insert
+            path = save(name, ContentFile(b'cv'))
+            StoredBlob.objects.create(sha256=sha256, path=path, size=2, ref_count=1)
+            return save(name, content)
+
+        with mock.patch.object(default_storage, 'save', side_effect=concurrent_save):
+            blob = store_blob(ContentFile(b'cv'), sha256, 2, 'cv.pdf')
+        self.assertEqual(StoredBlob.objects.get().ref_count, 2)
+        self.assertEqual(self.blobs(), [os.path.basename(blob.path)])
+
+    def test_a_failed_insert_deletes_the_new_file(self):
+        with mock.patch.object(StoredBlob.objects, 'get_or_create', side_effect=DatabaseError('gone')), \
+                self.assertRaises(DatabaseError):
+            store_blob(ContentFile(b'cv'), 'abcd' + '2' * 60, 2, 'cv.pdf')
+        self.assertEqual(self.blobs(), [])
+
+    def test_a_failed_attach_releases_the_new_blob(self):
+        talent = Talent.objects.create(user=self.user)
+        blob = store_blob(ContentFile(b'cv'), 'abcd' + '3' * 60, 2, 'cv.pdf')
+        with mock.patch.object(Talent, 'save', side_effect=DatabaseError('gone')), \
+                self.assertRaises(DatabaseError):
+            attach_blob(talent, 'cv', blob)
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertEqual(self.blobs(), [])
+
+    def test_chunks_are_read_before_the_offset_is_locked(self):
+        session = start_upload(self.user.id, 'cv', 'cv.pdf', 6)
+        reads = []
+        with CaptureQueriesContext(connection) as queries:
+            stream = io.BytesIO(b'abc')
+            # Queries run so far at each read from the client
+            stream.read = lambda size, read=stream.read: reads.append(len(queries)) or read(size)
+            self.assertEqual(append_chunk(session, 0, stream, 3), 3)
+        self.assertEqual(set(reads), {0})
+        self.assertGreater(len(queries), 0)
+
+        session.refresh_from_db()
+        with self.assertRaisesRegex(ValueError, 'offset 3'):
+            append_chunk(session, 0, io.BytesIO(b'abc'), 3)
+        with self.assertRaisesRegex(ValueError, 'received 2'):
+            append_chunk(session, 3, io.BytesIO(b'de'), 3)
+        self.assertEqual(append_chunk(session, 3, io.BytesIO(b'def'), 3), 6)
+        with open(session_path(session), 'rb') as f:
+            self.assertEqual(f.read(), b'abcdef')
+
+
+class ProfilePictureTest(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        settings = override_settings(MEDIA_ROOT=root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+        self.talent = Talent.objects.create(user=create_user('me@x.io'))
+
+    def upload(self, data, name='me.jpg'):
+        self.talent.profile_picture = default_storage.save(f'profile_pictures/{name}', ContentFile(data))
+        self.talent.save(update_fields=['profile_picture'])
+        return self.talent.profile_picture.name
+
+    def jpeg(self, size=(40, 20), **options):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, (200, 10, 10)).save(buffer, 'JPEG', **options)
+        return buffer.getvalue()
+
+    def test_originals_are_stripped_and_turned_upright(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees
+        exif[0x010F] = 'Camera'
+        name = self.upload(self.jpeg(exif=exif.tobytes()))
+        process_profile_picture('Talent', self.talent.user_id, name)
+
+        self.talent.refresh_from_db()
+        self.assertEqual(self.talent.profile_picture.name, name)
+        with default_storage.open(name, 'rb') as f:
+            image = Image.open(f)
+            self.assertEqual(image.size, (20, 40))
+            self.assertEqual(len(image.getexif()), 0)
+
+    def test_files_that_are_not_images_are_dropped(self):
+        name = self.upload(b'<?php echo 1; ?>', 'me.png')
+        process_profile_picture('Talent', self.talent.user_id, name)
+        self.talent.refresh_from_db()
+        self.assertFalse(self.talent.profile_picture)
+        self.assertFalse(default_storage.exists(name))
+
+    @override_settings(IMAGE_MAX_PIXELS=100)
+    def test_pixel_count_is_checked_before_decoding(self):
+        name = self.upload(self.jpeg())
+        with mock.patch.object(Image.Image, 'load') as load, self.assertRaisesRegex(InvalidImage, 'too large'):
+            decode_image(name)
+        load.assert_not_called()
+
+    def test_variants_are_generated_once_and_deleted_with_the_original(self):
+        name = self.upload(self.jpeg())
+        url = reverse('profile_picture_variant', kwargs={'user_id': self.talent.user_id, 'size': 64, 'fmt': 'webp'})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 302)
+        path = variant_name(name, 64, 'webp')
+        with default_storage.open(path, 'rb') as f:
+            image = Image.open(f)
+            self.assertEqual((image.format, image.size), ('WEBP', (64, 64)))
+
+        with mock.patch.object(default_storage, 'save') as save, self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url)['Location'], response['Location'])
+        save.assert_not_called()
+        self.assertEqual(self.client.get(url.replace('/64/', '/65/')).status_code, 404)
+
+        delete_picture_files(name)
+        self.assertFalse(default_storage.exists(name) or default_storage.exists(path))
+
+
+class JobCountersTest(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(user=create_user('hr@acme.io', user_type='Company'), name='Acme')
+        self.recruiter = Recruiter.objects.create(user=create_user('lead@acme.io', user_type='Recruiter'), company=self.company)
+        self.today = datetime.date.today()
+
+    def job(self, **fields):
+        return Job.objects.create(
+            title='Backend', company=self.company, recruiter=self.recruiter, job_type='Full time', job_sitting='Remote',
+            division='R&D', end_date=self.today + datetime.timedelta(days=30), **fields,
+        )
+
+    def assertInStep(self):
+        self.assertEqual(reconcile_job_counters(dry_run=True), {'created': 0, 'updated': 0, 'deleted': 0})
+
+    def test_saves_and_deletes_move_the_counters(self):
+        job = self.job()
+        self.assertInStep()
+        stats = job_stats('company', self.company.id)
+        self.assertEqual((stats['jobs'], stats['open_jobs'], stats['by_division']), (1, 1, {'R&D': 1}))
+        self.assertEqual(stats['by_recruiter'], {str(self.recruiter.user_id): 1})
+
+        job.division, job.end_date = 'Sales', self.today - datetime.timedelta(days=1)
+        job.save()
+        self.assertInStep()
+        stats = job_stats('recruiter', self.recruiter.id)
+        self.assertEqual((stats['jobs'], stats['open_jobs'], stats['by_division']), (1, 0, {'Sales': 1}))
+
+        # No counted field written, no counter query
+        with self.assertNumQueries(1):
+            job.save(update_fields=['title'])
+
+        # Shortlist rows are counted by the views that write them, deleting the job uncounts them
+        JobShortlist.objects.create(job=job, talent=Talent.objects.create(user=create_user('me@x.io')), match_by_form=1)
+        reconcile_job_counters()
+        job.delete()
+        self.assertInStep()
+        self.assertEqual(job_stats('company', self.company.id)['jobs'], 0)
+        self.assertEqual(job_stats('company', self.company.id)['shortlisted'], 0)
+
+    def test_a_failed_counter_update_rolls_the_job_save_back(self):
+        job = self.job()
+        job.division = 'Sales'
+        with mock.patch('users.counters.apply_counter_deltas', side_effect=DatabaseError('gone')), \
+                self.assertRaises(DatabaseError):
+            job.save()
+        self.assertEqual(Job.objects.get(pk=job.pk).division, 'R&D')
+        self.assertInStep()
+
+    def test_expected_counters_count_identical_jobs_separately(self):
+        first, second = self.job(), self.job()
+        for i, job in enumerate((first, first, second)):
+            JobShortlist.objects.create(job=job, talent=Talent.objects.create(user=create_user(f't{i}@x.io')), match_by_form=1)
+        counters = expected_counters(chunk_size=1)
+        self.assertEqual(counters[('company', self.company.id, 'jobs')], 2)
+        self.assertEqual(counters[('recruiter', self.recruiter.id, 'division:R&D')], 2)
+        self.assertEqual(counters[('company', self.company.id, f'recruiter:{self.recruiter.id}')], 2)
+        self.assertEqual(counters[('company', self.company.id, 'shortlisted')], 3)
+
+    def test_migration_backfills_existing_jobs(self):
+        backfill = importlib.import_module('users.migrations.0010_job_counters').backfill_job_counters
+        self.job()
+        JobCounter.objects.all().delete()
+        backfill(django_apps, None)
+        self.assertInStep()
+        self.assertEqual(job_stats('company', self.company.id)['jobs'], 1)
+
+
+class BulkOnboardingTest(TestCase):
+    def setUp(self):
+        self.company_user = create_user('hr@acme.io', user_type='Company')
+        self.company = Company.objects.create(user=self.company_user, name='Acme')
+        self.recruiter = Recruiter.objects.create(user=create_user('lead@acme.io', user_type='Recruiter'), company=self.company)
+        self.client = token_client(self.company_user)
+        self.recruiters_url = reverse('bulk_onboard_recruiters', kwargs={'company_id': self.company_user.id})
+        self.jobs_url = reverse('bulk_create_jobs', kwargs={'company_id': self.company_user.id})
+
+    def recruiter_row(self, email, **fields):
+        return {'email': email, 'first_name': 'new', 'last_name': 'hire', 'division': 'r&d', **fields}
+
+    def test_only_the_company_or_staff_can_onboard(self):
+        other = create_user('hr@other.io', user_type='Company')
+        Company.objects.create(user=other, name='Other')
+        rows = {'recruiters': [self.recruiter_row('a@acme.io')]}
+        self.assertEqual(token_client(other).post(self.recruiters_url, rows, format='json').status_code, 403)
+        self.assertEqual(self.client.post(self.recruiters_url, rows, format='json').status_code, 201)
+        staff = token_client(create_user('ops@x.io', user_type='Company', is_staff=True))
+        rows = {'recruiters': [self.recruiter_row('b@acme.io')]}
+        self.assertEqual(staff.post(self.recruiters_url, rows, format='json').status_code, 201)
+        self.assertEqual(self.company.company_recruiters.count(), 3)
+
+    def test_bad_rows_are_reported_and_the_rest_created(self):
+        response = self.client.post(self.recruiters_url, {'recruiters': [
+            self.recruiter_row('new@acme.io'), self.recruiter_row('not an email'), self.recruiter_row('NEW@acme.io'),
+            self.recruiter_row('lead@acme.io'),
+        ]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([row['row'] for row in response.data['created']], [0])
+        self.assertEqual([error['row'] for error in response.data['errors']], [1, 2, 3])
+        user = CustomUser.objects.get(email='new@acme.io')
+        self.assertEqual((user.user_type, user.first_name, user.recruiter_profile.division), ('Recruiter', 'New', 'R&d'))
+        self.assertEqual(NotificationOutbox.objects.filter(kind='signup').count(), 1)
+
+        response = self.client.post(self.recruiters_url, {'recruiters': [self.recruiter_row('bad')]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_emails_taken_after_validation_are_skipped(self):
+        def hash_passwords(passwords):
+            # Someone signs up with one of the emails between validation and insert
+            create_user('race@acme.io')
+            return ['!'] * len(passwords)
+
+        with mock.patch('users.onboarding.hash_passwords', side_effect=hash_passwords):
+            response = self.client.post(self.recruiters_url, {'recruiters': [
+                self.recruiter_row('race@acme.io'), self.recruiter_row('ok@acme.io'),
+            ]}, format='json')
+        self.assertEqual([row['email'] for row in response.data['created']], ['ok@acme.io'])
+        self.assertEqual(response.data['errors'], [{'row': 0, 'errors': {'email': ['User with this email already exists.']}}])
+        self.assertFalse(Recruiter.objects.filter(user__email='race@acme.io').exists())
+
+    def test_jobs_are_indexed_and_counted(self):
+        end_date = (datetime.date.today() + datetime.timedelta(days=10)).isoformat()
+        job = {'title': 'Backend', 'job_type': 'Full time', 'job_sitting': 'Remote', 'end_date': end_date, 'requirements': ['Python']}
+        response = self.client.post(self.jobs_url, {'jobs': [
+            {**job, 'recruiter_email': 'LEAD@acme.io'}, {**job, 'recruiter_email': 'nobody@acme.io'}, {**job, 'title': ''},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([error['row'] for error in response.data['errors']], [1, 2])
+        created = Job.objects.get(pk=response.data['created'][0]['job_id'])
+        self.assertEqual(created.recruiter, self.recruiter)
+        self.assertTrue(JobSkill.objects.filter(job=created, token='python').exists())
+        self.assertEqual(job_stats('recruiter', self.recruiter.id)['open_jobs'], 1)
+
+
+@override_settings(SPREADSHEET_CHUNK_SIZE=2)
+class SpreadsheetTest(TestCase):
+    def setUp(self):
+        self.company_user = create_user('hr@acme.io', user_type='Company')
+        self.company = Company.objects.create(user=self.company_user, name='Acme')
+        self.recruiter = Recruiter.objects.create(user=create_user('lead@acme.io', user_type='Recruiter'), company=self.company)
+        self.jobs = [
+            Job.objects.create(title=title, company=self.company, recruiter=self.recruiter, job_type='Full time',
+                               job_sitting='Remote', requirements=['Python', 'Go'], end_date=datetime.date.today())
+            for title in ('Backend', '=HYPERLINK("x")', 'Frontend')
+        ]
+        self.client = token_client(self.company_user)
+
+    def export(self, entity, file_format):
+        response = self.client.get(reverse('export_data', kwargs={'entity': entity}), {'type': file_format})
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def upload(self, entity, name, data):
+        return self.client.post(
+            reverse('import_data', kwargs={'entity': entity}), {'file': SimpleUploadedFile(name, data)}, format='multipart',
+        )
+
+    def test_csv_round_trip(self):
+        content = self.export('jobs', 'csv').decode('utf-8-sig')
+        rows = list(csv.DictReader(io.StringIO(content)))
+        # Every page of the keyset walk, formulas neutralised
+        self.assertEqual(sorted(row['title'] for row in rows), sorted(['Backend', '\'=HYPERLINK("x")', 'Frontend']))
+        self.assertEqual({row['requirements'] for row in rows}, {'Python;Go'})
+
+        rows[0]['division'] = 'Platform'
+        rows.append({**rows[1], 'id': '', 'title': 'New'})
+        rows.append({**rows[1], 'id': str(uuid.uuid4())})
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=rows[0].keys())
+        writer.writeheader()
+        writer.writerows(rows)
+        response = self.upload('jobs', 'jobs.csv', output.getvalue().encode())
+
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['error_count']), (1, 3, 1))
+        self.assertEqual(response.data['errors'][0]['row'], 6)
+        self.assertEqual(Job.objects.get(pk=rows[0]['id']).division, 'Platform')
+        self.assertTrue(Job.objects.filter(title='=HYPERLINK("x")').exists())
+        self.assertEqual(reconcile_job_counters(dry_run=True), {'created': 0, 'updated': 0, 'deleted': 0})
+
+    def test_xlsx_round_trip(self):
+        sheet = load_workbook(io.BytesIO(self.export('recruiters', 'xlsx'))).active
+        header, *rows = [list(row) for row in sheet.iter_rows(values_only=True)]
+        self.assertEqual([row[0] for row in rows], ['lead@acme.io'])
+
+        workbook = Workbook()
+        workbook.active.append(header)
+        workbook.active.append(rows[0][:5] + ['sales', 'lead'])
+        workbook.active.append(['new@acme.io', 'new', 'hire'])
+        workbook.active.append(['not an email'])
+        data = io.BytesIO()
+        workbook.save(data)
+        response = self.upload('recruiters', 'recruiters.xlsx', data.getvalue())
+
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['error_count']), (1, 1, 1))
+        self.assertEqual(response.data['errors'][0]['row'], 4)
+        self.recruiter.refresh_from_db()
+        self.assertEqual(self.recruiter.division, 'Sales')
+        self.assertTrue(Recruiter.objects.filter(company=self.company, user__email='new@acme.io').exists())
+
+    def test_recruiter_columns_missing_from_the_sheet_are_kept(self):
+        Recruiter.objects.filter(pk=self.recruiter.pk).update(division='Sales', position='Lead', gender='F')
+        CustomUser.objects.filter(pk=self.recruiter.user_id).update(last_name='Doe', phone_number='+15550100')
+        response = self.upload('recruiters', 'recruiters.csv', b'email,first_name\nlead@acme.io,ada\n')
+
+        self.assertEqual(response.data['updated'], 1)
+        self.recruiter.refresh_from_db()
+        self.recruiter.user.refresh_from_db()
+        self.assertEqual((self.recruiter.division, self.recruiter.position, self.recruiter.gender), ('Sales', 'Lead', 'F'))
+        self.assertEqual(
+            (self.recruiter.user.first_name, self.recruiter.user.last_name, self.recruiter.user.phone_number),
+            ('Ada', 'Doe', '+15550100'),
+        )
+
+    def test_moving_the_end_date_forward_revives_an_expired_job(self):
+        job = self.jobs[0]
+        Job.objects.filter(pk=job.pk).update(end_date=datetime.date(2020, 1, 1), expired_at=timezone.now(), is_relevant=False)
+        end_date = datetime.date.today() + datetime.timedelta(days=30)
+        response = self.upload('jobs', 'jobs.csv', f'id,end_date\n{job.id},{end_date}\n'.encode())
+
+        self.assertEqual(response.data['updated'], 1)
+        job.refresh_from_db()
+        self.assertEqual((job.end_date, job.expired_at, job.is_relevant), (end_date, None, False))
+        self.assertTrue(Job.objects.live().filter(pk=job.pk).exists())
+
+    def test_scope_and_unreadable_files(self):
+        self.assertEqual(token_client(self.recruiter.user).get(reverse('export_data', kwargs={'entity': 'jobs'})).status_code, 403)
+        self.assertEqual(self.client.get(reverse('export_data', kwargs={'entity': 'talents'})).status_code, 403)
+        self.assertEqual(self.upload('jobs', 'jobs.xlsx', b'not a zip').status_code, 400)
+        self.assertEqual(self.upload('jobs', 'jobs.txt', b'title').status_code, 400)
+
+
+class RequestMetricsTest(TestCase):
+    def setUp(self):
+        self.user = create_user('me@x.io')
+        Talent.objects.create(user=self.user)
+        self.client = token_client(self.user)
+        self.url = reverse('user_detail', kwargs={'user_id': self.user.id})
+        cache.clear()
+
+    def sample(self, metric, labels):
+        return metric.samples.get(labels)
+
+    def test_requests_are_recorded_per_view(self):
+        before = self.sample(metrics.REQUESTS, ('user_detail', 'GET', '200')) or 0
+        _, queried, observed = self.sample(metrics.QUERIES, ('user_detail',)) or (None, 0, 0)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self.sample(metrics.REQUESTS, ('user_detail', 'GET', '200')), before + 1)
+        _, total, count = self.sample(metrics.QUERIES, ('user_detail',))
+        self.assertEqual((count, total), (observed + 1, queried + len(queries)))
+        self.assertGreater(self.sample(metrics.SERIALIZER_TIME, ('user_detail',))[1], 0)
+
+    def test_every_view_has_its_own_series(self):
+        # Series are labelled by URL name, views sharing one would be merged
+        names = [pattern.name for pattern in urlpatterns if getattr(pattern, 'name', None)]
+        self.assertEqual(len(names), len(set(names)))
+
+    def test_repeated_sql_counts_as_duplicate(self):
+        request_metrics = metrics.RequestMetrics()
+        for sql in ('SELECT 1', 'SELECT 2', 'SELECT 1'):
+            request_metrics.add_query(sql, 0.001)
+        self.assertEqual((request_metrics.queries, request_metrics.duplicate_queries), (3, 1))
+
+    def test_histograms_are_exposed_cumulative(self):
+        histogram = metrics.HistogramMetric('test_seconds', 'Test.', ('view',), (0.1, 1))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(('a',), value)
+        lines = list(histogram.lines())
+        self.assertIn('test_seconds_bucket{view="a",le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{view="a",le="1.0"} 2', lines)
+        self.assertIn('test_seconds_bucket{view="a",le="+Inf"} 3', lines)
+        self.assertIn('test_seconds_count{view="a"} 3', lines)
+
+    @override_settings(METRICS_SLOW_QUERIES=1, METRICS_SLOW_QUERY_MS=0)
+    def test_slowest_queries_are_logged_with_their_call_site(self):
+        with self.assertLogs('users', 'WARNING') as logs:
+            self.client.get(self.url)
+        self.assertIn('slowest', logs.output[-1])
+        self.assertIn('users/', logs.output[-1])
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_scrapes_need_the_token_and_are_not_recorded(self):
+        # A user's token is not the scrape token
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        response = APIClient().get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE http_requests_total counter', response.content)
+        self.assertFalse(any(labels[0] == 'metrics' for labels in metrics.REQUESTS.samples))
+
+
+class TalentOpenProcessesTest(TestCase):
+    def setUp(self):
+        self.talent = Talent.objects.create(user=create_user('me@x.io'), open_processes={'Acme': 'Interview'})
+        self.company_user = create_user('hr@acme.io', user_type='Company')
+        company = Company.objects.create(user=self.company_user, name='Acme')
+        self.recruiter = Recruiter.objects.create(user=create_user('lead@acme.io', user_type='Recruiter'), company=company)
+        job = Job.objects.create(title='Backend', company=company, job_type='Full time', job_sitting='Remote')
+        JobShortlist.objects.create(job=job, talent=self.talent, match_by_form=1)
+        other = create_user('hr@other.io', user_type='Company')
+        Company.objects.create(user=other, name='Other')
+        self.users = {
+            'self': (self.talent.user, 200),
+            'shortlisting company': (self.company_user, 200),
+            'its recruiter': (self.recruiter.user, 200),
+            'staff': (create_user('ops@x.io', is_staff=True), 200),
+            'other talent': (Talent.objects.create(user=create_user('you@x.io')).user, 403),
+            'other company': (other, 403),
+        }
+
+    def test_only_the_talent_staff_and_shortlisting_companies_see_processes(self):
+        url = reverse('talent_open_processes', kwargs={'talent_id': self.talent.user_id})
+        for name, (user, expected) in self.users.items():
+            with self.subTest(name):
+                response = token_client(user).get(url)
+                self.assertEqual(response.status_code, expected)
+                if expected == 200:
+                    self.assertEqual(response.data['open_processes'], {'Acme': 'Interview'})
+
+
+class CompanyRecruitersQueryBudgetTest(TestCase):
+    # company lookup + recruiters joined with their users
+    QUERY_BUDGET = 2
+
+    def setUp(self):
+        self.company_user = create_user('hr@acme.io', user_type='Company', first_name='Acme')
+        self.company = Company.objects.create(user=self.company_user, name='Acme')
+        self.client = token_client(self.company_user)
+        self.url = reverse('company_recruiters', kwargs={'company_id': self.company_user.id})
+
+    def add_recruiters(self, count):
+        start = Recruiter.objects.count()
+        for i in range(start, start + count):
+            user = create_user(f'recruiter{i}@acme.io', user_type='Recruiter', first_name=f'Recruiter{i}')
+            Recruiter.objects.create(user=user, company=self.company, division='R&D', position='Lead')
+
+    def test_query_count_does_not_grow_with_recruiters(self):
+        # Revocation answers are remembered per process, measured warm
+        is_revoked(str(self.company_user.id))
+        for count in (1, 30):
+            self.add_recruiters(count)
+            with self.assertNumQueries(self.QUERY_BUDGET):
+                response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data), Recruiter.objects.count())
+
+    def test_payload_merges_user_and_recruiter(self):
+        self.add_recruiters(1)
+        recruiter = Recruiter.objects.select_related('user').get()
+
+        response = self.client.get(self.url)
+
+        row = response.data[0]
+        expected = {**CustomUserSerializer(recruiter.user).data, **RecruiterSerializer(recruiter).data}
+        del expected['user']
+        self.assertEqual(row, expected)
+        self.assertEqual(row['id'], str(recruiter.id))
+        self.assertEqual(row['email'], recruiter.user.email)
+
+    def test_sparse_fields_with_and_without_the_user(self):
+        self.add_recruiters(1)
+        response = self.client.get(self.url, {'fields': 'division'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [{'division': 'R&D'}])
+
+        response = self.client.get(self.url, {'fields': 'user.email,division'})
+        self.assertEqual(response.data, [{'email': 'recruiter0@acme.io', 'division': 'R&D'}])
+
+
+class RouteQueryBudgetTest(TestCase):
+    """Every route is requested with SMALL and LARGE rows of each kind behind it.
+
+    A route must stay within its query budget at both sizes, run the same
+    number of queries at both (more rows, more queries is an N+1) and build
+    its response within its time budget at LARGE. Slow machines can stretch
+    the time budgets with QUERY_BUDGET_TIME_FACTOR.
+    """
+    SMALL, LARGE = 10, 1000
+    TIME_FACTOR = float(os.getenv('QUERY_BUDGET_TIME_FACTOR', 1))
+
+    # route -> (max queries, max milliseconds at LARGE)
+    BUDGETS = {
+        'user_detail:talent': (2, 200),
+        'user_detail:company': (3, 200),
+        'user_detail:recruiter': (2, 200),
+        'talent_open_processes': (1, 100),
+        'get_talents': (1, 500),
+        'cv_search': (2, 200),
+        'companies_detail': (1, 2000),
+        'company_recruiters': (2, 2000),
+        'company_jobs': (2, 3000),
+        'recruiter_jobs': (2, 3000),
+        'company_job_stats': (3, 200),
+        'recruiter_job_stats': (2, 200),
+        'manage_jobs': (2, 2000),
+        'job_matches': (2, 500),
+        'job_cv_matches': (3, 200),
+        'manage_recruiters': (1, 100),
+        'get_inactive_users': (1, 1000),
+    }
+
+    def setUp(self):
+        self.company_user = create_user('hr@acme.io', user_type='Company', first_name='Acme')
+        self.company = Company.objects.create(user=self.company_user, name='Acme')
+        self.recruiter = Recruiter.objects.create(
+            user=create_user('lead@acme.io', user_type='Recruiter', first_name='Lead'), company=self.company,
+        )
+        self.talent = Talent.objects.create(user=create_user('me@x.io'), is_open_to_work=True, skills=['Python'])
+        self.job = Job.objects.create(
+            title='Backend', company=self.company, recruiter=self.recruiter, job_type='Full time', job_sitting='Remote',
+            requirements=['Python', 'Django'], end_date=datetime.date.today() + datetime.timedelta(days=30),
+        )
+        self.rows = 0
+
+    def grow(self, count):
+        """Add rows until every list behind the routes holds `count` of them."""
+        start, self.rows = self.rows, count
+        indexes = range(start, count)
+        companies = CustomUser.objects.bulk_create(
+            [CustomUser(username=f'company{i}@x.io', email=f'company{i}@x.io', user_type='Company') for i in indexes]
+        )
+        Company.objects.bulk_create([Company(user=user, name=user.email) for user in companies])
+        recruiters = CustomUser.objects.bulk_create(
+            [CustomUser(username=f'recruiter{i}@x.io', email=f'recruiter{i}@x.io', user_type='Recruiter') for i in indexes]
+        )
+        Recruiter.objects.bulk_create([Recruiter(user=user, company=self.company, division='R&D') for user in recruiters])
+        talent_users = CustomUser.objects.bulk_create(
+            [CustomUser(username=f'talent{i}@x.io', email=f'talent{i}@x.io', user_type='Talent') for i in indexes]
+        )
+        talents = Talent.objects.bulk_create([
+            Talent(user=user, is_open_to_work=True, skills=['Python', 'Go'], languages=['English'])
+            for user in talent_users
+        ])
+        reindex_talents(talents)
+        CVDocument.objects.bulk_create([
+            CVDocument(talent=talent, source=f'blobs/{talent.user_id}.pdf', text='Python developer', status='ready')
+            for talent in talents
+        ])
+        jobs = Job.objects.bulk_create([
+            Job(title=f'Job {i}', company=self.company, recruiter=self.recruiter, job_type='Full time',
+                job_sitting='Office', requirements=['Python'])
+            for i in indexes
+        ])
+        index_jobs(jobs)
+        JobShortlist.objects.bulk_create([JobShortlist(job=self.job, talent=talent, match_by_form=0.5) for talent in talents])
+        JobMatch.objects.bulk_create([JobMatch(job=self.job, talent=talent, score=0.5) for talent in talents])
+
+    def requests(self):
+        """route -> (requesting user, url)."""
+        return {
+            'user_detail:talent': (self.talent.user, reverse('user_detail', kwargs={'user_id': self.talent.user_id})),
+            'user_detail:company': (self.company_user, reverse('user_detail', kwargs={'user_id': self.company_user.id})),
+            'user_detail:recruiter': (self.recruiter.user, reverse('user_detail', kwargs={'user_id': self.recruiter.user_id})),
+            'talent_open_processes': (self.talent.user, reverse('talent_open_processes', kwargs={'talent_id': self.talent.user_id})),
+            'get_talents': (self.company_user, reverse('get_talents')),
+            'cv_search': (self.company_user, reverse('cv_search') + '?q=python'),
+            'companies_detail': (self.company_user, reverse('companies_detail')),
+            'company_recruiters': (self.company_user, reverse('company_recruiters', kwargs={'company_id': self.company_user.id})),
+            'company_jobs': (self.company_user, reverse('company-jobs', kwargs={'company_id': self.company_user.id})),
+            'recruiter_jobs': (self.recruiter.user, reverse('recruiter-jobs', kwargs={'recruiter_id': self.recruiter.user_id})),
+            'company_job_stats': (self.company_user, reverse('company_job_stats', kwargs={'company_id': self.company_user.id})),
+            'recruiter_job_stats': (self.recruiter.user, reverse('recruiter_job_stats', kwargs={'recruiter_id': self.recruiter.user_id})),
+            'manage_jobs': (self.company_user, reverse('manage_jobs', kwargs={'job_id': self.job.id})),
+            'job_matches': (self.company_user, reverse('job_matches', kwargs={'job_id': self.job.id})),
+            'job_cv_matches': (self.company_user, reverse('job_cv_matches', kwargs={'job_id': self.job.id})),
+            'manage_recruiters': (self.recruiter.user, reverse('manage_recruiters', kwargs={'recruiter_id': self.recruiter.id})),
+            'get_inactive_users': (self.company_user, reverse('get_inactive_users') + '?hours=0&limit=10000'),
+        }
+
+    def measure(self, user, url):
+        """(queries, milliseconds, status) of one GET, streamed bodies included."""
+        # user_detail would be served from the cache filled by the previous size
+        cache.clear()
+        client = token_client(user)
+        # Revocation answers are remembered per process, measured warm
+        is_revoked(str(user.id))
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = (time.perf_counter() - started) * 1000
+        return len(queries), elapsed, response.status_code
+
+    def test_routes_stay_within_budget(self):
+        self.assertEqual(set(self.BUDGETS), set(self.requests()))
+        counts = {}
+        for size in (self.SMALL, self.LARGE):
+            self.grow(size)
+            for route, (user, url) in self.requests().items():
+                max_queries, max_ms = self.BUDGETS[route]
+                queries, elapsed, status_code = self.measure(user, url)
+                counts.setdefault(route, []).append(queries)
+                with self.subTest(route=route, rows=size):
+                    self.assertEqual(status_code, 200)
+                    self.assertLessEqual(queries, max_queries, f'{route} ran {queries} queries with {size} rows')
+                    if size == self.LARGE:
+                        self.assertLessEqual(elapsed, max_ms * self.TIME_FACTOR, f'{route} took {elapsed:.0f} ms with {size} rows')
+
+        for route, (small, large) in counts.items():
+            with self.subTest(route=route):
+                self.assertEqual(small, large, f'{route} runs {small} queries with {self.SMALL} rows and {large} with {self.LARGE}')
+
+
+class SparseFieldsTest(TestCase):
+    def setUp(self):
+        self.user = create_user('dev@x.io', first_name='Dev')
+        Talent.objects.create(user=self.user, is_open_to_work=True, about_me='About ' * 50, skills=['python'])
+        self.client = token_client(self.user)
+        is_revoked(str(self.user.id))
+
+    def test_fields_narrow_payload_and_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('get_talents'), {'fields': 'id,skills,user.email'})
+
+        self.assertEqual(response.data['results'][0]['skills'], ['python'])
+        self.assertEqual(response.data['results'][0]['user'], {'email': 'dev@x.io'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'skills', 'user'})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('about_me', queries[0]['sql'])
+
+    def test_secrets_and_permissions_only_on_request(self):
+        response = self.client.get(reverse('get_talents'))
+        user = response.data['results'][0]['user']
+        self.assertNotIn('password', user)
+        self.assertNotIn('groups', user)
+
+        # password is write only, even when asked for
+        response = self.client.get(reverse('get_talents'), {'fields': 'id,user.password', 'expand': 'user.groups'})
+        self.assertEqual(response.data['results'][0]['user'], {})
+        response = self.client.get(reverse('get_talents'), {'expand': 'user.groups'})
+        self.assertEqual(response.data['results'][0]['user']['groups'], [])
+
+
+class FastRenderParityTest(TestCase):
+    """The `.values()` row plans and the orjson renderer give the serializers' exact bytes."""
+    SELECTIONS = [
+        {},
+        {'fields': 'id,skills,user.email,user.last_login'},
+        {'fields': 'id,age,cv,profile_picture_variants,desired_salary', 'expand': 'user.groups'},
+    ]
+    TEXTS = ['Plain', 'Ünïcødé 😀 "quoted" \\ back / slash', 'line\u2028separator\u2029and\x01control\n', '']
+    FLOATS = [0.0, 0.1, 1234.5, 1e-05, 0.0001, 1e16, 123456789012345.6, -2.5e-30, None]
+
+    def setUp(self):
+        company_user = create_user('hr@acme.io', user_type='Company', first_name='Acme')
+        company = Company.objects.create(user=company_user, name='Acme')
+        recruiter = Recruiter.objects.create(user=create_user('lead@acme.io', user_type='Recruiter'), company=company)
+        self.talents = []
+        for i, salary in enumerate(self.FLOATS):
+            text = self.TEXTS[i % len(self.TEXTS)]
+            user = create_user(f'talent{i}@x.io', first_name=text, last_login=timezone.now() if i % 2 else None)
+            self.talents.append(Talent.objects.create(
+                user=user, is_open_to_work=True, about_me=text, desired_salary=salary,
+                birth_date=datetime.date(1990, 2, 28) if i % 3 else None,
+                skills=['Python', text], social_links={'x': text, 'score': salary}, languages=None,
+                cv=f'cvs/{i}.pdf' if i % 2 else '', profile_picture=f'pictures/{i}.png' if i % 3 else None,
+            ))
+        for i, salary in enumerate(self.FLOATS):
+            job = Job.objects.create(
+                title=self.TEXTS[i % len(self.TEXTS)] or 'Job', company=company, recruiter=recruiter if i % 2 else None,
+                job_type='Full time', job_sitting='Remote', salary=salary, requirements=[self.TEXTS[i % len(self.TEXTS)], salary],
+                end_date=datetime.date(2030, 1, i + 1) if i % 2 else None,
+            )
+            for talent in self.talents[:i]:
+                JobShortlist.objects.create(job=job, talent=talent, match_by_cv=salary, match_by_form=0.5)
+
+    def serializer_bytes(self, serializer_class, queryset, selection):
+        data = serializer_class(serializer_class.sparse_queryset(queryset, **selection), many=True, **selection).data
+        return JSONRenderer().render(data)
+
+    def test_row_plans_render_the_serializer_bytes(self):
+        cases = [
+            (TalentSerializer, Talent.objects.order_by('id')),
+            (JobSerializer, Job.objects.order_by('title', 'id')),
+        ]
+        for serializer_class, queryset in cases:
+            for selection in self.SELECTIONS:
+                with self.subTest(serializer=serializer_class.__name__, **selection):
+                    plan = row_plan(serializer_class, **selection)
+                    self.assertIsNotNone(plan)
+                    fast = FastJSONRenderer().render(plan.convert(plan.values(queryset)))
+                    self.assertEqual(fast, self.serializer_bytes(serializer_class, queryset, selection))
+
+    def test_endpoints_render_the_serializer_bytes(self):
+        client = token_client(self.talents[0].user)
+        company_id = Company.objects.get().user_id
+        response = client.get(reverse('company-jobs', kwargs={'company_id': company_id}))
+        self.assertEqual(
+            sorted(json.loads(response.content), key=lambda job: job['id']),
+            json.loads(self.serializer_bytes(JobSerializer, Job.objects.order_by('id'), {})),
+        )
+        response = client.get(reverse('get_talents'), {'page_size': 100})
+        expected = self.serializer_bytes(TalentSerializer, Talent.objects.order_by('id'), {})
+        self.assertEqual(response.content, b'{"next":null,"previous":null,"results":' + expected + b'}')
+
+    def test_renderer_matches_drf(self):
+        data = {
+            'texts': self.TEXTS, 'floats': self.FLOATS, 'big': 2 ** 70, 'decimal': decimal.Decimal('1.10'),
+            'when': datetime.datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+            'day': datetime.date(2024, 5, 1), 'id': uuid.UUID(int=1), 'nested': [{'a': (1, 2)}, {3: 'int key'}],
+        }
+        for value in [data, data['texts'], data['floats'], None, [], {}]:
+            self.assertEqual(FastJSONRenderer().render(value), JSONRenderer().render(value))
+        # Only exponent form floats, the big integer and the int key need DRF
+        self.assertIsNotNone(dumps({**data, 'floats': [0.1, 1234.5], 'big': 2 ** 60, 'nested': [{'a': (1, 2)}]}))
+        self.assertIsNone(dumps(data['floats']))
+
+
+class CVSearchIndexTest(TestCase):
+    # Runs against the SQLite FTS5 index, production uses the Postgres tsvector column
+
+    def add_cv(self, email, text):
+        talent = Talent.objects.create(user=create_user(email))
+        return CVDocument.objects.create(talent=talent, source=f'blobs/{email}.pdf', text=text, status='ready')
+
+    def test_search_ranks_matching_cvs(self):
+        self.add_cv('py@x.io', 'Python developer, Django, PostgreSQL')
+        self.add_cv('java@x.io', 'Java developer, Spring')
+        self.add_cv('go@x.io', 'Go engineer')
+
+        results = search_cvs('python developers')
+
+        self.assertEqual([row['talent_id'] for row in results], [CustomUser.objects.get(email='py@x.io').id])
+        self.assertTrue(0 < results[0]['score'] < 1)
+
+    def test_index_follows_text_updates_and_deletes(self):
+        document = self.add_cv('py@x.io', 'Python developer')
+        document.text = 'Rust developer'
+        document.save()
+        self.assertEqual(search_cvs('python'), [])
+        self.assertEqual(len(search_cvs('rust')), 1)
+
+        CVDocument.objects.filter(status='ready').update(status='pending')
+        self.assertEqual(search_cvs('rust'), [])
+        document.delete()
+        self.assertEqual(search_cvs('rust'), [])
+
+    def test_job_requirements_match_any_phrase(self):
+        self.add_cv('ml@x.io', 'Machine learning engineer')
+        self.add_cv('k8s@x.io', 'Kubernetes operator')
+        self.add_cv('other@x.io', 'Learning machines')
+        job = Job.objects.create(title='Platform', requirements=['Machine Learning', 'Kubernetes'])
+
+        matched = {row['talent_id'] for row in cv_matches(job)}
+
+        self.assertEqual(matched, set(CustomUser.objects.filter(email__in=['ml@x.io', 'k8s@x.io']).values_list('id', flat=True)))
+        self.assertIsNone(cv_match_score(job, Talent.objects.create(user=create_user('nocv@x.io'))))
+
+
+class IndexPlanTest(TestCase):
+    # Tables that grow with users / jobs, a full scan of any of them is a missing index
+    LARGE_TABLES = {
+        'users_customuser', 'users_talent', 'users_company', 'users_recruiter', 'users_job', 'users_jobshortlist',
+        'users_talentskill', 'users_jobskill', 'users_jobmatch', 'users_notificationoutbox', 'users_jobcounter',
+    }
+    # "Seq Scan on users_job" on Postgres, "SCAN users_job" (no index) on SQLite
+    FULL_SCAN = {
+        'postgresql': re.compile(r'Seq Scan on (\w+)'),
+        'sqlite': re.compile(r'\bSCAN (\w+)$', re.MULTILINE),
+    }
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # Empty test tables are cheaper to scan, make the planner show the indexes it can use
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def hot_queries(self):
+        some_id = uuid.uuid4()
+        today = timezone.now().date()
+        return {
+            'signin': CustomUser.objects.filter(username='talent@x.io'),
+            'signup email check': CustomUser.objects.filter(email='talent@x.io'),
+            'inactive users': inactive_users_after(inactive_users(24), timezone.now() - datetime.timedelta(days=30), some_id).order_by('last_login', 'pk'),
+            'company by user': Company.objects.filter(user_id=some_id),
+            'company recruiters': Recruiter.objects.filter(company__user_id=some_id),
+            'talent by user': Talent.objects.filter(user_id=some_id),
+            'talents page': Talent.objects.filter(is_open_to_work=True, id__gt=100).order_by('id')[:20],
+            'company jobs': Job.objects.filter(company__user_id=some_id),
+            'recruiter jobs': Job.objects.filter(recruiter__user_id=some_id),
+            'company open jobs': Job.objects.filter(Q(end_date__isnull=True) | Q(end_date__gte=today), company_id=some_id),
+            'company live jobs': Job.objects.live().filter(company__user_id=some_id),
+            'recruiter live jobs': Job.objects.live().filter(recruiter__user_id=some_id),
+            'open jobs': open_jobs(today),
+            'expirable jobs': expirable_jobs(today).order_by('end_date', 'pk')[:1000],
+            'job shortlist': JobShortlist.objects.filter(job_id=some_id).order_by('created_at', 'id'),
+            'talent shortlist': JobShortlist.objects.filter(talent_id=1),
+            'skill lookup': TalentSkill.objects.filter(token__in=['python'], talent__is_open_to_work=True),
+            'job matches': JobMatch.objects.filter(job_id=some_id).order_by('-score'),
+            'outbox batch': NotificationOutbox.objects.filter(status='pending', next_attempt_at__lte=timezone.now()).order_by('next_attempt_at'),
+            'outbox expired leases': NotificationOutbox.objects.filter(status='in_flight', leased_until__lte=timezone.now()),
+            'job counters': JobCounter.objects.filter(scope='company', owner_id=some_id),
+        }
+
+    def test_hot_queries_do_not_scan_large_tables(self):
+        pattern = self.FULL_SCAN.get(connection.vendor)
+        if pattern is None:
+            self.skipTest(f'No plan check for {connection.vendor}')
+        for name, queryset in self.hot_queries().items():
+            with self.subTest(name):
+                plan = queryset.explain()
+                scanned = set(pattern.findall(plan)) & self.LARGE_TABLES
+                self.assertFalse(scanned, f'{name} scans {scanned}:\n{plan}')
+
+
+class JobExpiryTest(TestCase):
+    def setUp(self):
+        today = timezone.now().date()
+        self.company_user = create_user('hr@acme.io', user_type='Company')
+        self.company = Company.objects.create(user=self.company_user, name='Acme')
+        self.talent = Talent.objects.create(user=create_user('talent@x.io'))
+        self.ended = [
+            Job.objects.create(
+                title=f'Ended {days}', company=self.company, job_type='Full time', job_sitting='Remote',
+                end_date=today - datetime.timedelta(days=days), is_relevant=True,
+            )
+            for days in (1, 30)
+        ]
+        self.live = [
+            Job.objects.create(title='Open', company=self.company, job_type='Full time', job_sitting='Remote', end_date=today),
+            Job.objects.create(title='No end date', company=self.company, job_type='Full time', job_sitting='Remote'),
+        ]
+        for job in self.ended + self.live:
+            JobShortlist.objects.create(job=job, talent=self.talent, match_by_cv=0.5)
+            JobMatch.objects.create(job=job, talent=self.talent, score=1.0)
+        self.company.open_jobs.add(*self.ended, *self.live)
+        reconcile_job_counters()
+
+    def test_expire_jobs_flips_ended_jobs_in_batches(self):
+        self.assertEqual(expire_jobs(batch_size=1), 2)
+        self.assertEqual(expire_jobs(batch_size=1), 0)
+
+        self.assertEqual(set(Job.objects.live()), set(self.live))
+        for job in Job.objects.filter(pk__in=[job.pk for job in self.ended]):
+            self.assertIsNotNone(job.expired_at)
+            self.assertFalse(job.is_relevant)
+        self.assertEqual(set(JobShortlist.objects.values_list('job_id', flat=True)), {job.pk for job in self.live})
+        self.assertEqual(set(JobMatch.objects.values_list('job_id', flat=True)), {job.pk for job in self.live})
+        self.assertEqual(set(self.company.open_jobs.all()), set(self.live))
+        # The sweep kept the shortlist counters in step with the table
+        self.assertEqual(reconcile_job_counters(dry_run=True), {'created': 0, 'updated': 0, 'deleted': 0})
+
+    def test_listings_show_live_jobs(self):
+        expire_jobs()
+        client = token_client(self.company_user)
+        url = reverse('company-jobs', kwargs={'company_id': self.company_user.id})
+        self.assertEqual({job['title'] for job in client.get(url).data}, {'Open', 'No end date'})
+        self.assertEqual(len(client.get(url, {'include_expired': 'true'}).data), 4)
+        self.assertEqual(client.get(url, {'include_expired': 'maybe'}).status_code, 400)
+
+    def test_moving_the_end_date_forward_revives_a_job(self):
+        expire_jobs()
+        job = Job.objects.get(pk=self.ended[0].pk)
+        job.end_date = timezone.now().date() + datetime.timedelta(days=7)
+        job.save(update_fields=['end_date'])
+        self.assertIsNone(Job.objects.get(pk=job.pk).expired_at)
+
+
+class ClaimsUserTest(TestCase):
+    def setUp(self):
+        _revocation_cache.clear()
+        self.user = create_user('me@x.io', first_name='Me')
+        self.staff = create_user('staff@x.io', is_staff=True)
+
+    def test_claims_are_served_from_the_token(self):
+        client = token_client(self.user)
+        # The revocation check, remembered for the next requests
+        with self.assertNumQueries(1):
+            response = client.get(reverse('check_auth'))
+        self.assertEqual(response.data['user_id'], str(self.user.id))
+        with self.assertNumQueries(0):
+            client.get(reverse('check_auth'))
+
+    def test_staff_checks_read_the_user_row(self):
+        self.assertEqual(token_client(self.user).get(reverse('export_data', kwargs={'entity': 'talents'})).status_code, 403)
+        self.assertEqual(token_client(self.staff).get(reverse('export_data', kwargs={'entity': 'talents'})).status_code, 200)
+
+    def test_claims_missing_from_the_token_are_read_from_the_row(self):
+        # What api/token/ issues: no user_type, names or company_id
+        def bare_client(user):
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+            return client
+
+        company_user = create_user('hr@acme.io', user_type='Company')
+        company = Company.objects.create(user=company_user, name='Acme')
+        recruiter = Recruiter.objects.create(user=create_user('lead@acme.io', user_type='Recruiter'), company=company)
+        talent = Talent.objects.create(user=self.user)
+        job = Job.objects.create(title='Backend', company=company, job_type='Full time', job_sitting='Remote')
+        JobShortlist.objects.create(job=job, talent=talent, match_by_form=1)
+
+        self.assertEqual(bare_client(company_user).get(reverse('export_data', kwargs={'entity': 'jobs'})).status_code, 200)
+        url = reverse('talent_open_processes', kwargs={'talent_id': self.user.id})
+        self.assertEqual(bare_client(recruiter.user).get(url).status_code, 200)
+        self.assertEqual(bare_client(create_user('you@x.io', user_type='Recruiter')).get(url).status_code, 403)
+
+    def test_deactivated_users_are_rejected(self):
+        client = token_client(self.user)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(client.get(reverse('check_auth')).status_code, 401)
+
+    @override_settings(JWT_REVOCATION_CHECK_TTL=0)
+    def test_deleted_user_is_an_authentication_failure(self):
+        client = token_client(self.staff)
+        self.staff.delete()
+        self.assertEqual(client.get(reverse('export_data', kwargs={'entity': 'talents'})).status_code, 401)
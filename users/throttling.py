@@ -0,0 +1,164 @@
+"""
+Token bucket throttles for the unauthenticated auth endpoints.
+
+Every client key (IP address, email) owns a bucket of `capacity` tokens that
+refills continuously at capacity / period. A request takes one token, an empty
+bucket means 429 with Retry-After. DRF runs throttles before the view body, so
+a rejected request never reaches the password hasher or the ORM.
+
+Buckets live in Redis (one atomic Lua script per check, shared by every
+worker). While Redis is unreachable each process falls back to its own
+in-memory buckets, the limit then applies per process instead of globally.
+"""
+
+import hashlib, logging, threading, time
+from collections import OrderedDict
+import redis
+from django.conf import settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+users_logger = logging.getLogger('users')
+
+# Seconds to stay on the local buckets after a Redis error
+REDIS_RETRY_SECONDS = 30
+
+# KEYS[1] bucket, ARGV capacity, refill rate (tokens/s), cost -> {allowed, seconds to wait}
+# Uses the Redis clock so workers with skewed clocks agree on the refill (needs Redis 5+ effects replication)
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return {allowed, tostring(wait)}
+"""
+
+
+# -------------------------------------In-process buckets-----------------------------------------------------------------------------------------------------------------------------------------------
+
+class LocalTokenBuckets:
+    """Thread safe token buckets split over shards, each with its own lock.
+
+    Each shard keeps at most `max_keys / shards` buckets and drops the least
+    recently used one beyond that, so a flood of distinct keys cannot grow
+    memory without bound.
+    """
+
+    def __init__(self, shards=16, max_keys=100000):
+        self.shards = [(threading.Lock(), OrderedDict()) for _ in range(shards)]
+        self.max_keys_per_shard = max(1, max_keys // shards)
+
+    def consume(self, key, capacity, rate, cost=1):
+        lock, buckets = self.shards[hash(key) % len(self.shards)]
+        now = time.monotonic()
+        with lock:
+            tokens, ts = buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - ts) * rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (cost - tokens) / rate
+            buckets[key] = (tokens, now)
+            if len(buckets) > self.max_keys_per_shard:
+                buckets.popitem(last=False)
+        return wait == 0.0, wait
+
+
+local_buckets = LocalTokenBuckets(settings.THROTTLE_LOCAL_SHARDS, settings.THROTTLE_LOCAL_MAX_KEYS)
+
+
+# -------------------------------------Redis buckets-----------------------------------------------------------------------------------------------------------------------------------------------
+
+_redis_script = None
+_redis_down_until = 0.0
+
+
+def get_token_bucket_script():
+    # Created lazily, the client keeps its own connection pool
+    global _redis_script
+    if _redis_script is None:
+        client = redis.Redis.from_url(
+            settings.THROTTLE_REDIS_URL,
+            socket_timeout=settings.THROTTLE_REDIS_TIMEOUT,
+            socket_connect_timeout=settings.THROTTLE_REDIS_TIMEOUT,
+        )
+        _redis_script = client.register_script(TOKEN_BUCKET_SCRIPT)
+    return _redis_script
+
+
+def consume(key, capacity, rate, cost=1):
+    """Take `cost` tokens from the bucket `key`, returns (allowed, seconds until allowed)."""
+    global _redis_down_until
+    if settings.THROTTLE_REDIS_URL and time.monotonic() >= _redis_down_until:
+        try:
+            allowed, wait = get_token_bucket_script()(keys=[key], args=[capacity, rate, cost])
+            return bool(allowed), float(wait)
+        except redis.exceptions.RedisError as e:
+            _redis_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+            users_logger.warning(f"Throttle store unreachable, using in-process buckets for {REDIS_RETRY_SECONDS}s: {e}")
+    return local_buckets.consume(key, capacity, rate, cost)
+
+
+# -------------------------------------DRF throttles-----------------------------------------------------------------------------------------------------------------------------------------------
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """SimpleRateThrottle rates ('10/min') read as bucket capacity / refill period."""
+
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        allowed, self.retry_after = consume(key, self.num_requests, self.num_requests / self.duration)
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class AuthIPThrottle(TokenBucketThrottle):
+    scope = 'auth_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class AuthEmailThrottle(TokenBucketThrottle):
+    scope = 'auth_email'
+
+    def get_cache_key(self, request, view):
+        data = request.data
+        email = data.get('email') if hasattr(data, 'get') else None
+        if not isinstance(email, str) or not email.strip():
+            return None
+        # Hashed so the throttle store holds no addresses
+        ident = hashlib.blake2b(email.lower().strip().encode(), digest_size=16).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+AUTH_THROTTLES = [AuthIPThrottle, AuthEmailThrottle]
@@ -7,6 +7,9 @@ from rest_framework_simplejwt.views import (
 from django.conf import settings
 from django.conf.urls.static import static
 
+# Under ASGI the read endpoints are served by their async counterparts
+if settings.ASGI_MODE:
+    from .async_views import user_detail, company_jobs, recruiter_jobs, check_auth
 
 
 urlpatterns = [
@@ -33,19 +36,30 @@ urlpatterns = [
     path('talent/<uuid:talent_id>/open_processes/', talent_open_processes, name='talent_open_processes'),
     path('manage-cv/<uuid:talent_id>/', manage_cv, name='manage_cv'),
     path('manage-profile-pic/<uuid:user_id>/', manage_profile_pic, name='manage_profile_pic'),
+    path('profile-picture/<uuid:user_id>/<int:size>/<str:fmt>/', profile_picture_variant, name='profile_picture_variant'),
     path('manage-recommendation-letter/<uuid:user_id>/', manage_recommendation_letter, name='manage_recommendation_letter'),
+    path('uploads/', start_resumable_upload, name='start_resumable_upload'),
+    path('uploads/<uuid:upload_id>/', resumable_upload, name='resumable_upload'),
+    path('uploads/<uuid:upload_id>/complete/', complete_resumable_upload, name='complete_resumable_upload'),
 
     #-------------------------------------recruiter--------------------------------------------------------------------------------
     path('recruiter/<uuid:recruiter_id>/jobs/', recruiter_jobs, name='recruiter-jobs'),
+    path('recruiter/<uuid:recruiter_id>/stats/', recruiter_job_stats, name='recruiter_job_stats'),
 
     #-------------------------------------company--------------------------------------------------------------------------------
     path('company/<uuid:company_id>/recruiters/', company_recruiters, name='company_recruiters'),
     path('companies/', companies_details, name='companies_detail'),
     path('company/job/<uuid:job_id>/', manage_jobs, name='manage_jobs'),
     path('company/<uuid:company_id>/job/', create_job, name='create_job'),
+    path('company/<uuid:company_id>/jobs/bulk/', bulk_create_jobs, name='bulk_create_jobs'),
+    path('company/<uuid:company_id>/recruiters/bulk/', bulk_onboard_recruiters, name='bulk_onboard_recruiters'),
     path('company/<uuid:company_id>/jobs/', company_jobs, name='company-jobs'),
-    path('recruiters/<uuid:recruiter_id>/', manage_recruiters, name='company-jobs'),
+    path('company/<uuid:company_id>/stats/', company_job_stats, name='company_job_stats'),
+    path('recruiters/<uuid:recruiter_id>/', manage_recruiters, name='manage_recruiters'),
     path('recruiters/tags/<uuid:job_id>/', manage_tags, name='manage_tags'),
+    path('recruiters/tags/<uuid:job_id>/bulk/', manage_tags_bulk, name='manage_tags_bulk'),
+    path('company/job/<uuid:job_id>/matches/', job_matches, name='job_matches'),
+    path('company/job/<uuid:job_id>/cv-matches/', job_cv_matches, name='job_cv_matches'),
 
 
 
@@ -54,6 +68,10 @@ urlpatterns = [
     path("check-auth/",check_auth,name='check_auth'),
     path('inactive-users/', get_inactive_users, name='get_inactive_users'),
     path('talents/', get_talents, name='get_talents'),
+    path('talents/cv-search/', cv_search, name='cv_search'),
+    path('export/<str:entity>/', export_data, name='export_data'),
+    path('import/<str:entity>/', import_data, name='import_data'),
+    path('metrics/', metrics, name='metrics'),
 
 
 
@@ -1,58 +1,265 @@
-import logging,requests,os
+import logging,os,random,datetime,time,asyncio,threading,atexit,base64,json,uuid
+import aiohttp
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
 from .models import *
 
 
 NOTIFICATION_SERVICE_URL=os.getenv('NOTIFICATION_SERVICE_URL',"http://localhost:8070/api/v1/notifications/")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
 users_logger = logging.getLogger('users')
-# -------------------------------------Talents-----------------------------------------------------------------------------------------------------------------------------------------------
 
-def trigger_signup_notification(user_email):
-    url = f"{NOTIFICATION_SERVICE_URL}send-signup-notification/"
+# Notification service endpoint per outbox kind
+NOTIFICATION_ENDPOINTS = {
+    'signup': 'send-signup-notification/',
+    'inactive_user_check': 'trigger-inactive-user-check/',
+}
 
-    data = {'user_email': user_email}
+_notification_loop = None
+_notification_loop_pid = None
+_notification_loop_lock = threading.Lock()
+_notification_session = None
 
+# Seconds to skip on-commit dispatch scheduling after the broker could not be reached
+DISPATCH_PAUSE_SECONDS = 60
+_dispatch_paused_until = 0.0
+
+
+# -------------------------------------Notifications transport-----------------------------------------------------------------------------------------------------------------------------------------------
+# All outbound calls share one aiohttp session (and its connection pool) per process.
+# An aiohttp session is bound to the event loop it was created on, so it lives on a
+# dedicated loop thread, the outbox dispatcher blocks on the result.
+
+def get_notification_loop():
+    # Created lazily and per pid so forked gunicorn / Celery workers start their own
+    global _notification_loop, _notification_loop_pid, _notification_session
+    with _notification_loop_lock:
+        if _notification_loop is None or _notification_loop_pid != os.getpid():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='notifications', daemon=True).start()
+            _notification_loop, _notification_loop_pid, _notification_session = loop, os.getpid(), None
+    return _notification_loop
+
+
+def get_notification_session():
+    # Only called from the notification loop
+    global _notification_session
+    if _notification_session is None:
+        _notification_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=settings.NOTIFICATION_POOL_SIZE),
+            timeout=aiohttp.ClientTimeout(
+                sock_connect=settings.NOTIFICATION_CONNECT_TIMEOUT,
+                sock_read=settings.NOTIFICATION_READ_TIMEOUT,
+            ),
+        )
+    return _notification_session
+
+
+@atexit.register
+def close_notification_session():
+    if _notification_session is not None and _notification_loop_pid == os.getpid():
+        asyncio.run_coroutine_threadsafe(_notification_session.close(), _notification_loop).result(timeout=5)
+
+
+async def _post_notification(kind, data):
+    url = f"{NOTIFICATION_SERVICE_URL}{NOTIFICATION_ENDPOINTS[kind]}"
+    async with get_notification_session().post(url, json=data) as response:
+        # Drain the body so the connection goes back to the pool
+        await response.read()
+        return response.status
+
+
+async def _post_notifications(calls):
+    return await asyncio.gather(*(_post_notification(kind, data) for kind, data in calls), return_exceptions=True)
+
+
+def post_notifications(calls):
+    """POST several (kind, data) notifications concurrently.
+
+    Returns one status code or transport exception per call, in order.
+    Concurrency is bounded by the session's pool (NOTIFICATION_POOL_SIZE).
+    """
+    if not calls:
+        return []
+    return asyncio.run_coroutine_threadsafe(_post_notifications(calls), get_notification_loop()).result()
+
+
+# -------------------------------------Notifications outbox-----------------------------------------------------------------------------------------------------------------------------------------------
+
+def schedule_notification_dispatch():
+    # Called on commit, a broker outage must not fail or stall the request that queued the notification
+    global _dispatch_paused_until
+    if time.monotonic() < _dispatch_paused_until:
+        return
+
+    from .tasks import dispatch_notifications
     try:
-        # Log the start of the request
-        users_logger.info(f"Attempting to send signup notification to {user_email}")
+        dispatch_notifications.apply_async(retry=False)
+    except Exception as e:
+        # Stop trying for a while, the periodic dispatch delivers whatever is queued meanwhile
+        _dispatch_paused_until = time.monotonic() + DISPATCH_PAUSE_SECONDS
+        users_logger.warning(f"Could not schedule notification dispatch, the periodic sweep will deliver it: {e}")
+
+
+def enqueue_notifications(kind, payloads):
+    """Write notifications to the outbox as part of the current transaction.
+
+    They are only visible to the dispatcher once the surrounding transaction
+    commits, so a rolled back signup never sends an email.
+    """
+    rows = NotificationOutbox.objects.bulk_create(
+        [NotificationOutbox(kind=kind, payload=payload) for payload in payloads],
+        batch_size=settings.NOTIFICATION_BATCH_SIZE,
+    )
+    if rows:
+        transaction.on_commit(schedule_notification_dispatch)
+    return rows
+
+
+def enqueue_notification(kind, payload):
+    return enqueue_notifications(kind, [payload])[0]
 
-        # Send the POST request to the notifications service
-        response = requests.post(url, json=data)
-        if response.status_code == 200:
-            users_logger.info(f"Notification email sent successfully to {user_email}")
-            return "Notification email sent successfully."
-        else:
-            users_logger.error(f"Failed to send notification email to {user_email}. Status code: {response.status_code}")
-            return f"Failed to send notification email. Status code: {response.status_code}"
 
-    except requests.exceptions.RequestException as e:
-        # Log any request-related exceptions
-        users_logger.error(f"Error occurred while sending signup notification to {user_email}: {str(e)}")
-        return f"Failed to send notification email due to an error: {str(e)}"
-    
+def retry_delay(attempts):
+    # Exponential backoff with jitter: base, 2*base, 4*base ... capped
+    delay = min(settings.NOTIFICATION_BACKOFF_MAX, settings.NOTIFICATION_BACKOFF_BASE * 2 ** (attempts - 1))
+    return datetime.timedelta(seconds=delay * random.uniform(0.5, 1.0))
 
 
+def record_delivery(notification, result, now):
+    """Apply one delivery result (status code or transport exception) to an outbox row."""
+    if not isinstance(result, Exception) and 200 <= result < 300:
+        notification.status = 'sent'
+        notification.sent_at = now
+        notification.last_error = None
+        return
+    error = str(result) if isinstance(result, Exception) else f"Status code: {result}"
 
-def trigger_inactive_user_check(user_email):
-    url = f"{NOTIFICATION_SERVICE_URL}trigger-inactive-user-check/"
+    notification.attempts += 1
+    notification.last_error = error
+    if notification.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+        # Dead letter, kept in the table for inspection and manual replay
+        notification.status = 'dead'
+        users_logger.error(f"Notification {notification.id} ({notification.kind}) dead-lettered after {notification.attempts} attempts: {error}")
+    else:
+        notification.status = 'pending'
+        notification.next_attempt_at = now + retry_delay(notification.attempts)
+        users_logger.warning(f"Notification {notification.id} ({notification.kind}) failed, attempt {notification.attempts}: {error}")
 
-    data = {'user_email': user_email}
 
+def release_expired_leases(now):
+    """Make in_flight rows whose lease ended pending again, their dispatcher never recorded a result."""
+    return NotificationOutbox.objects.filter(status='in_flight', leased_until__lte=now).update(
+        status='pending', leased_until=None, next_attempt_at=now,
+    )
+
+
+def claim_notifications(batch_size, now):
+    """Lease a batch of due notifications to this dispatcher, in a transaction of its own.
+
+    Rows are picked with SKIP LOCKED and marked in_flight until
+    NOTIFICATION_LEASE_SECONDS from now, so concurrent dispatchers never claim
+    the same row and a row whose dispatcher died is sent again after its lease.
+    """
+    release_expired_leases(now)
+    with transaction.atomic():
+        batch = list(
+            NotificationOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        leased_until = now + datetime.timedelta(seconds=settings.NOTIFICATION_LEASE_SECONDS)
+        NotificationOutbox.objects.filter(pk__in=[notification.pk for notification in batch]).update(
+            status='in_flight', leased_until=leased_until,
+        )
+    return batch
+
+
+def dispatch_notifications(batch_size=None):
+    """Deliver one batch of due notifications, returns how many were picked up.
+
+    Claiming, sending and recording are three steps: no transaction or row
+    lock is held while the HTTP calls are in flight.
+    """
+    batch_size = batch_size or settings.NOTIFICATION_BATCH_SIZE
+    batch = claim_notifications(batch_size, timezone.now())
+    if not batch:
+        return 0
+
+    # The whole batch goes out concurrently over the shared session
+    results = post_notifications([(notification.kind, notification.payload) for notification in batch])
+
+    now = timezone.now()
+    for notification, result in zip(batch, results):
+        record_delivery(notification, result, now)
+        notification.leased_until = None
+    with transaction.atomic():
+        NotificationOutbox.objects.bulk_update(
+            batch, ['status', 'attempts', 'next_attempt_at', 'leased_until', 'last_error', 'sent_at']
+        )
+    return len(batch)
+
+
+# -------------------------------------Inactive users-----------------------------------------------------------------------------------------------------------------------------------------------
+
+def inactive_users(hours=None):
+    hours = settings.INACTIVE_USER_THRESHOLD_HOURS if hours is None else hours
+    threshold = timezone.now() - datetime.timedelta(hours=hours)
+    return CustomUser.objects.filter(last_login__lt=threshold, is_active=True)
+
+
+def inactive_users_after(queryset, last_login, pk):
+    """The rows of `queryset` after the keyset position (last_login, pk), in (last_login, pk) order.
+
+    The `last_login >= x` bound lets the (last_login, id) index over active
+    users start its range scan at the position, the OR only filters the ties.
+    """
+    return queryset.filter(last_login__gte=last_login).filter(Q(last_login__gt=last_login) | Q(pk__gt=pk))
+
+
+def encode_inactive_cursor(last_login, pk):
+    return base64.urlsafe_b64encode(json.dumps([last_login.isoformat(), str(pk)]).encode()).decode()
+
+
+def decode_inactive_cursor(value):
+    """(last_login, pk) of a cursor made by encode_inactive_cursor, None when it is not one."""
     try:
-        # Log the start of the request
-        users_logger.info(f"Attempting to send inactive notification to {user_email}")
-
-        # Send the POST request to the notifications service
-        response = requests.post(url, json=data)
-        if response.status_code == 200:
-            users_logger.info(f"Notification email sent successfully to {user_email}")
-            return "Notification email sent successfully."
-        else:
-            users_logger.error(f"Failed to send notification email to {user_email}. Status code: {response.status_code}")
-            return f"Failed to send notification email. Status code: {response.status_code}"
-
-    except requests.exceptions.RequestException as e:
-        # Log any request-related exceptions
-        users_logger.error(f"Error occurred while sending inactive notification to {user_email}: {str(e)}")
-        return f"Failed to send notification email due to an error: {str(e)}"
-    
+        last_login, pk = json.loads(base64.urlsafe_b64decode(value.encode()))
+        return datetime.datetime.fromisoformat(last_login), uuid.UUID(pk)
+    except (TypeError, ValueError):
+        return None
+
+
+def iter_inactive_user_chunks(fields, hours=None, chunk_size=None):
+    """Yield inactive users in (last_login, pk) order, `chunk_size` rows at a time.
+
+    Each chunk is a separate keyset query read in index order from the
+    (last_login, id) index over active users, so memory and query cost stay
+    flat however many users are inactive.
+    """
+    chunk_size = chunk_size or settings.INACTIVE_USER_CHUNK_SIZE
+    queryset = inactive_users(hours).order_by('last_login', 'pk').values('pk', 'last_login', *fields)
+    last_seen = None
+    while True:
+        page = queryset if last_seen is None else inactive_users_after(queryset, last_seen['last_login'], last_seen['pk'])
+        chunk = list(page[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last_seen = chunk[-1]
+
+
+def sweep_inactive_users(hours=None, chunk_size=None):
+    """Queue an inactive user check for every inactive user, returns how many were queued."""
+    queued = 0
+    for chunk in iter_inactive_user_chunks(('email',), hours, chunk_size):
+        # One transaction and one bulk INSERT per chunk
+        with transaction.atomic():
+            enqueue_notifications('inactive_user_check', [{'user_email': row['email']} for row in chunk])
+        queued += len(chunk)
+    users_logger.info(f"Inactive users sweep queued {queued} notifications")
+    return queued
@@ -1,26 +1,42 @@
-import logging,datetime,os,time
+import logging,datetime,os,time,uuid,json,csv,zipfile,hmac
 from urllib.parse import urlencode
 from urllib.request import Request
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.permissions import IsAuthenticated,AllowAny
 from .serializers import *
 from .models import *
 from .utils import *
+from .filters import filter_jobs, filter_talents
+from .pagination import TalentCursorPagination
+from .fast_serializers import row_plan, serialize_list
+from .matching import rank_talents, stored_matches
+from .cv_search import search_cvs, cv_matches, cv_match_score
+from .counters import job_stats, update_shortlist_counters
+from .onboarding import onboard_jobs, onboard_recruiters
+from .spreadsheets import CONTENT_TYPES, ENTITIES, export_queryset, import_spreadsheet, stream_csv, write_xlsx
+from .metrics import render_metrics
+from .cache import get_cached_user_detail, set_cached_user_detail
+from .authentication import get_db_user
+from .throttling import AUTH_THROTTLES
+from .images import VARIANT_FORMATS, VARIANT_SIZES, InvalidImage, delete_picture_files, get_variant_url, schedule_profile_picture_processing
+from .storage import use_hashing_uploads, store_upload, attach_blob, detach_blob, start_upload, append_chunk, complete_upload, discard_upload
 from django.shortcuts import get_object_or_404, redirect
+from openpyxl.utils.exceptions import InvalidFileException
+from django.utils import timezone
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import login as auth_login, logout as logout_method
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.core.mail import send_mail,BadHeaderError
 from django.conf import settings
 from django.contrib.auth.tokens import default_token_generator
-from django.contrib.auth.hashers import check_password
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
 from googleapiclient.discovery import build
-from django.http import JsonResponse, HttpResponseRedirect
+from django.http import FileResponse, HttpResponse, JsonResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
 from django.conf import settings
 from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import force_bytes
@@ -39,6 +55,7 @@ class MyTokenObtainPairView(TokenObtainPairView):
 
     
 @api_view(['POST'])
+@throttle_classes(AUTH_THROTTLES)
 def signin(request):
     try:
         # Get email and password from request data
@@ -55,8 +72,8 @@ def signin(request):
             users_logger.info(f'Invalid login attempt for email: {username}')
             return Response({'status': 'error', 'message': 'Invalid email or password'}, status=status.HTTP_401_UNAUTHORIZED)
 
-        # Check if the provided password is correct
-        if check_password(password, user.password):
+        # Check if the provided password is correct, hashes made with another hasher or cost are upgraded here
+        if user.check_password(password):
             users_logger.info(f'User authenticated: {user.username}')
             
             # Get user details
@@ -76,11 +93,8 @@ def signin(request):
 
             # Check if the user is a Recruiter and belongs to a company
             if user_type == 'Recruiter':
-                recruiter = Recruiter.objects.filter(user=user).first()
-                if recruiter and recruiter.company:
-                    refresh['company_id'] = str(recruiter.company.user_id)
-                else:
-                    refresh['company_id'] = None
+                company_id = Recruiter.objects.filter(user=user).values_list('company__user_id', flat=True).first()
+                refresh['company_id'] = str(company_id) if company_id else None
 
             # Generate access token as a string (no need to set it manually)
             access_token = str(refresh.access_token)
@@ -106,6 +120,7 @@ def signin(request):
 
 # ----------------------------------------------Signup---------------------------------------------------
 
+@transaction.atomic
 def user_signup(request,user_type):
     # Get common data from request
     email = request.data.get('email')
@@ -230,7 +245,7 @@ def user_signup(request,user_type):
         refresh = RefreshToken.for_user(user)
         refresh['user_type'] = user_type
         refresh['first_name'] = first_name if user_type != 'Company' else name
-        refresh['company_id'] = company if user_type == 'Recruiter' else 'name'
+        refresh['company_id'] = None
         refresh['last_name'] = last_name if user_type != 'Company' else ''
         refresh['user_id'] = str(user.id)
 
@@ -238,7 +253,8 @@ def user_signup(request,user_type):
 
         # Log the creation of the user
         users_logger.debug(f'{email} created successfully as {user_type}')
-        trigger_signup_notification(email)
+        # Delivered by the outbox worker once this transaction commits
+        enqueue_notification('signup', {'user_email': email})
         
         # Return the response with JWT tokens
         return Response({
@@ -252,6 +268,8 @@ def user_signup(request,user_type):
         return Response({"message": "Company not found for recruiter"}, status=status.HTTP_400_BAD_REQUEST)
     
     except Exception as e:
+        # Do not keep a half created user around
+        transaction.set_rollback(True)
         users_logger.error(f"Error creating user: {e}")
         return Response({"message": f"An error occurred while creating the user, {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -260,16 +278,19 @@ def user_signup(request,user_type):
 
 
 @api_view(['POST'])
+@throttle_classes(AUTH_THROTTLES)
 def talent_signup(request):
     return user_signup(request, 'Talent')
 
 
 @api_view(['POST'])
+@throttle_classes(AUTH_THROTTLES)
 def recruiter_signup(request):
     return user_signup(request, 'Recruiter')
 
 
 @api_view(['POST'])
+@throttle_classes(AUTH_THROTTLES)
 def company_signup(request):
     return user_signup(request, 'Company')
 
@@ -277,8 +298,10 @@ def company_signup(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def logout(request):
+    # logout() swaps request.user for AnonymousUser
+    email = request.user.email
     logout_method(request)
-    users_logger.debug(f"User {request.user.email} logged out.")
+    users_logger.debug(f"User {email} logged out.")
     return Response({"message": "User logged out successfully."}, status=status.HTTP_200_OK)
 
 
@@ -288,6 +311,13 @@ def logout(request):
 @permission_classes([IsAuthenticated])
 @api_view(['GET', 'PUT', 'DELETE'])
 def user_detail(request, user_id):
+    # Serve reads from the cache before touching the database
+    if request.method == 'GET':
+        cached_data = get_cached_user_detail(user_id)
+        if cached_data is not None:
+            users_logger.debug(f"User {user_id} served from cache.")
+            return Response(cached_data, status=status.HTTP_200_OK)
+
     # Get the user from CustomUser model
     user = get_object_or_404(CustomUser, id=user_id)
     
@@ -312,6 +342,9 @@ def user_detail(request, user_id):
         users_logger.error(f"Profile not found for user: {user.email}")
         return Response({'message': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
 
+    # The profile serializers nest the user, reuse the one already loaded
+    profile.user = user
+
     # Handle GET request
     if request.method == 'GET':
         # Serialize CustomUser data
@@ -327,7 +360,8 @@ def user_detail(request, user_id):
         }
         
         users_logger.debug(f"User {user.email} has been found successfully.")
-        
+        set_cached_user_detail(user_id, combined_data)
+
         # Return the combined data
         return Response(combined_data,status=status.HTTP_200_OK)
 
@@ -380,6 +414,8 @@ def user_detail(request, user_id):
 @api_view(['POST', 'DELETE'])
 @permission_classes([IsAuthenticated])
 def manage_cv(request, talent_id):
+    # Hash the upload while it streams to disk, before request.FILES is parsed
+    use_hashing_uploads(request)
     try:
         # Fetch the authenticated Talent object
         talent = Talent.objects.filter(user_id=talent_id).first()
@@ -392,20 +428,15 @@ def manage_cv(request, talent_id):
             if 'cv' not in request.FILES:
                 return Response({'message': 'No CV file provided'}, status=status.HTTP_400_BAD_REQUEST)
             
-            # Upload the new CV
-            talent.cv = request.FILES['cv']
-            talent.save()
+            # Store the content once, the previous CV is released
+            attach_blob(talent, 'cv', store_upload(request.FILES['cv']))
 
             users_logger.debug(f"CV saved for talent_id={talent_id}")
             return Response({'message': 'CV uploaded successfully!'}, status=status.HTTP_200_OK)
         
         # Handle DELETE request for deleting CV
         elif request.method == 'DELETE':
-            if talent.cv:
-                # Delete the CV file and update the model
-                talent.cv.delete()
-                talent.save()
-                
+            if detach_blob(talent, 'cv'):
                 users_logger.debug(f"CV deleted for talent_id={talent_id}")
                 return Response({'message': 'CV deleted successfully!'}, status=status.HTTP_200_OK)
             else:
@@ -423,35 +454,120 @@ def manage_cv(request, talent_id):
 @api_view(['POST', 'DELETE'])
 @permission_classes([IsAuthenticated])
 def manage_recommendation_letter(request,user_id):
+    use_hashing_uploads(request)
     try:
-        # Get the authenticated user
-        user = CustomUser.objects.filter(id=user_id).first()
-        print(user.first_name)
-        
         # Check if the user is a Talent and has a Talent profile
-        try:
-            talent = Talent.objects.get(user=user)
-        except Talent.DoesNotExist:
+        talent = Talent.objects.filter(user_id=user_id).first()
+        if not talent:
             return Response({'message': 'Talent profile not found'}, status=status.HTTP_404_NOT_FOUND)
 
         if request.method == 'POST':
-            talent.recommendation_letter = request.FILES.get('recommendation_letter')
-            talent.save()
+            if 'recommendation_letter' not in request.FILES:
+                return Response({'message': 'No recommendation letter file provided'}, status=status.HTTP_400_BAD_REQUEST)
+            attach_blob(talent, 'recommendation_letter', store_upload(request.FILES['recommendation_letter']))
             return Response({'message': 'Recommendation letter uploaded successfully!'}, status=status.HTTP_200_OK)
         
         elif request.method == 'DELETE':
-            if talent.recommendation_letter:
-                talent.recommendation_letter.delete(save=True)
+            if detach_blob(talent, 'recommendation_letter'):
                 return Response({'message': 'Recommendation letter deleted successfully!'}, status=status.HTTP_200_OK)
             else:
                 return Response({'message': 'No recommendation letter to delete'}, status=status.HTTP_404_NOT_FOUND)
     
-    except CustomUser.DoesNotExist:
-        return Response({'message': 'Talent not found'}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
         return Response({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
+# Resumable uploads for large CVs / recommendation letters:
+# POST uploads/ -> PUT uploads/<id>/ chunks with an Upload-Offset header -> POST uploads/<id>/complete/
+UPLOAD_MESSAGES = {
+    'cv': 'CV uploaded successfully!',
+    'recommendation_letter': 'Recommendation letter uploaded successfully!',
+}
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def start_resumable_upload(request):
+    kind = request.data.get('kind')
+    filename = str(request.data.get('filename') or '').strip()[:255]
+    try:
+        size = int(request.data.get('size'))
+    except (TypeError, ValueError):
+        size = 0
+
+    if kind not in UPLOAD_MESSAGES or not filename:
+        return Response({'message': 'kind (cv or recommendation_letter) and filename are required'}, status=status.HTTP_400_BAD_REQUEST)
+    if not 0 < size <= settings.UPLOAD_MAX_SIZE:
+        return Response({'message': f'size must be between 1 and {settings.UPLOAD_MAX_SIZE} bytes'}, status=status.HTTP_400_BAD_REQUEST)
+    if not Talent.objects.filter(user_id=request.user.pk).exists():
+        return Response({'message': 'Talent profile not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    session = start_upload(request.user.pk, kind, filename, size, request.data.get('content_type'))
+    users_logger.debug(f"Upload {session.id} started: {kind}, {size} bytes")
+    return Response({
+        'upload_id': session.id,
+        'offset': 0,
+        'size': size,
+        'chunk_size': settings.UPLOAD_CHUNK_SIZE,
+    }, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET', 'PUT', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def resumable_upload(request, upload_id):
+    session = UploadSession.objects.filter(id=upload_id, user_id=request.user.pk).first()
+    if not session:
+        return Response({'message': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    # Where to resume from
+    if request.method == 'GET':
+        return Response({'offset': session.received, 'size': session.size}, status=status.HTTP_200_OK)
+
+    if request.method == 'DELETE':
+        discard_upload(session)
+        return Response({'message': 'Upload cancelled'}, status=status.HTTP_200_OK)
+
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+        length = int(request.headers.get('Content-Length', ''))
+    except ValueError:
+        return Response({'message': 'Upload-Offset and Content-Length headers are required'}, status=status.HTTP_400_BAD_REQUEST)
+    if length > settings.UPLOAD_CHUNK_SIZE:
+        return Response({'message': f'Chunks are limited to {settings.UPLOAD_CHUNK_SIZE} bytes'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    try:
+        # The body is read straight from the socket, never parsed or buffered whole
+        received = append_chunk(session, offset, request._request, length)
+    except ValueError as e:
+        session.refresh_from_db()
+        return Response({'message': str(e), 'offset': session.received}, status=status.HTTP_409_CONFLICT)
+    return Response({'offset': received, 'size': session.size}, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def complete_resumable_upload(request, upload_id):
+    session = UploadSession.objects.filter(id=upload_id, user_id=request.user.pk).first()
+    if not session:
+        return Response({'message': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+    if session.received != session.size:
+        return Response({'message': 'Upload is incomplete', 'offset': session.received}, status=status.HTTP_409_CONFLICT)
+
+    talent = Talent.objects.filter(user_id=session.user_id).first()
+    if not talent:
+        return Response({'message': 'Talent profile not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        # Not one transaction: the blob row commits with its file, attach_blob releases it on failure
+        blob = complete_upload(session, request.data.get('sha256'))
+        attach_blob(talent, session.kind, blob)
+    except ValueError as e:
+        return Response({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    users_logger.debug(f"Upload {upload_id} stored as blob {blob.sha256}")
+    return Response({'message': UPLOAD_MESSAGES[session.kind], 'sha256': blob.sha256}, status=status.HTTP_200_OK)
+
+
 
 
 
@@ -479,9 +595,16 @@ def manage_profile_pic(request, user_id):
                 users_logger.debug(f"No profile picture file provided for {profile_type.lower()}_id={user_id}")
                 return Response({'message': 'No profile picture file provided'}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Upload the new profile picture
-            profile.profile_picture = request.FILES['profile_picture']
+            picture = request.FILES['profile_picture']
+            if picture.size > settings.PROFILE_PICTURE_MAX_SIZE:
+                return Response({'message': 'Profile picture is too large'}, status=status.HTTP_400_BAD_REQUEST)
+
+            # Upload the new profile picture, decoding and metadata stripping happen in a worker
+            previous = profile.profile_picture.name
+            profile.profile_picture = picture
             profile.save()
+            delete_picture_files(previous)
+            schedule_profile_picture_processing(profile_type, user_id, profile.profile_picture.name)
 
             users_logger.debug(f"Profile picture saved for {profile_type.lower()}_id={user_id}")
             return Response({'message': 'Profile picture uploaded successfully!'}, status=status.HTTP_200_OK)
@@ -489,8 +612,9 @@ def manage_profile_pic(request, user_id):
         # Handle DELETE request for deleting profile picture
         elif request.method == 'DELETE':
             if profile.profile_picture:
-                # Delete the profile picture file and update the model
-                profile.profile_picture.delete()
+                # Delete the profile picture, its variants and update the model
+                delete_picture_files(profile.profile_picture.name)
+                profile.profile_picture = None
                 profile.save()
 
                 users_logger.debug(f"Profile picture deleted for {profile_type.lower()}_id={user_id}")
@@ -505,6 +629,31 @@ def manage_profile_pic(request, user_id):
 
 
 
+
+# Lazily generated avatar variants, public so <img> tags can load them
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def profile_picture_variant(request, user_id, size, fmt):
+    if size not in VARIANT_SIZES or fmt not in VARIANT_FORMATS:
+        return Response({'message': 'Unknown variant'}, status=status.HTTP_404_NOT_FOUND)
+
+    name = (Talent.objects.filter(user_id=user_id).values_list('profile_picture', flat=True).first()
+            or Recruiter.objects.filter(user_id=user_id).values_list('profile_picture', flat=True).first())
+    if not name:
+        return Response({'message': 'No profile picture'}, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        url = get_variant_url(name, size, fmt)
+    except InvalidImage as e:
+        users_logger.warning(f"Cannot build variant of {name}: {e}")
+        return Response({'message': 'No profile picture'}, status=status.HTTP_404_NOT_FOUND)
+
+    # URLs carry a version of the picture, the redirect can be cached
+    response = HttpResponseRedirect(url)
+    response['Cache-Control'] = f'public, max-age={settings.IMAGE_VARIANT_CACHE_TIMEOUT}'
+    return response
+
+
 @permission_classes([IsAuthenticated])
 @api_view(['GET'])
 def companies_details(request, user_type='Company'):
@@ -513,11 +662,14 @@ def companies_details(request, user_type='Company'):
             users = CustomUser.objects.filter(user_type='Company')
         else:
             users = CustomUser.objects.all()
+        # Only the columns (and groups / permissions) of the requested fields
+        selection = sparse_fields(request)
+        users = CustomUserSerializer.sparse_queryset(users, **selection)
     except CustomUser.DoesNotExist:
         return Response({'message': 'No users were found'}, status=status.HTTP_404_NOT_FOUND)
 
     if request.method == 'GET':
-        serializer = CustomUserSerializer(users, many=True)
+        serializer = CustomUserSerializer(users, many=True, **selection)
         users_logger.debug(f"Users have been found successfully.")
         return Response(serializer.data)
 
@@ -526,9 +678,8 @@ def companies_details(request, user_type='Company'):
 @permission_classes([IsAuthenticated])
 @api_view(['GET'])
 def company_recruiters(request, company_id):
-    print(f"Received company_id: {company_id}")
-    # Fetch the company using the provided company_id
-    company = Company.objects.filter(user_id=company_id).first()
+    # Fetch the company using the provided company_id, only its id is needed
+    company = Company.objects.filter(user_id=company_id).only('id').first()
     
     if not company:
         users_logger.debug(f'Company with ID {company_id} not found.')
@@ -536,39 +687,38 @@ def company_recruiters(request, company_id):
 
     users_logger.debug("Company found successfully.")
 
-    # Fetch recruiters associated with the company
-    recruiters = Recruiter.objects.filter(company=company)
-
-    # Serialize each recruiter and combine their CustomUser and Recruiter profiles
-    combined_data = []
-    for recruiter in recruiters:
-        # Serialize the user (CustomUser)
-        user_serializer = CustomUserSerializer(recruiter.user)
-
-        # Serialize the profile (Recruiter)
-        profile_serializer = RecruiterSerializer(recruiter)
+    # Fetch recruiters associated with the company, with everything the requested fields read
+    selection = sparse_fields(request)
+    recruiters = RecruiterWithUserSerializer.sparse_queryset(Recruiter.objects.filter(company=company), **selection)
 
-        # Combine both serialized data
-        combined_data.append({
-            **user_serializer.data,  # CustomUser data
-            **profile_serializer.data  # Recruiter profile data
-        })
+    # Serialize each recruiter combined with its CustomUser in a single pass
+    combined_data = RecruiterWithUserSerializer(recruiters, many=True, **selection).data
 
-    users_logger.debug(f"{len(recruiters)} recruiters found successfully.")
+    users_logger.debug(f"{len(combined_data)} recruiters found successfully.")
 
     # Return the combined data for all recruiters
     return Response(combined_data, status=status.HTTP_200_OK)
 
 
+def can_follow_talent(user, talent):
+    """The talent itself, staff, or a company (or one of its recruiters) that shortlisted the talent."""
+    if str(user.pk) == str(talent.user_id):
+        return True
+    company_user_id = {'Company': user.pk, 'Recruiter': getattr(user, 'company_id', None)}.get(user.user_type)
+    if company_user_id and JobShortlist.objects.filter(talent=talent, job__company__user_id=company_user_id).exists():
+        return True
+    return user.is_staff
+
+
 # Return open processes for a talent
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def talent_open_processes(request):
-    user = CustomUser.objects.get(email=request.user.email)
-    try:
-        talent = Talent.objects.filter(user=user).first()
-    except Talent.DoesNotExist:
+def talent_open_processes(request, talent_id):
+    talent = Talent.objects.filter(user_id=talent_id).only('user_id', 'open_processes').first()
+    if not talent:
         return Response({'message': 'Talent profile not found'}, status=status.HTTP_404_NOT_FOUND)
+    if not can_follow_talent(request.user, talent):
+        return Response({'message': 'Only the talent, staff or a company that shortlisted it can view its processes'}, status=status.HTTP_403_FORBIDDEN)
 
     users_logger.debug("Open processes data has been sent, status 200.")
     return Response({
@@ -585,7 +735,7 @@ def manage_jobs(request, job_id):
     users_logger.debug(f'Request method: {request.method}, Job ID: {job_id}, User: {request.user}')
 
     try:
-        job = Job.objects.filter(id=job_id).first()
+        job = Job.objects.prefetch_related(job_shortlist_prefetch()).filter(id=job_id).first()
         users_logger.debug(f'Job found: {job_id}')
     except Job.DoesNotExist:
         users_logger.debug(f'Job not found: {job_id}')
@@ -593,14 +743,14 @@ def manage_jobs(request, job_id):
 
     if request.method == 'GET':
         serializer = JobSerializer(job)
-        users_logger.debug(f'Job data retrieved: {serializer.data}')
+        users_logger.debug('Job data retrieved: %s', job_id)
         return Response(serializer.data)
 
     elif request.method == 'PUT':
         serializer = JobSerializer(job, data=request.data)
         if serializer.is_valid():
             serializer.save()
-            users_logger.debug(f'Job updated successfully: {serializer.data}')
+            users_logger.debug('Job updated successfully: %s', job_id)
             return Response(serializer.data)
         users_logger.debug(f'Job update failed: {serializer.errors}')
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -613,72 +763,139 @@ def manage_jobs(request, job_id):
 
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def job_matches(request, job_id):
+    job = Job.objects.filter(id=job_id).only('id', 'job_type', 'job_sitting').first()
+    if not job:
+        users_logger.debug(f'Job not found: {job_id}')
+        return Response({'message': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        limit = min(int(request.query_params.get('limit', 20)), 100)
+    except ValueError:
+        return Response({'message': 'Invalid limit'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Scored by the nightly rematch, jobs created since are ranked live from the skills index
+    limit = max(limit, 1)
+    matches = stored_matches(job, limit) or rank_talents(job, limit)
+    users_logger.debug(f'{len(matches)} matching talents found for job {job_id}')
+    return Response(matches, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def job_cv_matches(request, job_id):
+    # Same as job_matches, scored on the text of the talents' CVs
+    job = Job.objects.filter(id=job_id).only('id', 'requirements').first()
+    if not job:
+        users_logger.debug(f'Job not found: {job_id}')
+        return Response({'message': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        limit = min(int(request.query_params.get('limit', 20)), 100)
+    except ValueError:
+        return Response({'message': 'Invalid limit'}, status=status.HTTP_400_BAD_REQUEST)
+
+    matches = cv_matches(job, limit=max(limit, 1))
+    users_logger.debug(f'{len(matches)} CVs matching job {job_id}')
+    return Response(matches, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def cv_search(request):
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({'message': 'A search query is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        limit = min(int(request.query_params.get('limit', 20)), 100)
+    except ValueError:
+        return Response({'message': 'Invalid limit'}, status=status.HTTP_400_BAD_REQUEST)
+
+    results = search_cvs(query, limit=max(limit, 1))
+    users_logger.debug(f'{len(results)} CVs found for {query!r}')
+    return Response(results, status=status.HTTP_200_OK)
+
+
+MAX_TAGS_PER_REQUEST = 1000
+
+
+def parse_uuid(value):
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+def parse_score(value):
+    # Match scores are optional numbers, returns (score, is_valid)
+    if value in (None, ''):
+        return None, True
+    try:
+        return float(value), True
+    except (TypeError, ValueError):
+        return None, False
+
+
 @api_view(['POST', 'DELETE'])
 @permission_classes([IsAuthenticated])
 def manage_tags(request, job_id):
     users_logger.debug(f'Request method: {request.method}, Job ID: {job_id}, User: {request.user}')
-    
-    try:
-        job = Job.objects.get(id=job_id)
-        users_logger.debug(f'Job found: {job_id}')
-    except Job.DoesNotExist:
+
+    if not Job.objects.filter(id=job_id).exists():
         users_logger.debug(f'Job not found: {job_id}')
         return Response({'message': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
 
+    talent_id = parse_uuid(request.data.get('talent_id'))
+
     if request.method == 'POST':
         # Adding a talent to the job
-        talent_id = request.data.get('talent_id')
-        match_by_cv = request.data.get('match_by_cv')
-        match_by_form = request.data.get('match_by_form')
-        first_name = request.data.get('first_name')
-        last_name = request.data.get('last_name')
-
-        # Validate required fields
-        if not all([talent_id, match_by_cv, match_by_form, first_name, last_name]):
+        match_by_cv, valid_cv = parse_score(request.data.get('match_by_cv'))
+        match_by_form, valid_form = parse_score(request.data.get('match_by_form'))
+
+        # Validate required fields, match_by_cv is computed from the CV index when omitted
+        if not talent_id or match_by_form is None:
             return Response({'message': 'All fields are required'}, status=status.HTTP_400_BAD_REQUEST)
+        if not (valid_cv and valid_form):
+            return Response({'message': 'Match scores must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
 
-        relevant_talents = job.relevant_talents or []
+        talent = Talent.objects.filter(user_id=talent_id).only('id').first()
+        if not talent:
+            return Response({'message': 'Talent not found'}, status=status.HTTP_404_NOT_FOUND)
+        if match_by_cv is None:
+            match_by_cv = cv_match_score(Job.objects.only('id', 'requirements').get(id=job_id), talent)
 
-        # Check if the talent already exists in the relevant_talents list
-        if any(talent['talent_id'] == talent_id for talent in relevant_talents):
+        # A single row insert, the unique (job, talent) constraint rejects duplicates atomically
+        try:
+            with transaction.atomic():
+                JobShortlist.objects.create(
+                    job_id=job_id,
+                    talent=talent,
+                    match_by_cv=match_by_cv,
+                    match_by_form=match_by_form,
+                )
+                update_shortlist_counters(job_id, 1)
+        except IntegrityError:
             users_logger.debug(f'Talent {talent_id} already saved to job {job_id}')
             return Response({'message': 'Talent already saved to this job'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Append new talent to relevant_talents
-        relevant_talent = {
-            'talent_id': talent_id,
-            'match_by_cv': match_by_cv,
-            'match_by_form': match_by_form,
-            'first_name': first_name,
-            'last_name': last_name
-        }
-        relevant_talents.append(relevant_talent)
-        job.relevant_talents = relevant_talents
-        job.save()
-
         users_logger.debug(f'Talent {talent_id} added to job {job_id}')
         return Response({'message': 'Talent saved successfully!'}, status=status.HTTP_200_OK)
 
     elif request.method == 'DELETE':
         # Deleting a talent from the job
-        talent_id = request.data.get('talent_id')
-
         if not talent_id:
             return Response({'message': 'Talent ID is required'}, status=status.HTTP_400_BAD_REQUEST)
 
-        relevant_talents = job.relevant_talents or []
-
-        # Check if the talent exists
-        updated_talents = [talent for talent in relevant_talents if talent['talent_id'] != talent_id]
-
-        if len(updated_talents) == len(relevant_talents):
+        with transaction.atomic():
+            deleted, _ = JobShortlist.objects.filter(job_id=job_id, talent__user_id=talent_id).delete()
+            update_shortlist_counters(job_id, -deleted)
+        if not deleted:
             users_logger.debug(f'Talent {talent_id} not found in job {job_id}')
             return Response({'message': 'Talent not found in this job'}, status=status.HTTP_404_NOT_FOUND)
 
-        # Save updated talents list
-        job.relevant_talents = updated_talents
-        job.save()
-
         users_logger.debug(f'Talent {talent_id} removed from job {job_id}')
         return Response({'message': 'Talent removed successfully!'}, status=status.HTTP_200_OK)
 
@@ -686,27 +903,101 @@ def manage_tags(request, job_id):
     return Response({'message': 'Method not allowed'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
 
+@api_view(['POST', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def manage_tags_bulk(request, job_id):
+    users_logger.debug(f'Request method: {request.method}, Job ID: {job_id}, User: {request.user}')
+
+    if not Job.objects.filter(id=job_id).exists():
+        users_logger.debug(f'Job not found: {job_id}')
+        return Response({'message': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    if request.method == 'POST':
+        # Tag many talents: {"talents": [{"talent_id": ..., "match_by_cv": ..., "match_by_form": ...}]}
+        entries = request.data.get('talents')
+        if not isinstance(entries, list) or not entries:
+            return Response({'message': 'A list of talents is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(entries) > MAX_TAGS_PER_REQUEST:
+            return Response({'message': f'At most {MAX_TAGS_PER_REQUEST} talents per request'}, status=status.HTTP_400_BAD_REQUEST)
+
+        scores = {}
+        for entry in entries:
+            if not isinstance(entry, dict):
+                return Response({'message': 'Invalid talent entry'}, status=status.HTTP_400_BAD_REQUEST)
+            talent_id = parse_uuid(entry.get('talent_id'))
+            match_by_cv, valid_cv = parse_score(entry.get('match_by_cv'))
+            match_by_form, valid_form = parse_score(entry.get('match_by_form'))
+            if not (talent_id and valid_cv and valid_form):
+                return Response({'message': 'Every talent needs a valid talent_id and numeric match scores'}, status=status.HTTP_400_BAD_REQUEST)
+            scores[talent_id] = (match_by_cv, match_by_form)
+
+        talents = dict(Talent.objects.filter(user_id__in=scores).values_list('user_id', 'id'))
+        with transaction.atomic():
+            # Locking the job holds back concurrent tags of it (their shortlist INSERTs wait on the row),
+            # so the rows diffed here are exactly the rows inserted and counted
+            list(Job.objects.select_for_update().filter(id=job_id).values_list('id', flat=True))
+            already_saved = set(
+                JobShortlist.objects.filter(job_id=job_id, talent_id__in=talents.values()).values_list('talent__user_id', flat=True)
+            )
+            new_rows = [
+                JobShortlist(job_id=job_id, talent_id=talents[user_id], match_by_cv=match_by_cv, match_by_form=match_by_form)
+                for user_id, (match_by_cv, match_by_form) in scores.items()
+                if user_id in talents and user_id not in already_saved
+            ]
+            JobShortlist.objects.bulk_create(new_rows)
+            update_shortlist_counters(job_id, len(new_rows))
+
+        users_logger.debug(f'{len(new_rows)} talents added to job {job_id}')
+        return Response({
+            'message': 'Talents saved successfully!',
+            'added': len(new_rows),
+            'already_saved': [str(user_id) for user_id in already_saved],
+            'not_found': [str(user_id) for user_id in scores if user_id not in talents],
+        }, status=status.HTTP_200_OK)
+
+    elif request.method == 'DELETE':
+        # Untag many talents: {"talent_ids": [...]}
+        talent_ids = request.data.get('talent_ids')
+        if not isinstance(talent_ids, list) or not talent_ids:
+            return Response({'message': 'A list of talent IDs is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(talent_ids) > MAX_TAGS_PER_REQUEST:
+            return Response({'message': f'At most {MAX_TAGS_PER_REQUEST} talents per request'}, status=status.HTTP_400_BAD_REQUEST)
+
+        parsed_ids = [parse_uuid(talent_id) for talent_id in talent_ids]
+        if not all(parsed_ids):
+            return Response({'message': 'Invalid talent ID'}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            deleted, _ = JobShortlist.objects.filter(job_id=job_id, talent__user_id__in=parsed_ids).delete()
+            update_shortlist_counters(job_id, -deleted)
+
+        users_logger.debug(f'{deleted} talents removed from job {job_id}')
+        return Response({'message': 'Talents removed successfully!', 'removed': deleted}, status=status.HTTP_200_OK)
+
+    # Method not allowed
+    return Response({'message': 'Method not allowed'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def company_jobs(request, company_id):
     try:
-        # Check if the company exists
-        company = Company.objects.filter(user_id=company_id).first()
-        users_logger.info(f'Company found: {company_id}')
-
-        # Fetch all jobs associated with the company
-        jobs = Job.objects.filter(company=company)
+        # Fetch the live jobs of the company as rows (plus the shortlist when requested)
+        jobs = filter_jobs(Job.objects.filter(company__user_id=company_id), request.query_params)
+        jobs = serialize_list(JobSerializer, jobs, **sparse_fields(request))
 
-        if jobs.exists():
-            serializer = JobSerializer(jobs, many=True)
-            users_logger.info(f"{jobs.count()} jobs were found for company {company_id}")
-            return Response(serializer.data, status=status.HTTP_200_OK)
+        if jobs:
+            users_logger.info(f"{len(jobs)} jobs were found for company {company_id}")
+            return Response(jobs, status=status.HTTP_200_OK)
         else:
             users_logger.info(f"No jobs found for company {company_id}")
             return Response({"message": "No jobs found for this company"}, status=status.HTTP_204_NO_CONTENT)
 
+    except serializers.ValidationError as e:
+        return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+
     except Company.DoesNotExist:
         users_logger.warning(f'Company not found: {company_id}')
         return Response({'message': 'Company not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -725,21 +1016,20 @@ def company_jobs(request, company_id):
 @permission_classes([IsAuthenticated])
 def recruiter_jobs(request, recruiter_id):
     try:
-        # Check if the company exists
-        recruiter = Recruiter.objects.filter(user_id=recruiter_id).first()
-        users_logger.info(f'recruiter found: {recruiter_id}')
-
-        # Fetch all jobs associated with the recruiter
-        jobs = Job.objects.filter(recruiter=recruiter)
+        # Fetch the live jobs of the recruiter as rows (plus the shortlist when requested)
+        jobs = filter_jobs(Job.objects.filter(recruiter__user_id=recruiter_id), request.query_params)
+        jobs = serialize_list(JobSerializer, jobs, **sparse_fields(request))
 
-        if jobs.exists():
-            serializer = JobSerializer(jobs, many=True)
-            users_logger.info(f"{jobs.count()} jobs were found for recruiter {recruiter_id}")
-            return Response(serializer.data, status=status.HTTP_200_OK)
+        if jobs:
+            users_logger.info(f"{len(jobs)} jobs were found for recruiter {recruiter_id}")
+            return Response(jobs, status=status.HTTP_200_OK)
         else:
             users_logger.info(f"No jobs found for recruiter {recruiter_id}")
             return Response({"message": "No jobs found for this recruiter"}, status=status.HTTP_204_NO_CONTENT)
 
+    except serializers.ValidationError as e:
+        return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+
     except Recruiter.DoesNotExist:
         users_logger.warning(f'Recruiter not found: {recruiter_id}')
         return Response({'message': 'recruiter not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -756,6 +1046,25 @@ def recruiter_jobs(request, recruiter_id):
 
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def company_job_stats(request, company_id):
+    # Dashboard aggregates read from the job counters, never from the jobs themselves
+    company_pk = Company.objects.filter(user_id=company_id).values_list('id', flat=True).first()
+    if not company_pk:
+        return Response({'message': 'Company not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(job_stats('company', company_pk), status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def recruiter_job_stats(request, recruiter_id):
+    recruiter_pk = Recruiter.objects.filter(user_id=recruiter_id).values_list('id', flat=True).first()
+    if not recruiter_pk:
+        return Response({'message': 'recruiter not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(job_stats('recruiter', recruiter_pk), status=status.HTTP_200_OK)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def create_job(request, company_id):
@@ -770,7 +1079,7 @@ def create_job(request, company_id):
         serializer = JobSerializer(data=job_data)
         if serializer.is_valid():
             serializer.save()
-            users_logger.debug(f'Job created successfully: {serializer.data}')
+            users_logger.debug('Job created successfully: %s', serializer.instance.id)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         else:
             users_logger.debug(f'Job creation failed with errors: {serializer.errors}')
@@ -782,12 +1091,146 @@ def create_job(request, company_id):
 
 
 
+def is_owner_or_staff(user, user_id):
+    # Token users carry their id as a str, URL and model ids are UUIDs
+    return str(user.pk) == str(user_id) or user.is_staff
+
+
+def onboarding_batch(request, company_id, key):
+    """(company, rows) of a bulk onboarding request, or (None, error response)."""
+    company = Company.objects.filter(user_id=company_id).first()
+    if not company:
+        return None, Response({'message': 'Company not found'}, status=status.HTTP_404_NOT_FOUND)
+    if not is_owner_or_staff(request.user, company.user_id):
+        return None, Response({'message': 'Only the company can onboard to its account'}, status=status.HTTP_403_FORBIDDEN)
+
+    rows = request.data.get(key) if hasattr(request.data, 'get') else None
+    if not isinstance(rows, list) or not rows:
+        return None, Response({'message': f'A list of {key} is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(rows) > settings.ONBOARDING_MAX_ROWS:
+        return None, Response({'message': f'At most {settings.ONBOARDING_MAX_ROWS} {key} per request'}, status=status.HTTP_400_BAD_REQUEST)
+    return company, rows
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_onboard_recruiters(request, company_id):
+    # {"recruiters": [{"email", "password", "first_name", "last_name", "phone_number", "division", "position", "gender"}]}
+    company, rows = onboarding_batch(request, company_id, 'recruiters')
+    if company is None:
+        return rows
+
+    result = onboard_recruiters(company, rows)
+    users_logger.debug(f"Bulk recruiter onboarding for company {company_id}: {len(result['created'])} created, {len(result['errors'])} rejected")
+    return Response(result, status=status.HTTP_201_CREATED if result['created'] else status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_create_jobs(request, company_id):
+    # {"jobs": [{...job fields, "recruiter" or "recruiter_email"}]}
+    company, rows = onboarding_batch(request, company_id, 'jobs')
+    if company is None:
+        return rows
+
+    result = onboard_jobs(company, rows)
+    users_logger.debug(f"Bulk job creation for company {company_id}: {len(result['created'])} created, {len(result['errors'])} rejected")
+    return Response(result, status=status.HTTP_201_CREATED if result['created'] else status.HTTP_400_BAD_REQUEST)
+
+
+def spreadsheet_scope(request, entity):
+    """(company or None, error response or None) for an import / export of `entity`.
+
+    Talents are staff only. Jobs and recruiters belong to a company: a company
+    user gets its own, staff pick one with ?company=<company user id>.
+    """
+    if entity not in ENTITIES:
+        return None, Response({'message': f'Unknown data type, expected one of {", ".join(ENTITIES)}'}, status=status.HTTP_404_NOT_FOUND)
+    if entity == 'talents':
+        if not request.user.is_staff:
+            return None, Response({'message': 'Only staff can import or export talents'}, status=status.HTTP_403_FORBIDDEN)
+        return None, None
+
+    if request.user.is_staff:
+        company_id = parse_uuid(request.query_params.get('company'))
+        if not company_id:
+            return None, (None if request.method == 'GET' else Response({'message': 'A company is required'}, status=status.HTTP_400_BAD_REQUEST))
+    elif request.user.user_type == 'Company':
+        company_id = request.user.pk
+    else:
+        return None, Response({'message': 'Only companies can import or export their data'}, status=status.HTTP_403_FORBIDDEN)
+
+    company = Company.objects.filter(user_id=company_id).first()
+    if not company:
+        return None, Response({'message': 'Company not found'}, status=status.HTTP_404_NOT_FOUND)
+    return company, None
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_data(request, entity):
+    # ?type=csv (default) or xlsx, `format` is taken by DRF's format suffixes
+    file_format = request.query_params.get('type', 'csv')
+    if file_format not in CONTENT_TYPES:
+        return Response({'message': 'type must be csv or xlsx'}, status=status.HTTP_400_BAD_REQUEST)
+    company, error = spreadsheet_scope(request, entity)
+    if error:
+        return error
+
+    queryset = export_queryset(entity, company)
+    filename = f'{entity}-{timezone.now():%Y%m%d-%H%M%S}.{file_format}'
+    users_logger.debug(f'{request.user} exporting {entity} as {file_format}')
+    if file_format == 'xlsx':
+        return FileResponse(write_xlsx(entity, queryset), as_attachment=True, filename=filename, content_type=CONTENT_TYPES['xlsx'])
+
+    response = StreamingHttpResponse(stream_csv(entity, queryset), content_type=CONTENT_TYPES['csv'])
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def import_data(request, entity):
+    company, error = spreadsheet_scope(request, entity)
+    if error:
+        return error
+
+    uploaded_file = request.FILES.get('file')
+    if not uploaded_file:
+        return Response({'message': 'A CSV or XLSX file is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if uploaded_file.size > settings.UPLOAD_MAX_SIZE:
+        return Response({'message': 'File too large'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    file_format = os.path.splitext(uploaded_file.name)[1].lower().lstrip('.')
+    if file_format not in CONTENT_TYPES:
+        return Response({'message': 'Only .csv and .xlsx files are supported'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        result = import_spreadsheet(entity, uploaded_file, file_format, company)
+    except (UnicodeDecodeError, csv.Error, zipfile.BadZipFile, InvalidFileException) as e:
+        users_logger.debug(f'Unreadable {file_format} import from {request.user}: {e}')
+        return Response({'message': f'Could not read the {file_format} file'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(result, status=status.HTTP_200_OK)
+
+
+def metrics(request):
+    """Prometheus scrape endpoint, a plain view: the scraper sends METRICS_TOKEN, not a JWT."""
+    if not settings.METRICS_ENABLED:
+        return HttpResponse(status=404)
+    if settings.METRICS_TOKEN:
+        expected = f'Bearer {settings.METRICS_TOKEN}'
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), expected):
+            return HttpResponse(status=401)
+    elif not settings.DEBUG:
+        return HttpResponse(status=404)
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @api_view(['GET', 'PUT', 'DELETE'])
 def manage_recruiters(request, recruiter_id):
     users_logger.debug(f'Request method: {request.method}, Recruiter ID: {recruiter_id}, User: {request.user}')
 
     # Find the recruiter or return 404
-    recruiter = get_object_or_404(Recruiter, id=recruiter_id)
+    recruiter = get_object_or_404(Recruiter.objects.select_related('user'), id=recruiter_id)
 
     if request.method == 'GET':
         # Serialize both user and recruiter data
@@ -796,7 +1239,7 @@ def manage_recruiters(request, recruiter_id):
 
         # Combine serialized data
         combined_data = {**user_serializer.data, **recruiter_serializer.data}
-        users_logger.debug(f'Recruiter data retrieved: {combined_data}')
+        users_logger.debug('Recruiter data retrieved: %s', recruiter_id)
         return Response(combined_data, status=status.HTTP_200_OK)
 
     elif request.method == 'PUT':
@@ -804,7 +1247,7 @@ def manage_recruiters(request, recruiter_id):
         serializer = RecruiterSerializer(recruiter, data=request.data)
         if serializer.is_valid():
             serializer.save()
-            users_logger.debug(f'Recruiter updated successfully: {serializer.data}')
+            users_logger.debug('Recruiter updated successfully: %s', recruiter_id)
             return Response(serializer.data, status=status.HTTP_200_OK)
         users_logger.debug(f'Recruiter update failed: {serializer.errors}')
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -907,7 +1350,7 @@ def complete_profile(request):
     if not request.user.is_authenticated:
         return Response({'success': False, 'message': 'Authentication required.'}, status=status.HTTP_401_UNAUTHORIZED)
     
-    serializer = CompleteProfileSerializer(instance=request.user, data=request.data, partial=True)
+    serializer = CompleteProfileSerializer(instance=get_db_user(request.user), data=request.data, partial=True)
     if serializer.is_valid():
         serializer.save()
         print(f"Serialized data: {serializer.data}")  # Debugging line to check returned data
@@ -920,15 +1363,19 @@ def complete_profile(request):
 @permission_classes([IsAuthenticated])
 def check_auth(request):
     users_logger.info({"message": "User is authenticated", "user_id": request.user.id})
-    print(request.user.id)
     return Response({"message": "User is authenticated", "user_id": request.user.id})
 
 
 
 
 
+# Columns the reset token is derived from, plus what get_user returns
+RESET_TOKEN_FIELDS = ('id', 'email', 'password', 'last_login', 'first_name')
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes(AUTH_THROTTLES)
 def get_user(request):
     email = request.data.get('email')
     if not email:
@@ -937,7 +1384,7 @@ def get_user(request):
 
     try:
         # Fetch the user by email
-        user = CustomUser.objects.get(email=email)
+        user = CustomUser.objects.only(*RESET_TOKEN_FIELDS).get(email=email)
         users_logger.info(f"User found for email: {email}")
     except ObjectDoesNotExist:
         users_logger.warning(f"User not found for email: {email}")
@@ -957,6 +1404,7 @@ def get_user(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes(AUTH_THROTTLES)
 def validate_reset_token(request):
     email = request.data.get('email')
     token = request.data.get('token')
@@ -965,7 +1413,7 @@ def validate_reset_token(request):
         return Response({"error": "Email and token are required."}, status=400)
 
     try:
-        user = CustomUser.objects.get(email=email)
+        user = CustomUser.objects.only(*RESET_TOKEN_FIELDS).get(email=email)
         if default_token_generator.check_token(user, token):
             return Response({"message": "Token is valid."}, status=200)
         else:
@@ -976,6 +1424,7 @@ def validate_reset_token(request):
 
 @api_view(['PUT'])
 @permission_classes([AllowAny])
+@throttle_classes(AUTH_THROTTLES)
 def reset_password(request):
     email = request.data.get('email')
     new_password = request.data.get('newPassword')
@@ -993,25 +1442,75 @@ def reset_password(request):
     except Exception as e:
         return Response({"error": "An error occurred while resetting the password."}, status=500)
 
+INACTIVE_USER_FIELDS = ('id', 'email', 'first_name', 'last_name', 'user_type', 'last_login')
+INACTIVE_USERS_PAGE_SIZE = 1000
+INACTIVE_USERS_MAX_PAGE_SIZE = 10000
+INACTIVE_USERS_CHUNK_SIZE = 500
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])  # Or use custom permissions for service accounts
 def get_inactive_users(request):
-    """Endpoint to get users who haven't logged in for 72 hours."""
-    threshold = timezone.now() - datetime.timedelta(hours=72)
-    inactive_users = CustomUser.objects.filter(last_login__lt=threshold, is_active=True)
+    """Streamed, keyset paginated feed of users who haven't logged in for `hours` (72 by default).
 
-    serializer = CustomUserSerializer(inactive_users, many=True)
-    return Response(serializer.data, status=200)
+    Query params: `hours`, `limit` (page size), `after` (the `next` cursor of the previous page) and
+    `fields`, a subset of INACTIVE_USER_FIELDS (`id` is always sent). Pages follow (last_login, id).
+    """
+    try:
+        hours = int(request.query_params.get('hours', settings.INACTIVE_USER_THRESHOLD_HOURS))
+        limit = min(int(request.query_params.get('limit', INACTIVE_USERS_PAGE_SIZE)), INACTIVE_USERS_MAX_PAGE_SIZE)
+    except ValueError:
+        return Response({'message': 'hours and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+    if hours < 0 or limit < 1:
+        return Response({'message': 'hours and limit must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+
+    after = request.query_params.get('after')
+    inactive = inactive_users(hours).order_by('last_login', 'pk')
+    if after:
+        position = decode_inactive_cursor(after)
+        if not position:
+            return Response({'message': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+        inactive = inactive_users_after(inactive, *position)
+
+    selected = parse_field_paths(request.query_params.get('fields'))
+    fields = [field for field in INACTIVE_USER_FIELDS if selected is None or field == 'id' or field in selected]
+    # last_login is part of the cursor, loaded even when it is not sent
+    columns = fields if 'last_login' in fields else fields + ['last_login']
+    rows = inactive.values(*columns)[:limit].iterator(chunk_size=INACTIVE_USERS_CHUNK_SIZE)
+    return StreamingHttpResponse(stream_inactive_users(rows, limit, 'last_login' in fields), content_type='application/json')
+
+
+def stream_inactive_users(rows, limit, send_last_login=True):
+    # Emit {"results": [...], "next": cursor} row by row, only one DB chunk is held in memory
+    yield '{"results":['
+    count = 0
+    last_row = None
+    for row in rows:
+        last_row = row
+        if not send_last_login:
+            row = {key: value for key, value in row.items() if key != 'last_login'}
+        yield (',' if count else '') + json.dumps(row, cls=DjangoJSONEncoder)
+        count += 1
+    next_cursor = encode_inactive_cursor(last_row['last_login'], last_row['id']) if count == limit else None
+    yield '],"next":' + json.dumps(next_cursor) + '}'
 
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_talents(request):
-    # Retrieve talents who are open to work
-    talents = Talent.objects.filter(is_open_to_work=True, )
-    serializer = TalentSerializer(talents, many=True)
-    return Response(serializer.data, status=200)
+    # Retrieve talents who are open to work, narrowed by the search filters, with the requested columns only
+    selection = sparse_fields(request)
+    plan = row_plan(TalentSerializer, **selection)
+    talents = Talent.objects.filter(is_open_to_work=True)
+    talents = plan.values(talents) if plan else TalentSerializer.sparse_queryset(talents, **selection)
+    talents = filter_talents(talents, request.query_params)
+
+    # Serve a single keyset page instead of the whole table
+    paginator = TalentCursorPagination()
+    page = paginator.paginate_queryset(talents, request)
+    data = plan.convert(page) if plan else TalentSerializer(page, many=True, **selection).data
+    return paginator.get_paginated_response(data)
 
 
 